@@ -0,0 +1,114 @@
+"""
+Compares the compiled `BanlistMatcher` with the previous `check_banlist`, which built and ran
+one regex per banned word on every call.
+
+Checks dialogue-like turns against the banlists of all event hints. Also reports how many
+turns containing a hand-picked inflected banned word ("lotteries", "vases") each version lets
+through, and how many turns containing an unrelated lookalike ("caring" for "car") it rejects.
+
+    python benchmarks/bench_banlist.py --turns 2000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+
+from events import EVENT_HINTS
+from utils import BanlistMatcher, generate_banlist
+
+
+def legacy_check_banlist(text, banlist):
+    text_lower = text.lower()
+    for word in banlist:
+        if re.search(r'\b' + re.escape(word) + r'\b', text_lower):
+            return False
+    return True
+
+
+# Written by hand rather than with `inflections`, so the counts below do not assume the rules are right
+INFLECTED = [
+    ("won the lottery", "lotteries"), ("broke a vase", "vases"), ("adopted a stray cat", "cats"),
+    ("missed the train", "trains"), ("lost my keys", "key"), ("burned the toast", "toasted"),
+    ("received an unexpected gift", "gifts"), ("phone battery died", "batteries"),
+    ("forgot where I parked the car", "cars"), ("finally passed the driving test", "tests"),
+]
+LOOKALIKES = [
+    ("forgot where I parked the car", "caring"), ("forgot where I parked the car", "cared"),
+    ("finally passed the driving test", "testes"), ("dropped my ice cream", "creamery"),
+]
+
+
+def make_turns(n, seed):
+    """
+    `(hint, text, kind)` turns, where `kind` is "banned", "inflected", "lookalike" or "clean".
+    """
+    rng = random.Random(seed)
+    filler = "honestly I did not expect that from her after everything that happened last week".split()
+    turns = []
+    for _ in range(n):
+        hint = rng.choice(EVENT_HINTS)
+        words = rng.sample(filler, 10)
+        kind = "clean"
+        roll = rng.random()
+        if roll < 0.1:
+            kind = "banned"
+            words.insert(rng.randrange(len(words)), rng.choice(generate_banlist(hint)))
+        elif roll < 0.2:
+            kind = "inflected"
+            hint, word = rng.choice(INFLECTED)
+            words.insert(rng.randrange(len(words)), word)
+        elif roll < 0.3:
+            kind = "lookalike"
+            hint, word = rng.choice(LOOKALIKES)
+            words.insert(rng.randrange(len(words)), word)
+        turns.append((hint, " ".join(words).capitalize() + ".", kind))
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BanlistMatcher vs per-word regex check_banlist")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    turns = make_turns(args.turns, args.seed)
+    banlists = {hint: generate_banlist(hint) for hint in EVENT_HINTS}
+
+    def run_legacy():
+        return [legacy_check_banlist(text, generate_banlist(hint)) for hint, text, _ in turns]
+
+    def run_matcher():
+        return [BanlistMatcher.for_event(hint).is_clean(text) for hint, text, _ in turns]
+
+    def run_matcher_batched():
+        by_hint = {}
+        for hint, text, _ in turns:
+            by_hint.setdefault(hint, []).append(text)
+        return {hint: BanlistMatcher.for_event(hint).check_many(texts) for hint, texts in by_hint.items()}
+
+    legacy_time = min(timeit.repeat(run_legacy, number=1, repeat=args.repeat))
+    matcher_time = min(timeit.repeat(run_matcher, number=1, repeat=args.repeat))
+    batched_time = min(timeit.repeat(run_matcher_batched, number=1, repeat=args.repeat))
+
+    kinds = [kind for _, _, kind in turns]
+
+    def outcome(accepted):
+        leaked = sum(ok for ok, kind in zip(accepted, kinds) if kind == "inflected")
+        wrongly_rejected = sum(not ok for ok, kind in zip(accepted, kinds) if kind == "lookalike")
+        return (f"{sum(accepted)} turns accepted, {leaked}/{kinds.count('inflected')} inflected let through, "
+                f"{wrongly_rejected}/{kinds.count('lookalike')} lookalikes rejected")
+
+    print(f"Turns: {len(turns)} over {len(banlists)} banlists")
+    print(f"Legacy check_banlist: {legacy_time * 1e6 / len(turns):.2f} us/turn, {outcome(run_legacy())}")
+    print(f"BanlistMatcher:       {matcher_time * 1e6 / len(turns):.2f} us/turn, {outcome(run_matcher())}")
+    print(f"check_many (batched): {batched_time * 1e6 / len(turns):.2f} us/turn")
+    print(f"Speedup: {legacy_time / matcher_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Records per second of writing and reading `DatasetEntry` JSONL, comparing the previous
+`json.loads` + `DatasetEntry(**obj)` reader with the `decode_entry` fast paths (validation from
+raw bytes, orjson when installed, trusted input) and the pydantic and orjson encoders.
+
+Write timings include `JsonlWriter`'s flush after every record.
+
+    python benchmarks/bench_serialization.py --records 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+
+from data_models import DatasetEntry, Story, GoldSemantics, Dialogue, Recovery
+from events import EVENT_HINTS
+from jsonl_io import JsonlWriter, ENTRY_ENCODERS, decode_entry, orjson
+from record_index import iter_record_spans
+from utils import generate_banlist
+
+
+def make_entries(count, seed):
+    """
+    `count` entries built from a pool of distinct ones, so generation does not dominate.
+    """
+    rng = random.Random(seed)
+    pool = []
+    for i in range(1000):
+        hint = rng.choice(EVENT_HINTS)
+        name = rng.choice(["Alice", "Bob", "Chen", "Dana"])
+        turns = [f"[Speaker {'AB'[t % 2]}]: " + " ".join(rng.choice("the a she was not here after all that day it".split()) for _ in range(25)) for t in range(rng.randint(2, 4))]
+        pool.append(DatasetEntry(
+            story=Story(text=" ".join(["Once upon a time"] * 12), hidden_event=hint, protagonist_name=name),
+            gold_semantics=GoldSemantics(hidden_event=hint, protagonist_name=name),
+            banlist=generate_banlist(hint),
+            dialogue=Dialogue(turns=turns),
+            recovery=Recovery(guesses=["a guess", "another guess", "a third guess"], success=i % 2 == 0) if i % 3 else None,
+        ))
+    return [pool[i % len(pool)] for i in range(count)]
+
+
+def legacy_decode(raw):
+    return DatasetEntry(**json.loads(raw))
+
+
+def time_read(path, decode):
+    start = time.perf_counter()
+    count = 0
+    with open(path, "rb") as f:
+        for _, raw in iter_record_spans(f):
+            decode(raw)
+            count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DatasetEntry JSONL read/write throughput")
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    entries = make_entries(args.records, args.seed)
+    encoders = [name for name in ENTRY_ENCODERS if name != "orjson" or orjson is not None]
+    readers = {
+        "json.loads + DatasetEntry(**obj)": legacy_decode,
+        "decode_entry": decode_entry,
+        "decode_entry (trusted)": lambda raw: decode_entry(raw, trusted=True),
+    }
+
+    print(f"Records: {args.records}, orjson: {'yes' if orjson is not None else 'no'}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "entries.jsonl")
+        for encoder in encoders:
+            start = time.perf_counter()
+            with JsonlWriter(path, "w", encoder=encoder) as writer:
+                for entry in entries:
+                    writer.write(entry)
+            rate = args.records / (time.perf_counter() - start)
+            print(f"write  {encoder:<34} {rate:>12,.0f} records/s")
+        print(f"file size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        for name, decode in readers.items():
+            print(f"read   {name:<34} {time_read(path, decode):>12,.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
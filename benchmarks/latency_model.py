@@ -0,0 +1,92 @@
+"""
+Mock `LLMWrapper` backend for benchmarks: responses come from the regular mock mode, but every
+engine call advances a virtual clock by the time a GPU would have needed for it, and judge
+verdicts can be made to reject at configurable rates.
+
+The clock is virtual so benchmarks stay fast and deterministic on CPU while still rewarding
+changes that batch more requests per engine call or make fewer / shorter calls.
+"""
+import json
+import os
+import random
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+
+from llm import LLMWrapper, GenerationRequest
+
+
+@dataclass
+class LatencyModel:
+    """
+    Cost of one engine call over a batch of requests.
+
+    Prefill is compute-bound, so it scales with the prompt tokens of the whole batch. Decode is
+    memory-bound: one step emits a token for every running sequence and costs about the same for
+    one sequence as for a few dozen, so the batch pays for its longest completion, with a small
+    per-sequence penalty per step.
+    """
+    call_overhead: float = 0.005
+    prefill_per_token: float = 0.00005
+    decode_per_step: float = 0.02
+    decode_batch_penalty: float = 0.01
+
+    def call_seconds(self, prompt_tokens: List[int], completion_tokens: List[int]) -> float:
+        if not prompt_tokens:
+            return 0.0
+        batch = len(prompt_tokens)
+        prefill = self.prefill_per_token * sum(prompt_tokens)
+        step = self.decode_per_step * (1 + self.decode_batch_penalty * (batch - 1))
+        return self.call_overhead + prefill + step * max(completion_tokens)
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+# Negative verdict of each judge stage, in the shape its output schema requires
+REJECTING_VERDICTS = {
+    "judge_story": {"valid": False, "reason": "benchmark rejection"},
+    "judge_dialogue": {"valid": False, "reason": "benchmark rejection"},
+    "judge_recovery": {"match": False, "matching_guess": None},
+}
+
+
+class LatencyModeledLLM(LLMWrapper):
+    """
+    Mock backend whose engine calls take `latency_model` time on `clock` and whose judges
+    reject with the per-stage probabilities in `rejection_rates` (e.g. `{"judge_story": 0.2}`).
+    """
+    def __init__(self, latency_model: Optional[LatencyModel] = None, rejection_rates: Optional[Dict[str, float]] = None,
+                 seed: int = 0, clock: Optional[VirtualClock] = None):
+        super().__init__("mock", device="cpu", mock=True)
+        unknown = set(rejection_rates or {}) - set(REJECTING_VERDICTS)
+        if unknown:
+            raise ValueError(f"Rejection rates given for stages without a judge: {sorted(unknown)}")
+        self.latency_model = latency_model or LatencyModel()
+        self.rejection_rates = dict(rejection_rates or {})
+        self.clock = clock or VirtualClock()
+        self.engine_calls = 0
+        self._rng = random.Random(seed)
+
+    def _run_engine(self, requests: List[GenerationRequest]) -> Tuple[List[List[str]], List[Tuple[int, int]]]:
+        results, token_counts = super()._run_engine(requests)
+        self.engine_calls += 1
+        self.clock.advance(self.latency_model.call_seconds(
+            [prompt for prompt, _ in token_counts],
+            # Candidates of one request are decoded side by side, like separate sequences
+            [completion // max(r.n, 1) for r, (_, completion) in zip(requests, token_counts)],
+        ))
+        return results, token_counts
+
+    def _mock_response(self, request: GenerationRequest) -> str:
+        rate = self.rejection_rates.get(request.stage, 0.0)
+        if rate and self._rng.random() < rate:
+            return json.dumps(REJECTING_VERDICTS[request.stage])
+        return super()._mock_response(request)
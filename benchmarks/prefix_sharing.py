@@ -0,0 +1,88 @@
+"""
+Measures how much of each dialogue prompt is a prefix already seen by an earlier request of the
+same entry, i.e. the part of prefill that vLLM's automatic prefix caching can reuse.
+
+Runs entirely in mock mode. Lengths are measured in characters of the rendered prompt, which is
+a close proxy for the token ratio.
+
+    python benchmarks/prefix_sharing.py --entries 20
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+
+from llm import LLMWrapper
+from generation_pipeline import DataGenerationPipeline
+from utils import generate_banlist
+
+
+class PromptRecordingLLM(LLMWrapper):
+    def __init__(self):
+        super().__init__("mock", device="cpu", mock=True)
+        self.rendered_prompts = []
+
+    def generate_candidates(self, requests, return_exceptions=False):
+        for r in requests:
+            self.rendered_prompts.append(self._render_prompt(r.system_prompt, r.user_prompt))
+        return super().generate_candidates(requests, return_exceptions)
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def shared_prefix_stats(prompts):
+    """
+    For every prompt after the first, counts the longest prefix it shares with any earlier prompt.
+    """
+    total = sum(len(p) for p in prompts)
+    shared = 0
+    for i, prompt in enumerate(prompts):
+        if i == 0:
+            continue
+        shared += max(common_prefix_length(prompt, earlier) for earlier in prompts[:i])
+    return shared, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-prefix ratio of dialogue prompts (mock mode)")
+    parser.add_argument("--entries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    llm = PromptRecordingLLM()
+    pipeline = DataGenerationPipeline(llm)
+    hints = ["won the lottery", "missed the train", "adopted a stray cat", "broke my phone screen"]
+
+    total_shared = 0
+    total_chars = 0
+    total_prompts = 0
+    for i in range(args.entries):
+        hint = hints[i % len(hints)]
+        story = pipeline._generate_story(hint)
+        llm.rendered_prompts = []
+        pipeline._generate_dialogue(story, hint, "Alice", generate_banlist(hint))
+
+        shared, total = shared_prefix_stats(llm.rendered_prompts)
+        total_shared += shared
+        total_chars += total
+        total_prompts += len(llm.rendered_prompts)
+
+    ratio = total_shared / total_chars if total_chars else 0.0
+    print(f"Entries: {args.entries}")
+    print(f"Dialogue prompts: {total_prompts}")
+    print(f"Prompt chars: {total_chars}")
+    print(f"Shared-prefix chars: {total_shared}")
+    print(f"Shared-prefix ratio: {ratio:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+CPU-only benchmark suite for the generation and recovery pipelines.
+
+LLM scenarios run on `LatencyModeledLLM`: their throughput is measured in entries per second of
+modeled engine time, which is deterministic for a given seed, so small changes in batching or in
+the number of LLM calls show up reliably. The I/O and aggregation scenarios are timed on the wall
+clock. Every scenario runs in a fresh process so its peak RSS is its own.
+
+Each run is compared against `benchmarks/baseline.json`; a metric that is worse than its baseline
+by more than its threshold counts as a regression and makes the script exit with status 1.
+
+    python benchmarks/run_benchmarks.py                        # all scenarios, compare to baseline
+    python benchmarks/run_benchmarks.py --scenarios recover
+    python benchmarks/run_benchmarks.py --update-baseline      # accept the current numbers
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.dirname(__file__))
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Per-judge rejection rates, roughly what the real judges reject on a 7B model
+DEFAULT_REJECTION_RATES = {"judge_story": 0.15, "judge_dialogue": 0.25, "judge_recovery": 0.4}
+
+# How far each metric may move in its bad direction before it counts as a regression.
+# Modeled throughput and call counts are deterministic; wall-clock and memory numbers vary by machine.
+DEFAULT_THRESHOLDS = {
+    "entries_per_sec": {"higher_is_better": True, "tolerance": 0.05},
+    "llm_calls_per_accepted": {"higher_is_better": False, "tolerance": 0.05},
+    "wall_entries_per_sec": {"higher_is_better": True, "tolerance": 0.5},
+    "peak_rss_mb": {"higher_is_better": False, "tolerance": 0.25},
+}
+
+
+def _llm_metrics(llm, accepted: int, started_wall: float) -> Dict[str, Any]:
+    snapshot = llm.metrics.snapshot(worker_id=0)
+    calls = sum(stage["requests"] for stage in snapshot["stages"].values())
+    return {
+        "accepted": accepted,
+        "entries_per_sec": accepted / llm.clock.now if llm.clock.now else 0.0,
+        "llm_calls_per_accepted": calls / accepted if accepted else float(calls),
+        "engine_calls": llm.engine_calls,
+        "modeled_seconds": llm.clock.now,
+        "wall_seconds": time.perf_counter() - started_wall,
+    }
+
+
+def _synthetic_entries(count: int, seed: int) -> List[Any]:
+    from data_models import Story, GoldSemantics, Dialogue, DatasetEntry
+    from events import EVENT_HINTS
+    from utils import generate_banlist
+
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        hint = rng.choice(EVENT_HINTS)
+        name = f"Person{i}"
+        turns = [f"[Speaker {1 + t % 2}]: I keep thinking about what happened to {name}, turn {t}." for t in range(rng.randint(2, 4))]
+        entries.append(DatasetEntry(
+            story=Story(text=f"{name} had a long day. Something changed. [{i}]", hidden_event=hint, protagonist_name=name),
+            gold_semantics=GoldSemantics(hidden_event=hint, protagonist_name=name),
+            banlist=generate_banlist(hint),
+            dialogue=Dialogue(turns=turns),
+        ))
+    return entries
+
+
+def scenario_generate(size: int, seed: int, batch_size: int = 1, recover: bool = False) -> Dict[str, Any]:
+    from latency_model import LatencyModeledLLM
+    from generation_pipeline import DataGenerationPipeline
+    from recovery_pipeline import RecoveryPipeline
+    from batched_generation import BatchedGenerationEngine
+    from events import EVENT_HINTS
+
+    random.seed(seed)
+    llm = LatencyModeledLLM(rejection_rates=DEFAULT_REJECTION_RATES, seed=seed)
+    pipeline = DataGenerationPipeline(llm)
+    recovery = RecoveryPipeline(llm, k=3) if recover else None
+    hints = [random.choice(EVENT_HINTS) for _ in range(size)]
+
+    started = time.perf_counter()
+    if batch_size > 1:
+        engine = BatchedGenerationEngine(pipeline, batch_size=batch_size, recovery=recovery)
+        entries = [entry for _, entry in engine.run(hints)]
+    else:
+        entries = [pipeline.run_single_iteration(hint) for hint in hints]
+    return _llm_metrics(llm, sum(entry is not None for entry in entries), started)
+
+
+def scenario_generate_batched(size: int, seed: int) -> Dict[str, Any]:
+    return scenario_generate(size, seed, batch_size=32)
+
+
+def scenario_generate_and_recover(size: int, seed: int) -> Dict[str, Any]:
+    """
+    Fused mode: recovery calls of accepted entries share engine calls with generation.
+    Accepted means generated; recovery success is not required.
+    """
+    return scenario_generate(size, seed, batch_size=32, recover=True)
+
+
+def scenario_recover(size: int, seed: int) -> Dict[str, Any]:
+    from latency_model import LatencyModeledLLM
+    from recovery_pipeline import RecoveryPipeline
+
+    random.seed(seed)
+    llm = LatencyModeledLLM(rejection_rates=DEFAULT_REJECTION_RATES, seed=seed)
+    pipeline = RecoveryPipeline(llm, k=3)
+    entries = _synthetic_entries(size, seed)
+
+    started = time.perf_counter()
+    accepted = sum(pipeline.run_recovery(entry).success for entry in entries)
+    return _llm_metrics(llm, accepted, started)
+
+
+def scenario_io(size: int, seed: int) -> Dict[str, Any]:
+    """
+    Writes `size` entries, indexes the file and reads it back in recover-sized chunks,
+    i.e. what one recover run does with its input besides calling the model.
+    """
+    from jsonl_io import JsonlWriter, iter_raw_record_range, decode_entry
+    from record_index import load_or_build_index
+    from work_queue import chunk_ranges
+
+    entries = _synthetic_entries(size, seed)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "entries.jsonl")
+        started = time.perf_counter()
+        with JsonlWriter(path, "w") as writer:
+            for entry in entries:
+                writer.write(entry)
+        offsets = load_or_build_index(path)
+        read = 0
+        with open(path, "rb") as f:
+            for start, stop in chunk_ranges(len(offsets), 16):
+                for raw in iter_raw_record_range(f, offsets[start], stop - start):
+                    decode_entry(raw)
+                    read += 1
+        elapsed = time.perf_counter() - started
+    return {"entries": read, "wall_entries_per_sec": read / elapsed, "wall_seconds": elapsed}
+
+
+def scenario_aggregate(size: int, seed: int, num_workers: int = 8) -> Dict[str, Any]:
+    """
+    End-of-run work over `num_workers` shard outputs: collecting finished ids (as `--resume`
+    does), merging the workers' metrics into the summary and sampling the review file.
+    """
+    from checkpoint import completed_ids
+    from jsonl_io import JsonlWriter
+    from metrics import MetricsWriter, load_final_snapshots, format_metrics_summary
+    from latency_model import LatencyModeledLLM
+    from recovery_pipeline import RecoveryPipeline
+    from review import write_review_samples
+
+    entries = _synthetic_entries(size, seed)
+    llm = LatencyModeledLLM(seed=seed)
+    for entry in entries[:num_workers]:
+        RecoveryPipeline(llm).run_recovery(entry)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        shards = [os.path.join(tmpdir, f"output_gpu_{i}.jsonl") for i in range(num_workers)]
+        metrics_files = [os.path.join(tmpdir, f"metrics_gpu_{i}.jsonl") for i in range(num_workers)]
+        for i, shard in enumerate(shards):
+            with JsonlWriter(shard, "w") as writer:
+                for entry in entries[i::num_workers]:
+                    writer.write(entry)
+            MetricsWriter(llm.metrics, i, metrics_files[i]).write()
+
+        started = time.perf_counter()
+        ids = completed_ids(shards)
+        format_metrics_summary(load_final_snapshots(metrics_files))
+        write_review_samples(shards, os.path.join(tmpdir, "review.txt"), size=100, seed=seed, stratify=["event"])
+        elapsed = time.perf_counter() - started
+    return {"entries": len(ids), "wall_entries_per_sec": len(ids) / elapsed, "wall_seconds": elapsed}
+
+
+SCENARIOS: Dict[str, Callable[[int, int], Dict[str, Any]]] = {
+    "generate": scenario_generate,
+    "generate_batched": scenario_generate_batched,
+    "generate_and_recover": scenario_generate_and_recover,
+    "recover": scenario_recover,
+    "io": scenario_io,
+    "aggregate": scenario_aggregate,
+}
+
+# Entries per scenario; large enough that per-run noise is small, small enough for a laptop
+DEFAULT_SIZES = {"generate": 200, "generate_batched": 200, "generate_and_recover": 200, "recover": 500, "io": 20000, "aggregate": 20000}
+
+
+def _run_scenario(name: str, size: int, seed: int) -> Dict[str, Any]:
+    # The pipelines print every rejection; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = SCENARIOS[name](size, seed)
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def run_isolated(name: str, size: int, seed: int) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_run_scenario, name, size, seed).result()
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]) -> List[str]:
+    """
+    Returns one message per metric that regressed beyond its threshold.
+    """
+    thresholds = baseline.get("thresholds", DEFAULT_THRESHOLDS)
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get("scenarios", {}).get(name, {})
+        for metric, rule in thresholds.items():
+            if metric not in result or metric not in expected or not expected[metric]:
+                continue
+            change = (result[metric] - expected[metric]) / expected[metric]
+            if not rule["higher_is_better"]:
+                change = -change
+            if change < -rule["tolerance"]:
+                regressions.append(
+                    f"{name}.{metric}: {result[metric]:.3f} vs baseline {expected[metric]:.3f} "
+                    f"({change:+.1%}, tolerance {rule['tolerance']:.0%})"
+                )
+    return regressions
+
+
+def format_report(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]) -> str:
+    lines = [f"{'scenario':<22}{'metric':<24}{'current':>12}{'baseline':>12}{'change':>9}"]
+    for name, result in results.items():
+        expected = baseline.get("scenarios", {}).get(name, {})
+        for metric, value in result.items():
+            if not isinstance(value, (int, float)):
+                continue
+            base = expected.get(metric)
+            change = f"{(value - base) / base:+.1%}" if base else ""
+            base_text = f"{base:.3f}" if base is not None else "-"
+            lines.append(f"{name:<22}{metric:<24}{value:>12.3f}{base_text:>12}{change:>9}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU-only pipeline benchmarks against a stored baseline")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier on every scenario's entry count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run's numbers as the new baseline")
+    args = parser.parse_args()
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.scale != 1.0 and baseline.get("scale", 1.0) != args.scale:
+        print(f"Note: baseline was recorded at scale {baseline.get('scale', 1.0)}, throughput is not comparable")
+
+    results = {}
+    for name in args.scenarios:
+        size = max(1, int(DEFAULT_SIZES[name] * args.scale))
+        print(f"Running {name} ({size} entries)...")
+        results[name] = run_isolated(name, size, args.seed)
+
+    print(format_report(results, baseline))
+
+    if args.update_baseline:
+        scenarios = dict(baseline.get("scenarios", {}))
+        scenarios.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "scale": args.scale,
+                "seed": args.seed,
+                "thresholds": baseline.get("thresholds", DEFAULT_THRESHOLDS),
+                "scenarios": scenarios,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline)
+    if regressions:
+        print("Regressions:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print("No regressions." if baseline else "No baseline to compare against; run with --update-baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,22 +3,69 @@ import multiprocessing
 import sys
 import os
 import json
+import random
+import glob
 
 # Add src to pythonpath so imports work easily from main
 sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
 
 from src.worker import worker_process
 from src.data_models import DatasetEntry
+from src.events import EVENT_HINTS
+from src.work_queue import WorkCoordinator, chunk_ranges, format_worker_stats
+from src.record_index import load_or_build_index
+from src.review import write_review_samples, STRATIFY_KEYS, REVIEW_FORMATS
+from src.columnar_export import export_columnar, arrow_available
+from src.generation_profiles import ProfileRegistry
+from src.metrics import load_final_snapshots, format_metrics_summary
+from src.dedup import DEDUP_PATTERN
+from src.scheduler import EventScheduler, load_quotas
+from src.checkpoint import OUTPUT_PATTERN, manifest_path_for, load_manifests, repair_jsonl_tail, completed_ids, pending_ranges, accepted_per_event, merge_in_input_order
 
 def main():
     parser = argparse.ArgumentParser(description="NLP Data Generation Pipeline")
     parser.add_argument("--model", type=str, default="mistralai/Mistral-7B-Instruct-v0.2", help="Model name or path")
     parser.add_argument("--num_gpus", type=int, default=1, help="Number of GPUs to use")
+    parser.add_argument("--num_workers", type=int, default=None, help="Number of worker processes, assigned to GPUs round-robin (default: one per GPU)")
     parser.add_argument("--iterations", type=int, default=10, help="Total iterations across all GPUs (Generation mode)")
     parser.add_argument("--mock", action="store_true", help="Run in mock mode (no GPU required)")
-    parser.add_argument("--mode", type=str, default="generate", choices=["generate", "recover"], help="Pipeline mode")
+    parser.add_argument("--mode", type=str, default="generate", choices=["generate", "recover", "generate_and_recover"], help="Pipeline mode (generate_and_recover runs recovery on every accepted entry as it is generated)")
     parser.add_argument("--input_file", type=str, default=None, help="Input file for recovery mode")
     parser.add_argument("--k", type=int, default=3, help="Number of guesses for recovery")
+    parser.add_argument("--recover_output", type=str, default="recovered.jsonl", help="Recovered entries of all workers merged in input order (Recovery mode)")
+    parser.add_argument("--recover_chunk_size", type=int, default=16, help="Entries per work unit handed to a worker (Recovery mode)")
+    parser.add_argument("--batch_size", type=int, default=1, help="Generation iterations kept in flight per worker (1 = sequential)")
+    parser.add_argument("--async_concurrency", type=int, default=0, help="Run iterations as coroutines on the async engine with at most this many in flight (0 = disabled)")
+    parser.add_argument("--cache_path", type=str, default=None, help="SQLite file for the persistent LLM response cache (disabled if unset)")
+    parser.add_argument("--cache_max_mb", type=int, default=1024, help="Size limit of the response cache before LRU eviction")
+    parser.add_argument("--cache_sampled", action="store_true", help="Also cache sampled (temperature > 0) calls")
+    parser.add_argument("--no_banlist_constraint", action="store_true", help="Only reject banned words after generation instead of blocking them during decoding (for comparison)")
+    parser.add_argument("--turn_candidates", type=int, default=1, help="Candidates sampled per dialogue turn in one call; the first passing the banlist is kept")
+    parser.add_argument("--profiles_config", type=str, default=None, help="JSON file overriding the per-stage generation profiles (story, dialogue_turn, judge, extract, recover)")
+    parser.add_argument("--prometheus_dir", type=str, default=None, help="Directory for per-worker Prometheus textfiles (e.g. a node_exporter textfile collector directory)")
+    parser.add_argument("--api_base", type=str, default=None, help="Base URL of an OpenAI-compatible server (e.g. http://host:8000/v1) to send requests to instead of loading the model in every worker")
+    parser.add_argument("--api_key", type=str, default=os.environ.get("OPENAI_API_KEY"), help="Bearer token for --api_base (default: $OPENAI_API_KEY)")
+    parser.add_argument("--http_concurrency", type=int, default=8, help="Requests each worker keeps in flight against --api_base")
+    parser.add_argument("--request_timeout", type=float, default=120.0, help="Seconds before an HTTP request to --api_base is abandoned and retried")
+    parser.add_argument("--max_retries", type=int, default=3, help="Retries per HTTP request on connection errors, timeouts, 429 and 5xx")
+    parser.add_argument("--review_size", type=int, default=10, help="Records sampled from all outputs for manual review")
+    parser.add_argument("--review_seed", type=int, default=0, help="Seed of the manual review sample")
+    parser.add_argument("--review_stratify", nargs="*", default=[], choices=sorted(STRATIFY_KEYS), help="Sample evenly across hidden events and/or recovery outcomes")
+    parser.add_argument("--review_format", type=str, default="text", choices=sorted(REVIEW_FORMATS), help="Format of the manual review file")
+    parser.add_argument("--review_file", type=str, default="manual_review_samples.txt", help="Where the manual review sample is written")
+    parser.add_argument("--export_path", type=str, default=None, help="Also export all outputs to a columnar dataset here (an .arrow file with pyarrow, else a directory of .npy columns)")
+    parser.add_argument("--export_format", type=str, default="auto", choices=["auto", "arrow", "npy"], help="Format of --export_path")
+    parser.add_argument("--trusted_input", action="store_true", help="Skip validating recover-mode input records (only for files this pipeline wrote; needs orjson to make a difference)")
+    parser.add_argument("--no_prejudge", action="store_true", help="Send every story and dialogue to the LLM judges instead of rejecting rule violations (third person, named protagonist, 3-5 sentences, hidden event phrase) locally first")
+    parser.add_argument("--dedup_threshold", type=float, default=0.0, help="Drop generated stories and dialogues whose estimated Jaccard similarity to one of an accepted entry reaches this, before they are judged (0 = disabled)")
+    parser.add_argument("--dedup_num_perm", type=int, default=128, help="MinHash permutations per signature for --dedup_threshold")
+    parser.add_argument("--dedup_dir", type=str, default=None, help="Directory where workers save their dedup indexes at the end of a run; with --resume every worker starts from all saved indexes merged")
+    parser.add_argument("--event_quota", type=int, default=0, help="Generate until every event has this many accepted entries instead of running --iterations random attempts (0 = disabled)")
+    parser.add_argument("--quota_config", type=str, default=None, help="JSON object of per-event quotas overriding --event_quota, e.g. {\"won the lottery\": 50}")
+    parser.add_argument("--breaker_attempts", type=int, default=20, help="Attempts after which an event below --min_acceptance_rate stops being scheduled")
+    parser.add_argument("--min_acceptance_rate", type=float, default=0.05, help="Acceptance rate below which the circuit breaker retires an event")
+    parser.add_argument("--max_attempts", type=int, default=0, help="Upper bound on attempts of a quota run (0 = unlimited)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run: keep existing outputs, skip finished entries and generate only the remaining iterations")
     
     args = parser.parse_args()
 
@@ -26,72 +73,158 @@ def main():
     if args.mock:
         print("Running in MOCK mode.")
     
-    iters_per_worker = args.iterations // args.num_gpus
+    num_workers = args.num_workers or args.num_gpus
     processes = []
     
-    print(f"Starting {args.num_gpus} workers. Mode: {args.mode}")
-
-    # Cleanup old output files to ensure we don't read stale data
-    # Only cleanup if generating, or maybe always? 
-    # If recovering, we write to output_gpu_X.jsonl too, so we should clean them.
-    for i in range(args.num_gpus):
-        out_file = f"output_gpu_{i}.jsonl"
-        if os.path.exists(out_file):
+    print(f"Starting {num_workers} workers on {args.num_gpus} GPUs. Mode: {args.mode}")
+
+    if args.profiles_config:
+        # Fail once here rather than in every worker
+        try:
+            profiles = ProfileRegistry.from_file(args.profiles_config)
+        except (OSError, ValueError) as e:
+            print(f"Could not load generation profiles from {args.profiles_config}: {e}")
+            return
+        print(f"Generation profiles: {json.dumps(profiles.to_dict())}")
+
+    if args.api_base and args.async_concurrency > 0:
+        print("--async_concurrency needs the in-process engine; with --api_base use --batch_size and --http_concurrency instead.")
+        return
+
+    if args.export_path and args.export_format == "arrow" and not arrow_available():
+        print("--export_format arrow needs pyarrow; install it or use --export_format npy.")
+        return
+
+    if args.prometheus_dir:
+        os.makedirs(args.prometheus_dir, exist_ok=True)
+
+    if not 0.0 <= args.dedup_threshold <= 1.0:
+        print("--dedup_threshold is a Jaccard similarity between 0 and 1.")
+        return
+
+    if args.dedup_dir:
+        os.makedirs(args.dedup_dir, exist_ok=True)
+
+    output_files = glob.glob(OUTPUT_PATTERN)
+    shards = [f"output_gpu_{i}.jsonl" for i in range(num_workers)]
+    if args.mode == "recover" and args.input_file and os.path.exists(args.input_file):
+        written_files = output_files + [args.recover_output] if os.path.exists(args.recover_output) else output_files
+        if any(os.path.samefile(args.input_file, f) for f in written_files):
+            print(f"Input file {args.input_file} would be overwritten by worker output. Copy or rename it first.")
+            return
+
+    if args.resume:
+        # A crash can leave half a record at the end of an output; cut it so appends start clean
+        for out_file in output_files:
+            removed = repair_jsonl_tail(out_file)
+            if removed:
+                print(f"Truncated {removed} bytes of partial record from {out_file}")
+    else:
+        # Outputs of workers this run does not have (an earlier run with more workers) would be
+        # neither overwritten nor merged; only a resumed run picks them up
+        foreign = sorted(f for f in output_files if f not in shards)
+        if foreign:
+            print(f"Found outputs of another run: {', '.join(foreign)}. Remove them, or pass --resume to continue that run.")
+            return
+        # Cleanup old output files to ensure we don't read stale data
+        # If recovering, we write to output_gpu_X.jsonl too, so we should clean them.
+        for out_file in output_files:
             os.remove(out_file)
+            if os.path.exists(manifest_path_for(out_file)):
+                os.remove(manifest_path_for(out_file))
+        # Saved dedup indexes describe the outputs just removed
+        if args.dedup_dir:
+            for index_file in glob.glob(os.path.join(args.dedup_dir, DEDUP_PATTERN)):
+                os.remove(index_file)
+
+    # Workers pull units from one shared queue as they free up, so a slow or
+    # rejection-heavy worker does not hold back the others.
+    coordinator = WorkCoordinator()
+    scheduler = None
+    if args.mode in ("generate", "generate_and_recover") and (args.event_quota or args.quota_config):
+        # Units are picked one at a time from the outcomes reported so far, see run_scheduled below
+        try:
+            quotas = load_quotas(args.quota_config, EVENT_HINTS, args.event_quota)
+        except (OSError, ValueError) as e:
+            print(f"Could not load event quotas from {args.quota_config}: {e}")
+            return
+        scheduler = EventScheduler(quotas, breaker_attempts=args.breaker_attempts,
+                                   min_acceptance_rate=args.min_acceptance_rate, max_attempts=args.max_attempts)
+        if args.resume:
+            accepted = accepted_per_event(glob.glob(OUTPUT_PATTERN))
+            scheduler.seed(accepted)
+            print(f"Resuming: {sum(accepted.values())} accepted entries count towards the quotas")
+        units = []
+    elif args.mode in ("generate", "generate_and_recover"):
+        remaining = args.iterations
+        if args.resume:
+            done = sum(m["attempted"] for m in load_manifests() if m.get("mode") == args.mode)
+            remaining = max(0, args.iterations - done)
+            print(f"Resuming: {done} iterations already done, {remaining} remaining")
+        units = [random.choice(EVENT_HINTS) for _ in range(remaining)]
+    elif args.input_file and os.path.exists(args.input_file):
+        # One pass over the input records the byte offset of every entry; workers then
+        # seek straight to the records of the ranges they are handed.
+        offsets = load_or_build_index(args.input_file)
+        if args.resume:
+            # Skip every input entry whose id already appears in some worker's output
+            done = completed_ids(glob.glob(OUTPUT_PATTERN))
+            units = pending_ranges(args.input_file, done, args.recover_chunk_size)
+            print(f"Resuming: {len(done)} entries already recovered, {sum(b - a for a, b in units)} pending")
+        else:
+            units = chunk_ranges(len(offsets), args.recover_chunk_size)
+    else:
+        units = []
+    if scheduler is None:
+        coordinator.submit(units, num_workers)
 
-    for i in range(args.num_gpus):
+    for i in range(num_workers):
         p = multiprocessing.Process(
             target=worker_process,
-            args=(i, i, iters_per_worker, args.model, args.mock, args.mode, args.input_file, args.k)
+            args=(i, i % args.num_gpus, coordinator.work_queue, coordinator.result_queue, args.model, args.mock, args.mode, args.input_file, args.k, args.batch_size, args.async_concurrency,
+                  args.cache_path, args.cache_max_mb, args.cache_sampled, args.resume,
+                  not args.no_banlist_constraint, args.turn_candidates, args.profiles_config,
+                  args.prometheus_dir, args.api_base, args.api_key, args.http_concurrency, args.request_timeout,
+                  args.max_retries, args.trusted_input, args.dedup_threshold, args.dedup_num_perm, args.dedup_dir,
+                  not args.no_prejudge)
         )
         p.start()
         processes.append(p)
 
+    if scheduler is not None:
+        # Enough units queued to keep every worker's in-flight slots busy, few enough that
+        # the next picks still see recent outcomes
+        window = 2 * num_workers * max(1, args.batch_size, args.async_concurrency)
+        worker_stats = coordinator.run_scheduled(scheduler, processes, window)
+    else:
+        worker_stats = coordinator.collect_stats(processes)
+
     for p in processes:
         p.join()
 
-    print("All workers finished. Aggregating manual review buffer...")
-    
-    # Aggregate first 10 examples for manual review
-    manual_review_file = "manual_review_samples.txt"
-    count = 0
-    with open(manual_review_file, "w") as out:
-        for i in range(args.num_gpus):
-            out_file = f"output_gpu_{i}.jsonl"
-            if os.path.exists(out_file):
-                with open(out_file, "r") as f:
-                    file_content = f.read().strip()
-                    if not file_content: continue
-                    
-                    decoder = json.JSONDecoder()
-                    pos = 0
-                    while pos < len(file_content) and count < 10:
-                        try:
-                            # Skip whitespace
-                            while pos < len(file_content) and file_content[pos].isspace():
-                                pos += 1
-                            if pos >= len(file_content): break
-                            
-                            data, next_pos = decoder.raw_decode(file_content, pos)
-                            pos = next_pos
-                            
-                            out.write(f"--- Sample {count+1} ---\n")
-                            out.write(f"Story: {data['story']['text']}\n")
-                            out.write(f"Hidden Event: {data['gold_semantics']['hidden_event']}\n")
-                            out.write(f"Protagonist: {data['gold_semantics']['protagonist_name']}\n")
-                            out.write(f"Dialogue: {json.dumps(data['dialogue']['turns'], indent=2)}\n")
-                            
-                            if 'recovery' in data and data['recovery']:
-                                out.write(f"Guesses: {json.dumps(data['recovery']['guesses'], indent=2)}\n")
-                                out.write(f"Success: {data['recovery']['success']}\n")
-                            
-                            out.write("\n")
-                            count += 1
-                        except json.JSONDecodeError:
-                            break
-            if count >= 10: break
-            
-    print(f"Manual review samples saved to {manual_review_file}")
+    print(format_worker_stats(worker_stats))
+    if scheduler is not None:
+        print(scheduler.summary())
+    print(format_metrics_summary(load_final_snapshots([f"metrics_gpu_{i}.jsonl" for i in range(num_workers)])))
+
+    print("All workers finished. Sampling records for manual review...")
+
+    if args.mode == "recover" and args.input_file and os.path.exists(args.input_file):
+        # Which worker recovered an entry depends on scheduling, so the shards differ from run
+        # to run; the merged file is in input order and the same for the same input
+        written, missing = merge_in_input_order(args.input_file, [f for f in shards if os.path.exists(f)], args.recover_output)
+        print(f"Merged {written} recovered entries in input order into {args.recover_output}"
+              + (f" ({missing} input entries not recovered)" if missing else ""))
+    # One streaming pass over every shard; only the sampled records are kept in memory
+    count = write_review_samples(
+        [f for f in shards if os.path.exists(f)], args.review_file, size=args.review_size,
+        seed=args.review_seed, stratify=args.review_stratify, fmt=args.review_format,
+    )
+    print(f"{count} manual review samples saved to {args.review_file}")
+
+    if args.export_path:
+        fmt, rows = export_columnar([f for f in shards if os.path.exists(f)], args.export_path, args.export_format)
+        print(f"Exported {rows} entries to {args.export_path} ({fmt})")
 
 if __name__ == "__main__":
     # Ensure spawn method for CUDA compatibility
@@ -0,0 +1,171 @@
+import asyncio
+import random
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, TypeVar
+
+from llm import AsyncLLMWrapper
+from data_models import Story, GoldSemantics, Dialogue, DatasetEntry, Recovery
+from utils import generate_banlist
+from judge import Judge
+from generation_pipeline import DataGenerationPipeline
+from recovery_pipeline import RecoveryPipeline
+from metrics import track_entry_usage
+from dedup import NearDuplicateFilter
+from prejudge import PreJudge
+from work_queue import as_unit_source
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class AsyncJudge(Judge):
+    """
+    Judge whose checks are coroutines, for use with `AsyncLLMWrapper`.
+    """
+    def __init__(self, llm: AsyncLLMWrapper):
+        super().__init__(llm)
+
+    async def check_story(self, hidden_event: str, story_text: str) -> bool:
+        response = await self.llm.generate_request(self._story_request(hidden_event, story_text))
+        return self._parse_verdict(response, "valid")
+
+    async def check_dialogue(self, hidden_event: str, story_text: str, dialogue_text: str) -> bool:
+        response = await self.llm.generate_request(self._dialogue_request(hidden_event, story_text, dialogue_text))
+        return self._parse_verdict(response, "valid")
+
+    async def check_recovery(self, hidden_event: str, guesses: List[str]) -> bool:
+        response = await self.llm.generate_request(self._recovery_request(hidden_event, guesses))
+        return self._parse_verdict(response, "match")
+
+
+class AsyncDataGenerationPipeline(DataGenerationPipeline):
+    """
+    Same steps as `DataGenerationPipeline.run_single_iteration`, awaiting each LLM call so
+    that many iterations can share one engine.
+    """
+    def __init__(self, llm: AsyncLLMWrapper, constrain_banlist: bool = True, turn_candidates: int = 1,
+                 dedup: Optional[NearDuplicateFilter] = None, prejudge: Optional[PreJudge] = None):
+        super().__init__(llm, constrain_banlist=constrain_banlist, turn_candidates=turn_candidates,
+                         dedup=dedup, prejudge=prejudge)
+        self.judge = AsyncJudge(llm)
+
+    async def run_single_iteration(self, event_hint: str) -> Optional[DatasetEntry]:
+        # Each iteration runs in its own task, so the usage context is not shared
+        with track_entry_usage() as usage:
+            entry = await self._run_iteration(event_hint)
+        self.llm.metrics.record_entry(entry is not None, usage)
+        return entry
+
+    async def _run_iteration(self, event_hint: str) -> Optional[DatasetEntry]:
+        try:
+            # Step 1: Story Generation
+            story_text = await self.llm.generate_request(self._story_request(event_hint))
+
+            # Step 1.1: Pre-judge rules and near-duplicates are rejected without a judge call
+            if self._reject_story(event_hint, story_text):
+                return None
+
+            # Step 1.5: Judge Story
+            if self._reject_judged_story(event_hint, await self.judge.check_story(event_hint, story_text)):
+                return None
+
+            # Step 2: Extract Protagonist
+            protagonist_name = (await self.llm.generate_request(self._protagonist_request(story_text))).strip()
+
+            story = Story(text=story_text, hidden_event=event_hint, protagonist_name=protagonist_name)
+            gold_semantics = GoldSemantics(hidden_event=event_hint, protagonist_name=protagonist_name)
+
+            # Step 3: Banlist Creation
+            banlist = generate_banlist(event_hint)
+
+            # Step 4: Dialogue Generation (Dynamic Turns)
+            dialogue = await self._generate_dialogue(story_text, event_hint, protagonist_name, banlist)
+            if not dialogue:
+                self.llm.metrics.record_rejection("dialogue_turn")
+                return None
+
+            if self._reject_dialogue(event_hint, dialogue.turns):
+                return None
+
+            # Step 4.5: Judge Dialogue
+            dialogue_text = "\n".join(dialogue.turns)
+            valid = await self.judge.check_dialogue(event_hint, story_text, dialogue_text)
+            if self._reject_judged_dialogue(event_hint, story_text, dialogue.turns, valid):
+                return None
+
+            return DatasetEntry(
+                story=story,
+                gold_semantics=gold_semantics,
+                banlist=banlist,
+                dialogue=dialogue
+            )
+
+        except Exception as e:
+            print(f"Error in generation pipeline: {e}")
+            return None
+
+    async def _generate_dialogue(self, story: str, hidden_event: str, protagonist: str, banlist: list, max_retries: int = 3) -> Optional[Dialogue]:
+        # Dynamic turns: 2 to 4
+        num_turns = random.randint(2, 4)
+        current_turns = []
+
+        for i in range(num_turns):
+            turn_response = None
+            for attempt in range(max_retries):
+                request = self._dialogue_turn_request(story, hidden_event, protagonist, banlist, current_turns)
+                candidates = await self.llm.generate_candidates_request(request)
+                turn_response = self._select_candidate(candidates, banlist, attempt)
+                if turn_response is not None:
+                    break
+
+            if turn_response is None:
+                self.dialogue_stats.failed_dialogues += 1
+                return None
+
+            current_turns.append(self._format_turn(i, turn_response))
+
+        return Dialogue(turns=current_turns)
+
+
+class AsyncRecoveryPipeline(RecoveryPipeline):
+    def __init__(self, llm: AsyncLLMWrapper, k: int = 3):
+        super().__init__(llm, k=k)
+        self.judge = AsyncJudge(llm)
+
+    async def run_recovery(self, entry: DatasetEntry) -> Recovery:
+        dialogue_text = "\n".join(entry.dialogue.turns)
+
+        with track_entry_usage() as usage:
+            # Generate guesses
+            response = await self.llm.generate_request(self._guesses_request(dialogue_text))
+            guesses = self._parse_guesses(response)
+
+            # Evaluate
+            success = await self.judge.check_recovery(entry.gold_semantics.hidden_event, guesses)
+
+        self._record_outcome(success, usage)
+        return Recovery(guesses=guesses, success=success)
+
+
+async def bounded_as_completed(items: Iterable[T], fn: Callable[[T], Awaitable[R]], concurrency: int) -> AsyncIterator[R]:
+    """
+    Runs `fn(item)` for every item with at most `concurrency` coroutines alive at once and
+    yields results in completion order. Items are pulled lazily, so `items` may be a
+    `UnitSource` over the shared work queue.
+    """
+    items = as_unit_source(items)
+    pending = set()
+
+    while True:
+        while len(pending) < concurrency:
+            # Only wait for new items while no task is running (see `UnitSource`)
+            item = items.poll(block=not pending)
+            if item is None:
+                break
+            pending.add(asyncio.ensure_future(fn(item)))
+
+        if not pending:
+            return
+
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
@@ -0,0 +1,211 @@
+import random
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from llm import GenerationRequest
+from data_models import Story, GoldSemantics, Dialogue, DatasetEntry, Recovery
+from utils import generate_banlist
+from generation_pipeline import DataGenerationPipeline
+from recovery_pipeline import RecoveryPipeline
+from metrics import EntryUsage
+from work_queue import as_unit_source
+
+# Stages an in-flight iteration moves through, in order.
+STAGE_STORY = "story"
+STAGE_JUDGE_STORY = "judge_story"
+STAGE_PROTAGONIST = "protagonist"
+STAGE_DIALOGUE = "dialogue"
+STAGE_JUDGE_DIALOGUE = "judge_dialogue"
+# Only with a `recovery` pipeline (generate_and_recover mode)
+STAGE_RECOVERY = "recovery"
+STAGE_JUDGE_RECOVERY = "judge_recovery"
+
+
+class _InFlightIteration:
+    """
+    State of one `run_single_iteration` equivalent while it waits for its next LLM call.
+    """
+    def __init__(self, event_hint: str):
+        self.event_hint = event_hint
+        self.stage = STAGE_STORY
+        self.story_text = ""
+        self.protagonist_name = ""
+        self.banlist: List[str] = []
+        self.num_turns = 0
+        self.turns: List[str] = []
+        # Sampling calls made so far for the current turn
+        self.turn_attempt = 0
+        self.entry: Optional[DatasetEntry] = None
+        self.guesses: List[str] = []
+        self.done = False
+        # Tokens of this iteration's calls; its requests share engine calls with other iterations
+        self.usage = EntryUsage()
+        # Set once `_advance` has recorded the entry (on acceptance, before any recovery stage)
+        self.accounted = False
+
+
+class BatchedGenerationEngine:
+    """
+    Runs many `DataGenerationPipeline` iterations at once.
+
+    Each tick collects the next LLM request of every in-flight iteration and submits them
+    in a single `generate_batch` call, so a cohort started together moves through the stages
+    as one wave (all stories, then all story judgments, then all protagonist extractions, ...).
+    Iterations that finish or get rejected leave the cohort and their slot is refilled with
+    the next event hint.
+
+    With a `recovery` pipeline, every accepted entry goes on to the recovery stages (guesses,
+    then the recovery judge) in the same cohort, so recovery calls share engine calls with the
+    generation calls of other iterations and the entry comes out with `recovery` filled in.
+    """
+    def __init__(self, pipeline: DataGenerationPipeline, batch_size: int = 32, max_turn_retries: int = 3,
+                 recovery: Optional[RecoveryPipeline] = None):
+        self.pipeline = pipeline
+        self.llm = pipeline.llm
+        self.judge = pipeline.judge
+        self.batch_size = batch_size
+        self.max_turn_retries = max_turn_retries
+        self.recovery = recovery
+
+    def run(self, event_hints: Iterable[str]) -> Iterator[Tuple[str, Optional[DatasetEntry]]]:
+        """
+        Yields `(event_hint, entry)` for every hint as soon as its iteration completes.
+        `entry` is None when the iteration was rejected, mirroring `run_single_iteration`.
+        `event_hints` is an iterable or a `UnitSource` over the shared work queue.
+        """
+        hints = as_unit_source(event_hints)
+        in_flight: List[_InFlightIteration] = []
+
+        while True:
+            while len(in_flight) < self.batch_size:
+                # Only wait for new hints while the cohort is empty (see `UnitSource`)
+                hint = hints.poll(block=not in_flight)
+                if hint is None:
+                    break
+                in_flight.append(_InFlightIteration(hint))
+
+            if not in_flight:
+                return
+
+            requests = [self._next_request(item) for item in in_flight]
+            for item, request in zip(in_flight, requests):
+                request.usage = item.usage
+            try:
+                # A request failing on its own only rejects the iteration it belongs to
+                responses = self.llm.generate_candidates(requests, return_exceptions=True)
+            except Exception as e:
+                print(f"Error in batched generation: {e}")
+                for item in in_flight:
+                    self.llm.metrics.record_entry(False, item.usage)
+                    yield item.event_hint, None
+                in_flight = []
+                continue
+
+            still_running = []
+            for item, response in zip(in_flight, responses):
+                try:
+                    if isinstance(response, Exception):
+                        raise response
+                    self._advance(item, response)
+                except Exception as e:
+                    print(f"Error in generation pipeline: {e}")
+                    item.done = True
+                    item.entry = None
+
+                if item.done:
+                    if not item.accounted:
+                        self.llm.metrics.record_entry(item.entry is not None, item.usage)
+                    yield item.event_hint, item.entry
+                else:
+                    still_running.append(item)
+            in_flight = still_running
+
+    def _next_request(self, item: _InFlightIteration) -> GenerationRequest:
+        if item.stage == STAGE_STORY:
+            return self.pipeline._story_request(item.event_hint)
+        if item.stage == STAGE_JUDGE_STORY:
+            return self.judge._story_request(item.event_hint, item.story_text)
+        if item.stage == STAGE_PROTAGONIST:
+            return self.pipeline._protagonist_request(item.story_text)
+        if item.stage == STAGE_DIALOGUE:
+            return self.pipeline._dialogue_turn_request(
+                item.story_text, item.event_hint, item.protagonist_name, item.banlist, item.turns
+            )
+        if item.stage == STAGE_JUDGE_DIALOGUE:
+            return self.judge._dialogue_request(item.event_hint, item.story_text, "\n".join(item.turns))
+        if item.stage == STAGE_RECOVERY:
+            return self.recovery._guesses_request("\n".join(item.turns))
+        if item.stage == STAGE_JUDGE_RECOVERY:
+            return self.recovery.judge._recovery_request(item.event_hint, item.guesses)
+        raise ValueError(f"Unknown stage: {item.stage}")
+
+    def _advance(self, item: _InFlightIteration, candidates: List[str]):
+        # Only dialogue turns ask for several candidates
+        response = candidates[0]
+        if item.stage == STAGE_STORY:
+            item.story_text = response
+            if self.pipeline._reject_story(item.event_hint, response):
+                item.done = True
+                return
+            item.stage = STAGE_JUDGE_STORY
+
+        elif item.stage == STAGE_JUDGE_STORY:
+            if self.pipeline._reject_judged_story(item.event_hint, self.judge._parse_verdict(response, "valid")):
+                item.done = True
+                return
+            item.stage = STAGE_PROTAGONIST
+
+        elif item.stage == STAGE_PROTAGONIST:
+            item.protagonist_name = response.strip()
+            item.banlist = generate_banlist(item.event_hint)
+            item.num_turns = random.randint(2, 4)
+            item.stage = STAGE_DIALOGUE
+
+        elif item.stage == STAGE_DIALOGUE:
+            turn = self.pipeline._select_candidate(candidates, item.banlist, item.turn_attempt)
+            if turn is None:
+                # Same policy as the sequential path: resample only this turn
+                item.turn_attempt += 1
+                if item.turn_attempt >= self.max_turn_retries:
+                    self.pipeline.dialogue_stats.failed_dialogues += 1
+                    self.llm.metrics.record_rejection("dialogue_turn")
+                    item.done = True
+                return
+            item.turn_attempt = 0
+            item.turns.append(self.pipeline._format_turn(len(item.turns), turn))
+            if len(item.turns) == item.num_turns:
+                if self.pipeline._reject_dialogue(item.event_hint, item.turns):
+                    item.done = True
+                    return
+                item.stage = STAGE_JUDGE_DIALOGUE
+
+        elif item.stage == STAGE_JUDGE_DIALOGUE:
+            valid = self.judge._parse_verdict(response, "valid")
+            if self.pipeline._reject_judged_dialogue(item.event_hint, item.story_text, item.turns, valid):
+                item.done = True
+                return
+            story = Story(text=item.story_text, hidden_event=item.event_hint, protagonist_name=item.protagonist_name)
+            gold_semantics = GoldSemantics(hidden_event=item.event_hint, protagonist_name=item.protagonist_name)
+            item.entry = DatasetEntry(
+                story=story,
+                gold_semantics=gold_semantics,
+                banlist=item.banlist,
+                dialogue=Dialogue(turns=item.turns)
+            )
+            if self.recovery is None:
+                item.done = True
+                return
+            # Account generation and recovery separately, as two sequential runs would
+            self.llm.metrics.record_entry(True, item.usage)
+            item.accounted = True
+            item.usage = EntryUsage()
+            item.stage = STAGE_RECOVERY
+
+        elif item.stage == STAGE_RECOVERY:
+            item.guesses = self.recovery._parse_guesses(response)
+            item.stage = STAGE_JUDGE_RECOVERY
+
+        elif item.stage == STAGE_JUDGE_RECOVERY:
+            success = self.recovery.judge._parse_verdict(response, "match")
+            item.entry.recovery = Recovery(guesses=item.guesses, success=success)
+            self.recovery._record_outcome(success, item.usage)
+            item.done = True
@@ -0,0 +1,201 @@
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from data_models import compute_entry_id
+from jsonl_io import iter_records, iter_raw_record_range
+from record_index import iter_record_spans
+from work_queue import chunk_ranges
+
+OUTPUT_PATTERN = "output_gpu_*.jsonl"
+
+
+def manifest_path_for(output_file: str) -> str:
+    return os.path.splitext(output_file)[0] + ".progress.json"
+
+
+class ProgressManifest:
+    """
+    Per-worker progress counters, rewritten atomically after every processed unit so that a
+    restarted run knows how much work is already done.
+    """
+    def __init__(self, path: str, worker_id: int, mode: str, resume: bool = False):
+        self.path = path
+        self.worker_id = worker_id
+        self.mode = mode
+        self.attempted = 0
+        self.accepted = 0
+
+        if resume and os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("mode") == mode:
+                self.attempted = data.get("attempted", 0)
+                self.accepted = data.get("accepted", 0)
+
+    def record(self, accepted: bool):
+        self.attempted += 1
+        if accepted:
+            self.accepted += 1
+        self.save()
+
+    def save(self):
+        data = {
+            "worker_id": self.worker_id,
+            "mode": self.mode,
+            "attempted": self.attempted,
+            "accepted": self.accepted,
+            "updated_at": time.time(),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_manifests(output_pattern: str = OUTPUT_PATTERN) -> List[Dict[str, Any]]:
+    manifests = []
+    for output_file in sorted(glob.glob(output_pattern)):
+        path = manifest_path_for(output_file)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def repair_jsonl_tail(path: str) -> int:
+    """
+    Truncates a partially written trailing record (a crash mid-write) so that appending can
+    resume on a clean line boundary. Returns the number of bytes removed.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+
+    with open(path, "rb+") as f:
+        # Find the start of the last line
+        block = 64 * 1024
+        last_newline = -1
+        f.seek(size - 1)
+        ends_with_newline = f.read(1) == b"\n"
+        search_end = size - 1 if ends_with_newline else size
+        pos = search_end
+        while pos > 0 and last_newline < 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            idx = chunk.rfind(b"\n")
+            if idx >= 0:
+                last_newline = start + idx
+            pos = start
+
+        line_start = last_newline + 1
+        f.seek(line_start)
+        last_line = f.read(search_end - line_start)
+
+        keep = size
+        if not ends_with_newline:
+            keep = line_start
+        elif last_line.lstrip().startswith(b"{"):
+            try:
+                json.loads(last_line)
+            except json.JSONDecodeError:
+                keep = line_start
+
+        if keep < size:
+            f.truncate(keep)
+        return size - keep
+
+
+def record_id(obj: Dict[str, Any]) -> str:
+    """
+    Same id as `DatasetEntry.stable_id`, computed from a raw record dict.
+    """
+    if obj.get("id"):
+        return obj["id"]
+    return compute_entry_id(obj["story"]["text"], obj["gold_semantics"]["hidden_event"], obj["dialogue"]["turns"])
+
+
+def completed_ids(paths: Iterable[str]) -> Set[str]:
+    ids = set()
+    for path in paths:
+        for obj in iter_records(path):
+            ids.add(record_id(obj))
+    return ids
+
+
+def accepted_per_event(paths: Iterable[str]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for path in paths:
+        for obj in iter_records(path):
+            event = obj["gold_semantics"]["hidden_event"]
+            counts[event] = counts.get(event, 0) + 1
+    return counts
+
+
+def merge_in_input_order(input_file: str, shards: Iterable[str], output_path: str) -> Tuple[int, int]:
+    """
+    Writes the records of the recovery `shards` to `output_path` in the order of their entries
+    in `input_file`, so the merged output of a run does not depend on which worker happened to
+    pull which range. Only the shard offsets are kept in memory. Returns `(written, missing)`,
+    where `missing` counts input entries no shard holds (e.g. an interrupted run).
+    """
+    shards = list(shards)
+    locations: Dict[str, List[Tuple[int, int]]] = {}
+    for shard_index, path in enumerate(shards):
+        with open(path, "rb") as f:
+            for offset, raw in iter_record_spans(f):
+                locations.setdefault(record_id(json.loads(raw)), []).append((shard_index, offset))
+
+    handles = [open(path, "rb") for path in shards]
+    written = missing = 0
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as out:
+            for obj in iter_records(input_file):
+                found = locations.get(record_id(obj))
+                if not found:
+                    missing += 1
+                    continue
+                # Input entries with the same content take their copies in order
+                shard_index, offset = found.pop(0)
+                out.write(next(iter_raw_record_range(handles[shard_index], offset, 1)) + b"\n")
+                written += 1
+        os.replace(tmp_path, output_path)
+    finally:
+        for handle in handles:
+            handle.close()
+    return written, missing
+
+
+def pending_ranges(input_file: str, done: Set[str], chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Walks the input once and returns `(start, stop)` index ranges, each at most `chunk_size`
+    long, covering only the entries whose id is not in `done`.
+    """
+    ranges = []
+    run_start = None
+    index = -1
+    with open(input_file, "rb") as f:
+        # Indices must match the record index, which also counts records that do not parse;
+        # those stay pending and the worker reading them skips them
+        for index, (_, raw) in enumerate(iter_record_spans(f)):
+            try:
+                finished = record_id(json.loads(raw)) in done
+            except json.JSONDecodeError:
+                finished = False
+            if finished:
+                if run_start is not None:
+                    ranges.extend(_shifted_chunks(run_start, index, chunk_size))
+                    run_start = None
+            elif run_start is None:
+                run_start = index
+    if run_start is not None:
+        ranges.extend(_shifted_chunks(run_start, index + 1, chunk_size))
+    return ranges
+
+
+def _shifted_chunks(start: int, stop: int, chunk_size: int) -> List[Tuple[int, int]]:
+    return [(start + a, start + b) for a, b in chunk_ranges(stop - start, chunk_size)]
@@ -0,0 +1,381 @@
+"""
+Columnar export of `output_gpu_*.jsonl` for training jobs.
+
+The JSONL records repeat the hidden event and the protagonist several times per line and keep
+every turn as quoted JSON text. The export stores each field once, as columns:
+
+- `event`, `protagonist` and `banlist` are dictionary-encoded (an int32 code per entry plus a
+  table of distinct values);
+- `id`, `story_text`, `turns`, `guesses` and `metrics` are strings in one flat UTF-8 buffer
+  addressed by int64 offsets; `turns` and `guesses` add per-entry offsets into those strings;
+- `recovery` is an int8 column (-1 no recovery, 0 failed, 1 succeeded).
+
+Two on-disk formats hold these columns:
+
+- Arrow IPC (`.arrow`), written when pyarrow is installed (dictionary and list types map onto
+  Arrow's own);
+- otherwise a directory of `.npy` files plus `meta.json`. The `.npy` files are written without
+  numpy, in its version 1.0 format, so `numpy.load(..., mmap_mode="r")` reads them as-is.
+
+Both formats are memory-mapped on load and `ColumnarDataset.entries(start, stop)` only decodes
+the requested rows.
+
+    python src/columnar_export.py output_gpu_*.jsonl --out dataset_npy
+"""
+import argparse
+import ast
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from data_models import DatasetEntry
+from jsonl_io import iter_entries
+
+FORMAT_VERSION = 1
+
+# array typecode <-> numpy descr of the columns we write
+_NPY_DESCR = {"q": "<i8", "i": "<i4", "b": "|i1", "B": "|u1"}
+_NPY_TYPECODE = {descr: code for code, descr in _NPY_DESCR.items()}
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def arrow_available() -> bool:
+    return _arrow() is not None
+
+
+class StringColumn:
+    """
+    Strings appended to one UTF-8 buffer; string i is `buffer[offsets[i]:offsets[i + 1]]`.
+    """
+    def __init__(self):
+        self.offsets = array("q", [0])
+        self.buffer = bytearray()
+
+    def append(self, text: str):
+        self.buffer += text.encode("utf-8")
+        self.offsets.append(len(self.buffer))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class ListColumn:
+    """
+    Lists of strings: entry i holds strings `offsets[i]` to `offsets[i + 1]` of `values`.
+    """
+    def __init__(self):
+        self.offsets = array("q", [0])
+        self.values = StringColumn()
+
+    def append(self, items: List[str]):
+        for item in items:
+            self.values.append(item)
+        self.offsets.append(len(self.values))
+
+
+class DictionaryColumn:
+    """
+    int32 code per entry into a table of the distinct values seen.
+    """
+    def __init__(self):
+        self.codes = array("i")
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def append(self, value: str):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+
+class ColumnBuilder:
+    def __init__(self):
+        self.ids = StringColumn()
+        self.event = DictionaryColumn()
+        self.protagonist = DictionaryColumn()
+        # Banlists are derived from the event but stored as generated, since the rules can change
+        self.banlist = DictionaryColumn()
+        self.story_text = StringColumn()
+        self.turns = ListColumn()
+        self.recovery = array("b")
+        self.guesses = ListColumn()
+        self.metrics = StringColumn()
+        # Entries left out because the columns cannot hold them (see `add`)
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry: DatasetEntry) -> bool:
+        """
+        Appends `entry` and returns True. The story's event and protagonist are only stored once,
+        as the gold semantics, so an entry whose story disagrees with them is skipped with a
+        warning (and counted in `skipped`) rather than exported with one of the two lost.
+        """
+        if (entry.story.hidden_event != entry.gold_semantics.hidden_event
+                or entry.story.protagonist_name != entry.gold_semantics.protagonist_name):
+            print(f"Skipping entry {entry.stable_id()}: its story disagrees with its gold semantics")
+            self.skipped += 1
+            return False
+        self.ids.append(entry.stable_id())
+        self.event.append(entry.gold_semantics.hidden_event)
+        self.protagonist.append(entry.gold_semantics.protagonist_name)
+        self.banlist.append(json.dumps(entry.banlist, ensure_ascii=False))
+        self.story_text.append(entry.story.text)
+        self.turns.append(entry.dialogue.turns)
+        if entry.recovery is None:
+            self.recovery.append(-1)
+            self.guesses.append([])
+        else:
+            self.recovery.append(int(entry.recovery.success))
+            self.guesses.append(entry.recovery.guesses)
+        self.metrics.append(json.dumps(entry.metrics) if entry.metrics is not None else "")
+        return True
+
+    def arrays(self) -> Dict[str, array]:
+        """
+        Every column as a flat array, keyed by the file name it is stored under.
+        """
+        return {
+            "id_offsets": self.ids.offsets, "id_data": array("B", self.ids.buffer),
+            "event_codes": self.event.codes,
+            "protagonist_codes": self.protagonist.codes,
+            "banlist_codes": self.banlist.codes,
+            "story_offsets": self.story_text.offsets, "story_data": array("B", self.story_text.buffer),
+            "turn_lists": self.turns.offsets,
+            "turn_offsets": self.turns.values.offsets, "turn_data": array("B", self.turns.values.buffer),
+            "recovery": self.recovery,
+            "guess_lists": self.guesses.offsets,
+            "guess_offsets": self.guesses.values.offsets, "guess_data": array("B", self.guesses.values.buffer),
+            "metrics_offsets": self.metrics.offsets, "metrics_data": array("B", self.metrics.buffer),
+        }
+
+    def dictionaries(self) -> Dict[str, List[str]]:
+        return {"event": self.event.values, "protagonist": self.protagonist.values, "banlist": self.banlist.values}
+
+
+def export_columnar(paths: Iterable[str], out_path: str, fmt: str = "auto") -> Tuple[str, int]:
+    """
+    Converts the JSONL outputs in `paths` into one columnar dataset at `out_path` and returns
+    the format used ("arrow" or "npy") and the number of entries.
+    """
+    if fmt == "auto":
+        fmt = "arrow" if _arrow() is not None else "npy"
+    if fmt == "arrow" and _arrow() is None:
+        raise ImportError("pyarrow is required for the Arrow export; use the npy format instead")
+
+    builder = ColumnBuilder()
+    for path in paths:
+        for entry in iter_entries(path):
+            builder.add(entry)
+    if builder.skipped:
+        print(f"Skipped {builder.skipped} entries whose story disagrees with their gold semantics")
+
+    if fmt == "arrow":
+        _write_arrow(builder, out_path)
+    elif fmt == "npy":
+        _write_npy_dir(builder, out_path)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return fmt, len(builder)
+
+
+def _write_npy(path: str, values: array):
+    if sys.byteorder != "little":
+        raise RuntimeError("The npy export assumes a little-endian host")
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (_NPY_DESCR[values.typecode], len(values))
+    # Magic (6) + version (2) + header length (2) + header, padded with spaces to a multiple of 64
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = header + " " * (padding % 64) + "\n"
+    with open(path, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        values.tofile(f)
+
+
+def _write_npy_dir(builder: ColumnBuilder, out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    for name, values in builder.arrays().items():
+        _write_npy(os.path.join(out_dir, name + ".npy"), values)
+    meta = {"format_version": FORMAT_VERSION, "rows": len(builder), "dictionaries": builder.dictionaries()}
+    # meta.json last: its presence marks a complete export
+    tmp_path = os.path.join(out_dir, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(out_dir, "meta.json"))
+
+
+def _write_arrow(builder: ColumnBuilder, out_path: str):
+    pa = _arrow()
+
+    def strings(column: StringColumn):
+        return pa.LargeStringArray.from_buffers(len(column), pa.py_buffer(column.offsets.tobytes()), pa.py_buffer(bytes(column.buffer)))
+
+    def lists(column: ListColumn):
+        return pa.LargeListArray.from_arrays(pa.array(column.offsets, type=pa.int64()), strings(column.values))
+
+    def dictionary(column: DictionaryColumn):
+        return pa.DictionaryArray.from_arrays(pa.array(column.codes, type=pa.int32()), pa.array(column.values, type=pa.string()))
+
+    table = pa.table({
+        "id": strings(builder.ids),
+        "event": dictionary(builder.event),
+        "protagonist": dictionary(builder.protagonist),
+        "banlist": dictionary(builder.banlist),
+        "story_text": strings(builder.story_text),
+        "turns": lists(builder.turns),
+        "recovery": pa.array(builder.recovery, type=pa.int8()),
+        "guesses": lists(builder.guesses),
+        "metrics": strings(builder.metrics),
+    }).replace_schema_metadata({"format_version": str(FORMAT_VERSION)})
+
+    tmp_path = out_path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, out_path)
+
+
+class _NpyColumn:
+    """
+    Read-only view of a memory-mapped `.npy` file written by `_write_npy`.
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != b"\x93NUMPY\x01\x00":
+            raise ValueError(f"Not a version 1.0 .npy file: {path}")
+        header_len = struct.unpack("<H", self._mmap[8:10])[0]
+        header = ast.literal_eval(self._mmap[10:10 + header_len].decode("latin1"))
+        data = memoryview(self._mmap)[10 + header_len:]
+        # Empty mappings cannot be cast; every column has at least the leading 0 offset or no rows
+        self.values = data.cast(_NPY_TYPECODE[header["descr"]]) if len(data) else []
+
+    def close(self):
+        if isinstance(self.values, memoryview):
+            self.values.release()
+            self.values = []
+        self._mmap.close()
+
+
+class ColumnarDataset:
+    """
+    A columnar export opened for reading. Columns stay memory-mapped; only the rows passed to
+    `entries`/`records` are decoded.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.isdir(path):
+            self.format = "npy"
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            self._rows = meta["rows"]
+            self._dictionaries = meta["dictionaries"]
+            self._columns = {
+                name[:-4]: _NpyColumn(os.path.join(path, name))
+                for name in os.listdir(path) if name.endswith(".npy")
+            }
+        else:
+            pa = _arrow()
+            if pa is None:
+                raise ImportError(f"pyarrow is required to read {path}")
+            self.format = "arrow"
+            self._table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            self._rows = self._table.num_rows
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Rows `start` to `stop` in the JSONL record layout.
+        """
+        stop = self._rows if stop is None else min(stop, self._rows)
+        if start >= stop:
+            return []
+        if self.format == "arrow":
+            return [self._arrow_record(row) for row in self._table.slice(start, stop - start).to_pylist()]
+        return [self._npy_record(i) for i in range(start, stop)]
+
+    def entries(self, start: int = 0, stop: Optional[int] = None) -> List[DatasetEntry]:
+        return [DatasetEntry.model_validate(record) for record in self.records(start, stop)]
+
+    def _string(self, prefix: str, i: int) -> str:
+        offsets = self._columns[prefix + "_offsets"].values
+        return bytes(self._columns[prefix + "_data"].values[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def _list(self, prefix: str, i: int) -> List[str]:
+        lists = self._columns[prefix + "_lists"].values
+        return [self._string(prefix, j) for j in range(lists[i], lists[i + 1])]
+
+    def _npy_record(self, i: int) -> Dict[str, Any]:
+        recovery = self._columns["recovery"].values[i]
+        metrics = self._string("metrics", i)
+        return _record(
+            self._string("id", i),
+            self._dictionaries["event"][self._columns["event_codes"].values[i]],
+            self._dictionaries["protagonist"][self._columns["protagonist_codes"].values[i]],
+            self._dictionaries["banlist"][self._columns["banlist_codes"].values[i]],
+            self._string("story", i),
+            self._list("turn", i),
+            recovery,
+            self._list("guess", i),
+            metrics,
+        )
+
+    @staticmethod
+    def _arrow_record(row: Dict[str, Any]) -> Dict[str, Any]:
+        return _record(row["id"], row["event"], row["protagonist"], row["banlist"], row["story_text"],
+                       row["turns"], row["recovery"], row["guesses"], row["metrics"])
+
+    def close(self):
+        if self.format == "npy":
+            for column in self._columns.values():
+                column.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _record(entry_id: str, event: str, protagonist: str, banlist: str, story_text: str, turns: List[str],
+            recovery: int, guesses: List[str], metrics: str) -> Dict[str, Any]:
+    return {
+        "id": entry_id,
+        "story": {"text": story_text, "hidden_event": event, "protagonist_name": protagonist},
+        "gold_semantics": {"hidden_event": event, "protagonist_name": protagonist},
+        "banlist": json.loads(banlist),
+        "dialogue": {"turns": turns},
+        "recovery": None if recovery < 0 else {"guesses": guesses, "success": bool(recovery)},
+        "metrics": json.loads(metrics) if metrics else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export generated JSONL outputs to a columnar dataset")
+    parser.add_argument("inputs", nargs="+", help="JSONL files, e.g. output_gpu_*.jsonl")
+    parser.add_argument("--out", required=True, help="Output .arrow file or npy directory")
+    parser.add_argument("--format", choices=["auto", "arrow", "npy"], default="auto")
+    args = parser.parse_args()
+
+    fmt, rows = export_columnar(args.inputs, args.out, args.format)
+    print(f"Exported {rows} entries to {args.out} ({fmt})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+from typing import List, Sequence, Tuple
+
+from utils import BanlistMatcher, inflections
+
+
+def banned_word_variants(words: Sequence[str]) -> List[str]:
+    """
+    Surface forms a banned word can be emitted as: lower, Capitalized and UPPER casing.
+    vLLM's `bad_words` adds the leading-space form of each itself.
+    """
+    variants = []
+    for word in words:
+        for cased in (word.lower(), word.capitalize(), word.upper()):
+            if cased not in variants:
+                variants.append(cased)
+    return variants
+
+
+def decoding_bad_words(words: Sequence[str]) -> List[str]:
+    """
+    `SamplingParams.bad_words` for a banlist: every casing of `words` and their inflections.
+
+    vLLM bans the last token of each bad word whenever the tokens before it were just generated,
+    so single-token words are never sampled and multi-token words are cut before their final piece.
+    """
+    forms = sorted(set().union(*(inflections(w.lower()) for w in words)))
+    return banned_word_variants(forms)
+
+
+def strip_banned_words(text: str, words: Sequence[str]) -> Tuple[str, int]:
+    """
+    Mock-mode stand-in for `bad_words`: removes every form of `words` that
+    `check_banlist` would flag and returns the cleaned text with the number of removals.
+    """
+    pattern = BanlistMatcher.for_words(tuple(words)).pattern
+    if pattern is None:
+        return text, 0
+    return pattern.subn("", text)
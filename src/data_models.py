@@ -1,6 +1,15 @@
-from typing import List, Optional
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
+def compute_entry_id(story_text: str, hidden_event: str, turns: List[str]) -> str:
+    """
+    Content hash used as the id of entries that were written without one.
+    """
+    payload = json.dumps([story_text, hidden_event, turns], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
 class Story(BaseModel):
     text: str = Field(..., description="The generated story text.")
     hidden_event: str = Field(..., description="The hidden event semantics used to generate the story.")
@@ -18,6 +27,7 @@ class Recovery(BaseModel):
     success: bool = Field(..., description="Whether the true hidden event was found in the guesses.")
 
 class DatasetEntry(BaseModel):
+    id: Optional[str] = None # Stable id used to skip already processed entries on resume
     story: Story
     gold_semantics: GoldSemantics
     banlist: List[str]
@@ -25,3 +35,35 @@ class DatasetEntry(BaseModel):
     recovery: Optional[Recovery] = None # Optional because generation pipeline doesn't produce this
     metrics: Optional[dict] = None
 
+    def stable_id(self) -> str:
+        if self.id:
+            return self.id
+        return compute_entry_id(self.story.text, self.gold_semantics.hidden_event, self.dialogue.turns)
+
+
+def _construct(cls, values: Dict[str, Any]):
+    # What `model_construct` does, minus its per-field default handling, which makes it
+    # slower than full validation on pydantic 2.x. `values` must hold every field.
+    model = object.__new__(cls)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(model, "__pydantic_fields_set__", set(values))
+    object.__setattr__(model, "__pydantic_extra__", None)
+    object.__setattr__(model, "__pydantic_private__", None)
+    return model
+
+
+def construct_trusted_entry(obj: Dict[str, Any]) -> DatasetEntry:
+    """
+    Builds a `DatasetEntry` from a parsed record without validating it. Only for records this
+    pipeline wrote itself (`JsonlWriter` output): wrong types are not caught here.
+    """
+    recovery = obj.get("recovery")
+    return _construct(DatasetEntry, {
+        "id": obj.get("id"),
+        "story": _construct(Story, obj["story"]),
+        "gold_semantics": _construct(GoldSemantics, obj["gold_semantics"]),
+        "banlist": obj["banlist"],
+        "dialogue": _construct(Dialogue, obj["dialogue"]),
+        "recovery": _construct(Recovery, recovery) if recovery else None,
+        "metrics": obj.get("metrics"),
+    })
@@ -0,0 +1,264 @@
+import base64
+import glob
+import json
+import os
+import random
+import re
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Mersenne prime for the universal hash family h(x) = (a * x + b) mod P
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_WORD = re.compile(r"\w+")
+
+# LLM calls an iteration makes at the very least after the checked text, and so saves when the
+# text is dropped as a duplicate: after a story the story judge, the protagonist extraction, two
+# dialogue turns and the dialogue judge; after a dialogue only the dialogue judge.
+STORY_CALLS_SAVED = 5
+DIALOGUE_CALLS_SAVED = 1
+
+DEDUP_PATTERN = "dedup_gpu_*.json"
+
+
+def dedup_path_for(dedup_dir: str, worker_id: int) -> str:
+    return os.path.join(dedup_dir, f"dedup_gpu_{worker_id}.json")
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    """
+    Lowercased word `size`-grams of `text`; a text shorter than that is its own single shingle.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    `(bands, rows)` with `bands * rows <= num_perm` whose S-curve `(1 / bands) ** (1 / rows)`
+    (the Jaccard similarity at which two texts become a candidate pair with probability ~1/2)
+    is closest to `threshold`.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """
+    `num_perm` seeded hash permutations; the signature of a text is the minimum of each over
+    the text's shingles. Shingles are hashed with crc32, so signatures are stable across
+    processes and runs and can be persisted.
+    """
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        self.num_perm = num_perm
+        self.seed = seed
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text: str) -> array:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in set(shingles(text))]
+        return array("I", (min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in self.permutations))
+
+
+def jaccard_estimate(a: array, b: array) -> float:
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class MinHashLSH:
+    """
+    Streaming near-duplicate index: signatures are split into bands and each band is hashed
+    into its own bucket table, so looking up a text only compares it against the few indexed
+    texts that share a band with it rather than against all of them.
+    """
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, seed: int = 1):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, seed)
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self.signatures: List[array] = []
+        self.buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(self.bands)]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: array) -> Iterable[Tuple[int, Tuple[int, ...]]]:
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def query(self, signature: array) -> Optional[int]:
+        """
+        Index of an indexed signature whose estimated Jaccard similarity with `signature`
+        reaches the threshold, or None.
+        """
+        seen = set()
+        for band, key in self._band_keys(signature):
+            for candidate in self.buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if jaccard_estimate(signature, self.signatures[candidate]) >= self.threshold:
+                    return candidate
+        return None
+
+    def insert(self, signature: array):
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        for band, key in self._band_keys(signature):
+            self.buckets[band].setdefault(key, []).append(index)
+
+    def contains(self, text: str) -> bool:
+        """
+        True if `text` is a near-duplicate of an indexed text; the index is left unchanged.
+        """
+        return self.query(self.hasher.signature(text)) is not None
+
+    def add(self, text: str) -> bool:
+        """
+        Indexes `text` unless it is a near-duplicate of an indexed text. Returns True if it was.
+        """
+        signature = self.hasher.signature(text)
+        if self.query(signature) is not None:
+            return True
+        self.insert(signature)
+        return False
+
+    def merge(self, other: "MinHashLSH"):
+        """
+        Adds the signatures of an index built with the same parameters (e.g. another worker's),
+        keeping only those that are not near-duplicates of ones already indexed.
+        """
+        if (other.hasher.num_perm, other.hasher.seed, other.bands, other.rows) != (self.hasher.num_perm, self.hasher.seed, self.bands, self.rows):
+            raise ValueError("Cannot merge MinHash indexes built with different parameters")
+        for signature in other.signatures:
+            if self.query(signature) is None:
+                self.insert(signature)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Signatures are packed as base64 uint32 arrays: a JSON list of ints is several times larger
+        return {
+            "threshold": self.threshold,
+            "num_perm": self.hasher.num_perm,
+            "seed": self.hasher.seed,
+            "signatures": [base64.b64encode(s.tobytes()).decode("ascii") for s in self.signatures],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MinHashLSH":
+        index = cls(data["threshold"], data["num_perm"], data["seed"])
+        for packed in data["signatures"]:
+            signature = array("I")
+            signature.frombytes(base64.b64decode(packed))
+            index.insert(signature)
+        return index
+
+
+class NearDuplicateFilter:
+    """
+    Drops near-duplicate stories right after generation and near-duplicate dialogues right
+    after their last turn, before the judge calls they would otherwise pay for. Stories and
+    dialogues are indexed separately, and only once their entry is accepted
+    (`is_duplicate_entry`): a text the judges reject must not block later texts like it, or a
+    templated event could end up with no accepted entry at all.
+
+    `followup_calls` are the calls made after an accepted entry (2 when it goes on to recovery)
+    and count towards the calls a dropped duplicate saves.
+    """
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, seed: int = 1, followup_calls: int = 0):
+        self.stories = MinHashLSH(threshold, num_perm, seed)
+        self.dialogues = MinHashLSH(threshold, num_perm, seed)
+        self.followup_calls = followup_calls
+        self.checked_stories = 0
+        self.checked_dialogues = 0
+        self.duplicate_stories = 0
+        self.duplicate_dialogues = 0
+        # Accepted entries dropped because an entry in flight at the same time got in first
+        self.late_duplicates = 0
+
+    def is_duplicate_story(self, text: str) -> bool:
+        self.checked_stories += 1
+        if self.stories.contains(text):
+            self.duplicate_stories += 1
+            return True
+        return False
+
+    def is_duplicate_dialogue(self, turns: List[str]) -> bool:
+        self.checked_dialogues += 1
+        if self.dialogues.contains("\n".join(turns)):
+            self.duplicate_dialogues += 1
+            return True
+        return False
+
+    def is_duplicate_entry(self, story_text: str, turns: List[str]) -> bool:
+        """
+        Indexes the story and dialogue of an entry the judges accepted. Returns True instead, and
+        indexes nothing, if a near-duplicate entry was accepted after this one's checks above
+        (iterations of a batched cohort or async run are checked before any of them is accepted).
+        """
+        dialogue_text = "\n".join(turns)
+        if self.stories.contains(story_text) or self.dialogues.contains(dialogue_text):
+            self.late_duplicates += 1
+            return True
+        self.stories.add(story_text)
+        self.dialogues.add(dialogue_text)
+        return False
+
+    @property
+    def calls_saved(self) -> int:
+        """
+        Lower bound on the LLM calls the dropped duplicates did not make.
+        """
+        return (self.duplicate_stories * (STORY_CALLS_SAVED + self.followup_calls)
+                + self.duplicate_dialogues * (DIALOGUE_CALLS_SAVED + self.followup_calls))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "checked_stories": self.checked_stories,
+            "duplicate_stories": self.duplicate_stories,
+            "checked_dialogues": self.checked_dialogues,
+            "duplicate_dialogues": self.duplicate_dialogues,
+            "calls_saved": self.calls_saved,
+            "late_duplicates": self.late_duplicates,
+        }
+
+    def merge(self, other: "NearDuplicateFilter"):
+        self.stories.merge(other.stories)
+        self.dialogues.merge(other.dialogues)
+
+    def save(self, path: str):
+        data = {"stories": self.stories.to_dict(), "dialogues": self.dialogues.to_dict()}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, followup_calls: int = 0) -> "NearDuplicateFilter":
+        with open(path, "r") as f:
+            data = json.load(f)
+        dedup = cls(followup_calls=followup_calls)
+        dedup.stories = MinHashLSH.from_dict(data["stories"])
+        dedup.dialogues = MinHashLSH.from_dict(data["dialogues"])
+        return dedup
+
+    def merge_from(self, dedup_dir: str) -> int:
+        """
+        Merges every worker's saved index in `dedup_dir` into this one and returns how many
+        were found. Indexes saved with other parameters are skipped.
+        """
+        merged = 0
+        for path in sorted(glob.glob(os.path.join(dedup_dir, DEDUP_PATTERN))):
+            try:
+                self.merge(NearDuplicateFilter.load(path))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping dedup index {path}: {e}")
+                continue
+            merged += 1
+        return merged
@@ -2,25 +2,96 @@ import json
 import random
 from typing import Optional, List
 
-from llm import LLMWrapper
+from llm import LLMWrapper, GenerationRequest
 from data_models import Story, GoldSemantics, Dialogue, DatasetEntry
 from prompt_templates import SYSTEM_PROMPTS
-from utils import generate_banlist, check_banlist
+from utils import generate_banlist, BanlistMatcher
 from judge import Judge
+from metrics import track_entry_usage
+from dedup import NearDuplicateFilter
+from prejudge import PreJudge
+
+
+class DialogueStats:
+    """
+    Per-turn counters of dialogue generation, used to tune the number of candidates per turn.
+
+    Each sampling call returns `n` candidates for one turn; the first one passing the banlist is
+    kept and the rest are discarded. If none passes, only that turn is sampled again.
+    """
+    def __init__(self):
+        self.turns = 0
+        self.sampling_calls = 0
+        self.candidates = 0
+        self.banlist_violations = 0
+        self.first_call_accepts = 0
+        self.resamples = 0
+        self.tokens = 0
+        self.discarded_tokens = 0
+        self.failed_dialogues = 0
+
+    def record_sampling(self, token_counts: List[int], kept: Optional[int], attempt: int):
+        """
+        Records one sampling call of a turn. `kept` is the index of the accepted candidate
+        (None if all violated the banlist) and `attempt` is 0 for the first call of the turn.
+        """
+        self.sampling_calls += 1
+        self.candidates += len(token_counts)
+        self.tokens += sum(token_counts)
+        if attempt > 0:
+            self.resamples += 1
+        if kept is None:
+            self.banlist_violations += len(token_counts)
+            self.discarded_tokens += sum(token_counts)
+            return
+        self.turns += 1
+        if attempt == 0:
+            self.first_call_accepts += 1
+        # Candidates after the kept one are not checked, so only the earlier ones are violations
+        self.banlist_violations += kept
+        self.discarded_tokens += sum(token_counts) - token_counts[kept]
+
+    def to_dict(self):
+        data = dict(vars(self))
+        data["candidate_acceptance_rate"] = self.turns / self.candidates if self.candidates else 0.0
+        data["first_call_acceptance_rate"] = self.first_call_accepts / self.turns if self.turns else 0.0
+        return data
+
 
 class DataGenerationPipeline:
-    def __init__(self, llm: LLMWrapper):
+    def __init__(self, llm: LLMWrapper, constrain_banlist: bool = True, turn_candidates: int = 1,
+                 dedup: Optional[NearDuplicateFilter] = None, prejudge: Optional[PreJudge] = None):
         self.llm = llm
         self.judge = Judge(llm)
+        # Pass the banlist to the decoder so banned words cannot be generated in the first place;
+        # the banlist check on every turn stays as a safety net
+        self.constrain_banlist = constrain_banlist
+        # Candidates sampled per turn in one call; the first one passing the banlist is kept
+        self.turn_candidates = turn_candidates
+        self.dialogue_stats = DialogueStats()
+        # Optional near-duplicate filter applied before the story and dialogue judges
+        self.dedup = dedup
+        # Optional rule cascade run before the story and dialogue judges
+        self.prejudge = prejudge
 
     def run_single_iteration(self, event_hint: str) -> Optional[DatasetEntry]:
+        # Tokens of every call made for this iteration are attributed to its outcome
+        with track_entry_usage() as usage:
+            entry = self._run_iteration(event_hint)
+        self.llm.metrics.record_entry(entry is not None, usage)
+        return entry
+
+    def _run_iteration(self, event_hint: str) -> Optional[DatasetEntry]:
         try:
             # Step 1: Story Generation
             story_text = self._generate_story(event_hint)
-            
+
+            # Step 1.1: Pre-judge rules and near-duplicates are rejected without a judge call
+            if self._reject_story(event_hint, story_text):
+                return None
+
             # Step 1.5: Judge Story
-            if not self.judge.check_story(event_hint, story_text):
-                print(f"Story rejected by judge for event: {event_hint}")
+            if self._reject_judged_story(event_hint, self.judge.check_story(event_hint, story_text)):
                 return None
 
             # Step 2: Extract Protagonist
@@ -35,12 +106,16 @@ class DataGenerationPipeline:
             # Step 4: Dialogue Generation (Dynamic Turns)
             dialogue = self._generate_dialogue(story_text, event_hint, protagonist_name, banlist)
             if not dialogue:
+                self.llm.metrics.record_rejection("dialogue_turn")
+                return None
+
+            if self._reject_dialogue(event_hint, dialogue.turns):
                 return None
 
             # Step 4.5: Judge Dialogue
             dialogue_text = "\n".join(dialogue.turns)
-            if not self.judge.check_dialogue(event_hint, story_text, dialogue_text):
-                print(f"Dialogue rejected by judge for event: {event_hint}")
+            valid = self.judge.check_dialogue(event_hint, story_text, dialogue_text)
+            if self._reject_judged_dialogue(event_hint, story_text, dialogue.turns, valid):
                 return None
 
             return DatasetEntry(
@@ -54,113 +129,126 @@ class DataGenerationPipeline:
             print(f"Error in generation pipeline: {e}")
             return None
 
+    # Rejection checks shared by the sequential path above, the async pipeline and the batched
+    # engine. Each returns True if the iteration is rejected, after logging and counting why.
+
+    def _reject_story(self, event_hint: str, story_text: str) -> bool:
+        if self.prejudge is not None:
+            rule = self.prejudge.check_story(event_hint, story_text)
+            if rule is not None:
+                print(f"Story rejected by pre-judge rule '{rule}' for event: {event_hint}")
+                return True
+        # Drop near-duplicate stories before paying for the judge
+        if self.dedup is not None and self.dedup.is_duplicate_story(story_text):
+            print(f"Near-duplicate story dropped for event: {event_hint}")
+            self.llm.metrics.record_rejection("dedup_story")
+            return True
+        return False
+
+    def _reject_judged_story(self, event_hint: str, valid: bool) -> bool:
+        if not valid:
+            print(f"Story rejected by judge for event: {event_hint}")
+            self.llm.metrics.record_rejection("judge_story")
+            return True
+        return False
+
+    def _reject_dialogue(self, event_hint: str, turns: List[str]) -> bool:
+        if self.prejudge is not None:
+            rule = self.prejudge.check_dialogue(event_hint, "\n".join(turns))
+            if rule is not None:
+                print(f"Dialogue rejected by pre-judge rule '{rule}' for event: {event_hint}")
+                return True
+        if self.dedup is not None and self.dedup.is_duplicate_dialogue(turns):
+            print(f"Near-duplicate dialogue dropped for event: {event_hint}")
+            self.llm.metrics.record_rejection("dedup_dialogue")
+            return True
+        return False
+
+    def _reject_judged_dialogue(self, event_hint: str, story_text: str, turns: List[str], valid: bool) -> bool:
+        if not valid:
+            print(f"Dialogue rejected by judge for event: {event_hint}")
+            self.llm.metrics.record_rejection("judge_dialogue")
+            return True
+        # The entry is accepted: index it, unless a near-duplicate got in while it was judged
+        if self.dedup is not None and self.dedup.is_duplicate_entry(story_text, turns):
+            print(f"Near-duplicate entry dropped for event: {event_hint}")
+            self.llm.metrics.record_rejection("dedup_entry")
+            return True
+        return False
+
     def _generate_story(self, hint: str) -> str:
-        prompt = f"Hidden Event: {hint}"
-        return self.llm.generate(SYSTEM_PROMPTS["storyteller"], prompt)
+        return self.llm.generate_request(self._story_request(hint))
 
     def _extract_protagonist(self, story: str) -> str:
+        return self.llm.generate_request(self._protagonist_request(story)).strip()
+
+    # Request builders shared by the sequential path above and the batched engine.
+
+    def _story_request(self, hint: str) -> GenerationRequest:
+        prompt = f"Hidden Event: {hint}"
+        return self.llm.make_request("story", SYSTEM_PROMPTS["storyteller"], prompt)
+
+    def _protagonist_request(self, story: str) -> GenerationRequest:
         prompt = f"Story: {story}"
-        return self.llm.generate(SYSTEM_PROMPTS["protagonist_extractor"], prompt).strip()
+        return self.llm.make_request("extract", SYSTEM_PROMPTS["protagonist_extractor"], prompt, stage="protagonist")
+
+    def _dialogue_turn_request(self, story: str, hidden_event: str, protagonist: str, banlist: List[str], turns: List[str]) -> GenerationRequest:
+        # The system prompt only depends on the entry, so it is a shared prefix for all turns
+        context = SYSTEM_PROMPTS["dialogue_context"].format(
+            story=story,
+            protagonist=protagonist,
+            hidden_event=hidden_event,
+            banlist_str=", ".join(banlist)
+        )
+
+        # Construct history for the prompt
+        history_str = "\n".join(turns) if turns else "None"
+        speaker = "Speaker A" if len(turns) % 2 == 0 else "Speaker B"
+
+        prompt = SYSTEM_PROMPTS["dialogue_turn"].format(history=history_str, speaker=speaker)
+        return self.llm.make_request(
+            "dialogue_turn", context, prompt,
+            banned_words=list(banlist) if self.constrain_banlist else None,
+            n=self.turn_candidates,
+        )
+
+    @staticmethod
+    def _format_turn(turn_index: int, turn_text: str) -> str:
+        speaker_label = "Speaker A" if turn_index % 2 == 0 else "Speaker B"
+        return f"[{speaker_label}]: {turn_text}"
+
+    def _select_candidate(self, candidates: List[str], banlist: List[str], attempt: int) -> Optional[str]:
+        """
+        Returns the first candidate of a turn that passes the banlist (None if none does)
+        and records the sampling call in `dialogue_stats`.
+        """
+        clean = BanlistMatcher.for_words(tuple(banlist)).check_many(candidates)
+        kept = clean.index(True) if True in clean else None
+        token_counts = [self.llm.count_tokens(c) for c in candidates]
+        self.dialogue_stats.record_sampling(token_counts, kept, attempt)
+        if attempt > 0:
+            self.llm.metrics.record_retry("dialogue_turn")
+        return candidates[kept] if kept is not None else None
 
     def _generate_dialogue(self, story: str, hidden_event: str, protagonist: str, banlist: list, max_retries: int = 3) -> Optional[Dialogue]:
-        banlist_str = ", ".join(banlist)
-        
         # Dynamic turns: 2 to 4
         num_turns = random.randint(2, 4)
+        current_turns = []
         
-        for attempt in range(max_retries):
-            turns = []
-            history = ""
-            
-            for i in range(num_turns):
-                is_speaker_a = (i % 2 == 0)
-                speaker_prompt_key = "dialogue_speaker_1" if is_speaker_a else "dialogue_speaker_2"
-                speaker_label = "[Speaker A]" if is_speaker_a else "[Speaker B]"
-                
-                prompt = SYSTEM_PROMPTS[speaker_prompt_key].format(
-                    story=story,
-                    protagonist=protagonist,
-                    hidden_event=hidden_event,
-                    banlist_str=banlist_str,
-                    history=history
-                )
-                
-                turn_text = self.llm.generate("", prompt) # System prompt is embedded in the formatted string now? 
-                # Wait, the previous code used system prompt key. 
-                # My new prompts in SYSTEM_PROMPTS are full instructions. 
-                # I should probably pass them as system prompt or user prompt. 
-                # Let's pass empty system prompt and full user prompt, or use the key if LLMWrapper supports it.
-                # Looking at LLMWrapper usage in original code: self.llm.generate(SYSTEM_PROMPTS["storyteller"], prompt)
-                # It takes (system_prompt, user_prompt).
-                # My new prompts are designed as system prompts mostly.
-                # Let's adjust:
-                
-                # Actually, the prompts I wrote have placeholders like {story}. 
-                # I should format them first.
-                
-                # Let's treat the formatted string as the system prompt (or user prompt if system is fixed).
-                # The original code used: self.llm.generate(SYSTEM_PROMPTS["dialogue_speaker_1"], p1)
-                # So I should probably keep the system prompt static and put context in user prompt?
-                # But my new prompts have the context embedded.
-                # Let's use the formatted string as the USER prompt and a generic system prompt, 
-                # OR use the formatted string as the SYSTEM prompt and empty user prompt.
-                # Let's go with: System Prompt = "You are a helpful assistant." (or similar generic), User Prompt = Formatted Instruction.
-                # OR better: The LLMWrapper might expect specific args.
-                
-                # Let's check LLMWrapper signature if possible, but I don't have it open. 
-                # Assuming generate(system, user).
-                
-                # I will use a generic system prompt for dialogue and put everything in user prompt for simplicity,
-                # OR I can just pass the formatted string as the system prompt and "Go." as user prompt.
-                
-                # Let's try: 
-                # System: "You are a roleplay actor."
-                # User: <The formatted prompt>
-                
-                pass 
-                
-            # RETHINKING: The prompts in `prompt_templates.py` are strings. 
-            # I should use them as templates.
-            
-            # Let's fix the loop.
-            
-            current_turns = []
-            valid_attempt = True
-            
-            for i in range(num_turns):
-                is_speaker_a = (i % 2 == 0)
-                speaker_key = "dialogue_speaker_1" if is_speaker_a else "dialogue_speaker_2"
-                speaker_label = "Speaker A" if is_speaker_a else "Speaker B"
-                
-                # Construct history for the prompt
-                history_str = "\n".join(current_turns) if current_turns else "None"
-                
-                # Format the prompt
-                # Note: The keys in SYSTEM_PROMPTS are the templates now.
-                template = SYSTEM_PROMPTS[speaker_key]
-                full_prompt = template.format(
-                    story=story,
-                    protagonist=protagonist,
-                    hidden_event=hidden_event,
-                    banlist_str=banlist_str,
-                    history=history_str
-                )
-                
-                # Generate
-                # We pass the full prompt as the "system" instruction effectively, or just as user prompt.
-                # To be safe with `llm.generate(sys, user)`, I'll pass:
-                # sys = "You are a roleplay actor."
-                # user = full_prompt
-                turn_response = self.llm.generate("You are a roleplay actor.", full_prompt)
-                
-                # Check banlist
-                if not check_banlist(turn_response, banlist):
-                    valid_attempt = False
+        for i in range(num_turns):
+            # Turn-level repair: a violating turn is resampled on its own, earlier turns are kept
+            turn_response = None
+            for attempt in range(max_retries):
+                request = self._dialogue_turn_request(story, hidden_event, protagonist, banlist, current_turns)
+                candidates = self.llm.generate_candidates([request])[0]
+                turn_response = self._select_candidate(candidates, banlist, attempt)
+                if turn_response is not None:
                     break
-                
-                current_turns.append(f"[{speaker_label}]: {turn_response}")
             
-            if valid_attempt:
-                return Dialogue(turns=current_turns)
+            if turn_response is None:
+                self.dialogue_stats.failed_dialogues += 1
+                return None
+            
+            current_turns.append(self._format_turn(i, turn_response))
                 
-        return None
+        return Dialogue(turns=current_turns)
@@ -0,0 +1,69 @@
+import json
+from dataclasses import dataclass, asdict, replace
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class GenerationProfile:
+    """
+    Sampling settings of one pipeline stage.
+    """
+    temperature: float = 0.7
+    top_p: float = 0.95
+    max_new_tokens: int = 4096
+    stop: Optional[List[str]] = None
+    seed: Optional[int] = None
+
+
+# Caps are sized for each stage's expected output, so short stages do not reserve KV cache
+# for thousands of tokens. "default" keeps the old settings for ad-hoc `generate` calls.
+DEFAULT_PROFILES: Dict[str, GenerationProfile] = {
+    "default": GenerationProfile(),
+    # 3-5 sentences
+    "story": GenerationProfile(temperature=0.8, top_p=0.95, max_new_tokens=320),
+    # One spoken turn; stop before the model starts writing the other speaker's turn
+    "dialogue_turn": GenerationProfile(temperature=0.8, top_p=0.95, max_new_tokens=160, stop=["\n[Speaker", "\nSpeaker"]),
+    # {"valid"/"match": ..., "reason"/"matching_guess": ...}
+    "judge": GenerationProfile(temperature=0.0, top_p=1.0, max_new_tokens=96),
+    # A protagonist name
+    "extract": GenerationProfile(temperature=0.0, top_p=1.0, max_new_tokens=24, stop=["\n"]),
+    # {"guesses": [...]} with k short guesses; raised for large k (see `RecoveryPipeline._guesses_request`)
+    "recover": GenerationProfile(temperature=0.7, top_p=0.95, max_new_tokens=256),
+}
+
+
+class ProfileRegistry:
+    """
+    Named `GenerationProfile`s, one per pipeline stage.
+
+    A JSON config can override any field of any profile (or add new profiles), e.g.
+    `{"story": {"temperature": 0.9}, "judge": {"seed": 0}}`; unspecified fields keep their defaults.
+    """
+    def __init__(self, profiles: Optional[Dict[str, GenerationProfile]] = None):
+        self.profiles = dict(DEFAULT_PROFILES)
+        if profiles:
+            self.profiles.update(profiles)
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Dict[str, Any]]) -> "ProfileRegistry":
+        registry = cls()
+        for name, overrides in config.items():
+            base = registry.profiles.get(name, DEFAULT_PROFILES["default"])
+            try:
+                registry.profiles[name] = replace(base, **overrides)
+            except TypeError as e:
+                raise ValueError(f"Invalid settings for profile '{name}': {e}") from e
+        return registry
+
+    @classmethod
+    def from_file(cls, path: str) -> "ProfileRegistry":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def get(self, name: str) -> GenerationProfile:
+        if name not in self.profiles:
+            raise KeyError(f"Unknown generation profile: {name}")
+        return self.profiles[name]
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: asdict(profile) for name, profile in self.profiles.items()}
@@ -0,0 +1,210 @@
+import http.client
+import json
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from llm import LLMWrapper, GenerationRequest
+from response_cache import ResponseCache
+from generation_profiles import ProfileRegistry
+
+# Statuses worth retrying: rate limiting and transient server-side failures
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class HTTPBackendError(RuntimeError):
+    """
+    A chat completion request failed for good (non-retryable status or retries exhausted).
+    """
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one host, at most `size` of them open at once.
+
+    A connection is taken for one request/response exchange and handed back afterwards, so
+    consecutive requests reuse the TCP (and TLS) connection instead of reconnecting. Connections
+    that failed mid-exchange are closed rather than returned.
+    """
+    def __init__(self, base_url: str, size: int, timeout: float):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported API base URL: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        self._slots.get()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return response.status, dict(response.getheaders()), data
+        finally:
+            self._slots.put(None)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class OpenAIHTTPLLM(LLMWrapper):
+    """
+    `LLMWrapper` backed by a remote OpenAI-compatible `/v1/chat/completions` endpoint (e.g. a
+    `vllm serve` pool behind a load balancer) instead of an in-process vLLM engine.
+
+    `generate_candidates` sends the requests of one call concurrently, at most `concurrency`
+    at a time, over a pool of keep-alive connections, so a batched or multi-candidate call keeps
+    the server's continuous batching busy. Each request is retried with exponential backoff on
+    connection errors, timeouts and retryable statuses (honoring `Retry-After`).
+
+    JSON schemas are sent as `response_format` (structured outputs). Banned words are sent as
+    vLLM's `bad_words` extension, expanded exactly as for the in-process engine; servers that do
+    not support it ignore the field, and the banlist check after generation still applies.
+    """
+    def __init__(self, model_name: str, api_base: str, api_key: Optional[str] = None, concurrency: int = 8,
+                 timeout: float = 120.0, max_retries: int = 3, backoff: float = 0.5,
+                 cache: Optional[ResponseCache] = None, cache_sampled: bool = False, profiles: Optional[ProfileRegistry] = None):
+        # Prefix caching is up to the server
+        super().__init__(model_name, device="cpu", mock=False, cache=cache, cache_sampled=cache_sampled,
+                         profiles=profiles, load_engine=False)
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.pool = ConnectionPool(api_base, concurrency, timeout)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm-http")
+
+    def _run_engine(self, requests: List[GenerationRequest]) -> Tuple[List[List[str]], List[Tuple[int, int]]]:
+        futures = [self._executor.submit(self._complete, request) for request in requests]
+        results, token_counts = [], []
+        for future in futures:
+            # A failed request only fails itself; the other requests of the call are kept
+            try:
+                candidates, counts = future.result()
+            except Exception as e:
+                candidates, counts = e, (0, 0)
+            results.append(candidates)
+            token_counts.append(counts)
+        self._record_constraint_stats(requests)
+        return results, token_counts
+
+    def _complete(self, request: GenerationRequest) -> Tuple[List[str], Tuple[int, int]]:
+        response = self._post_with_retries("/chat/completions", self._payload(request))
+        choices = sorted(response["choices"], key=lambda choice: choice.get("index", 0))
+        candidates = [(choice["message"].get("content") or "").strip() for choice in choices]
+        usage = response.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = self.count_tokens(self._render_prompt(request.system_prompt, request.user_prompt))
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = sum(self.count_tokens(c) for c in candidates)
+        return candidates, (prompt_tokens, completion_tokens)
+
+    def _payload(self, request: GenerationRequest) -> Dict[str, Any]:
+        payload = {
+            "model": self.model_name,
+            "messages": self._messages(request.system_prompt, request.user_prompt),
+            "max_tokens": request.max_new_tokens,
+            "temperature": request.temperature,
+            "top_p": request.top_p,
+            "n": request.n,
+        }
+        if request.stop:
+            payload["stop"] = request.stop
+        if request.seed is not None:
+            payload["seed"] = request.seed
+        if request.banned_words:
+            payload["bad_words"] = self._bad_words(request.banned_words)
+        if request.json_schema is not None:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": request.stage or "response", "schema": request.json_schema},
+            }
+        return payload
+
+    def _post_with_retries(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                status, response_headers, data = self.pool.request("POST", path, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                # Includes timeouts (socket.timeout is an OSError) and dropped keep-alive connections
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if status == 200:
+                    return json.loads(data)
+                error = f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}"
+                if status not in RETRYABLE_STATUSES:
+                    raise HTTPBackendError(error)
+                retry_after = self._retry_after(response_headers)
+
+            if attempt == self.max_retries:
+                raise HTTPBackendError(f"Giving up after {attempt + 1} attempts: {error}")
+            # Exponential backoff with full jitter, unless the server said how long to wait
+            time.sleep(retry_after if retry_after is not None else random.uniform(0, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(headers: Dict[str, str]) -> Optional[float]:
+        value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _messages(system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": user_prompt})
+        return messages
+
+    def _render_prompt(self, system_prompt: str, user_prompt: str) -> str:
+        # The server applies the chat template; this only needs to be stable for cache keys
+        return json.dumps(self._messages(system_prompt, user_prompt), ensure_ascii=False)
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Whitespace-word estimate; the server reports exact counts for its own requests.
+        """
+        return len(text.split())
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.pool.close()
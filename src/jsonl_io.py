@@ -0,0 +1,169 @@
+import json
+import queue
+import threading
+from typing import Any, BinaryIO, Dict, Iterable, Iterator
+
+from data_models import DatasetEntry, construct_trusted_entry
+from record_index import iter_record_spans, warn_skipped
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields every record of `path` as a dict. Works on JSONL and on the legacy
+    concatenated pretty-printed format; memory use is bounded by the largest record.
+    Records that are not valid JSON are skipped with a warning.
+    """
+    with open(path, "rb") as f:
+        for offset, raw in iter_record_spans(f):
+            try:
+                obj = json.loads(raw)
+            except json.JSONDecodeError:
+                warn_skipped(offset, "invalid JSON record")
+                continue
+            yield obj
+
+
+def iter_raw_record_range(f: BinaryIO, offset: int, count: int) -> Iterator[bytes]:
+    """
+    Yields the raw bytes of `count` consecutive records of an open binary file starting at byte `offset`.
+    """
+    if count <= 0:
+        return
+    f.seek(offset)
+    for i, (_, raw) in enumerate(iter_record_spans(f)):
+        yield raw
+        if i + 1 >= count:
+            return
+
+
+def iter_record_range(f: BinaryIO, offset: int, count: int) -> Iterator[Dict[str, Any]]:
+    for raw in iter_raw_record_range(f, offset, count):
+        yield json.loads(raw)
+
+
+def iter_entries(path: str, trusted: bool = False) -> Iterator[DatasetEntry]:
+    with open(path, "rb") as f:
+        for offset, raw in iter_record_spans(f):
+            try:
+                entry = decode_entry(raw, trusted)
+            except ValueError:
+                # Invalid JSON or not a DatasetEntry (pydantic's ValidationError is a ValueError)
+                warn_skipped(offset, "invalid record")
+                continue
+            yield entry
+
+
+def decode_entry(raw: bytes, trusted: bool = False) -> DatasetEntry:
+    """
+    Parses and validates one record straight from its bytes, without building a `json` dict
+    first. With orjson installed, orjson parses and pydantic validates the dict, which is faster
+    still. `trusted` skips validation for records this pipeline wrote itself; without orjson it
+    has no effect, since `model_validate_json` beats any stdlib-json path.
+    """
+    if orjson is None:
+        return DatasetEntry.model_validate_json(raw)
+    obj = orjson.loads(raw)
+    if trusted:
+        return construct_trusted_entry(obj)
+    return DatasetEntry.model_validate(obj)
+
+
+def encode_entry(entry: DatasetEntry) -> bytes:
+    # pydantic-core's serializer is as fast as orjson on `model_dump()` output and skips the dict
+    return entry.model_dump_json().encode("utf-8")
+
+
+def encode_entry_orjson(entry: DatasetEntry) -> bytes:
+    return orjson.dumps(entry.model_dump())
+
+
+ENTRY_ENCODERS = {"pydantic": encode_entry, "orjson": encode_entry_orjson}
+
+
+class PrefetchIterator:
+    """
+    Runs `source` on a background thread and hands its items over through a bounded queue,
+    so parsing and validation overlap with GPU work while memory stays at `maxsize` items.
+
+    Exceptions raised by `source` are re-raised in the consuming thread.
+    """
+    _DONE = object()
+
+    def __init__(self, source: Iterable[Any], maxsize: int = 64):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._fill, args=(source,), daemon=True)
+        self._thread.start()
+
+    def _fill(self, source: Iterable[Any]):
+        try:
+            for item in source:
+                if not self._put(item):
+                    return
+        except BaseException as e:
+            self._put(_PrefetchError(e))
+            return
+        self._put(self._DONE)
+
+    def _put(self, item: Any) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._queue.get()
+        if item is self._DONE:
+            self._queue.put(self._DONE)
+            raise StopIteration
+        if isinstance(item, _PrefetchError):
+            raise item.error
+        return item
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join(timeout=1.0)
+
+
+class _PrefetchError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class JsonlWriter:
+    """
+    Appends one `DatasetEntry` per line and flushes after every record, so a crash loses
+    at most the record being written. Records are given their stable id before writing.
+    """
+    def __init__(self, path: str, mode: str = "a", encoder: str = "pydantic"):
+        if encoder == "orjson" and orjson is None:
+            raise ImportError("orjson is not installed")
+        self.path = path
+        self._encode = ENTRY_ENCODERS[encoder]
+        self._f = open(path, mode + "b")
+
+    def write(self, entry: DatasetEntry):
+        if entry.id is None:
+            entry.id = entry.stable_id()
+        self._f.write(self._encode(entry) + b"\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,30 +1,48 @@
 import json
 from typing import Dict, Any, List, Optional
-from llm import LLMWrapper
-from prompt_templates import SYSTEM_PROMPTS
+from llm import LLMWrapper, GenerationRequest
+from prompt_templates import SYSTEM_PROMPTS, OUTPUT_SCHEMAS
 
 class Judge:
     def __init__(self, llm: LLMWrapper):
         self.llm = llm
 
     def check_story(self, hidden_event: str, story_text: str) -> bool:
-        prompt = f"Hidden Event: {hidden_event}\nStory: {story_text}"
-        response = self.llm.generate(SYSTEM_PROMPTS["judge_story"], prompt)
-        data = self._parse_json(response)
-        return data.get("valid", False)
+        response = self.llm.generate_request(self._story_request(hidden_event, story_text))
+        return self._parse_verdict(response, "valid")
 
     def check_dialogue(self, hidden_event: str, story_text: str, dialogue_text: str) -> bool:
-        prompt = f"Hidden Event: {hidden_event}\nStory: {story_text}\nDialogue: {dialogue_text}"
-        response = self.llm.generate(SYSTEM_PROMPTS["judge_dialogue"], prompt)
-        data = self._parse_json(response)
-        return data.get("valid", False)
+        response = self.llm.generate_request(self._dialogue_request(hidden_event, story_text, dialogue_text))
+        return self._parse_verdict(response, "valid")
 
     def check_recovery(self, hidden_event: str, guesses: List[str]) -> bool:
+        response = self.llm.generate_request(self._recovery_request(hidden_event, guesses))
+        return self._parse_verdict(response, "match")
+
+    def _story_request(self, hidden_event: str, story_text: str) -> GenerationRequest:
+        prompt = f"Hidden Event: {hidden_event}\nStory: {story_text}"
+        return self._verdict_request(SYSTEM_PROMPTS["judge_story"], prompt, "judge_story")
+
+    def _dialogue_request(self, hidden_event: str, story_text: str, dialogue_text: str) -> GenerationRequest:
+        prompt = f"Hidden Event: {hidden_event}\nStory: {story_text}\nDialogue: {dialogue_text}"
+        return self._verdict_request(SYSTEM_PROMPTS["judge_dialogue"], prompt, "judge_dialogue")
+
+    def _recovery_request(self, hidden_event: str, guesses: List[str]) -> GenerationRequest:
         guesses_str = json.dumps(guesses)
         prompt = f"Hidden Event: {hidden_event}\nGuesses: {guesses_str}"
-        response = self.llm.generate(SYSTEM_PROMPTS["judge_recovery"], prompt, temperature=0.0) # Low temp for deterministic judgment
+        # The "judge" profile decodes at low temperature for deterministic judgment
+        return self.llm.make_request(
+            "judge", SYSTEM_PROMPTS["judge_recovery"], prompt,
+            json_schema=OUTPUT_SCHEMAS["recovery_verdict"], stage="judge_recovery",
+        )
+
+    def _verdict_request(self, system_prompt: str, prompt: str, stage: str) -> GenerationRequest:
+        # Guided JSON keeps the verdict parseable and short
+        return self.llm.make_request("judge", system_prompt, prompt, json_schema=OUTPUT_SCHEMAS["verdict"], stage=stage)
+
+    def _parse_verdict(self, response: str, key: str) -> bool:
         data = self._parse_json(response)
-        return data.get("match", False)
+        return data.get(key, False)
 
     def _parse_json(self, raw: str) -> Dict[str, Any]:
         import re
@@ -1,16 +1,69 @@
-from typing import List, Dict, Optional
-import torch
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, List, Dict, Optional, Tuple
 import json
 
+from response_cache import ResponseCache
+from generation_profiles import ProfileRegistry
+from metrics import MetricsRegistry, EntryUsage
+from constrained_decoding import decoding_bad_words, strip_banned_words
+
+
+@dataclass
+class GenerationRequest:
+    """
+    A single prompt submitted through `LLMWrapper.generate_batch`, together with
+    the sampling profile it should be decoded with. Pipeline stages build these with
+    `LLMWrapper.make_request` so the settings come from the named profile.
+    """
+    system_prompt: str
+    user_prompt: str
+    max_new_tokens: int = 4096
+    temperature: float = 0.7
+    top_p: float = 0.95
+    # Words that must not be emitted; enforced at decoding time (see `constrained_decoding`)
+    banned_words: Optional[List[str]] = None
+    # Number of candidates sampled for this prompt in one call (see `generate_candidates`)
+    n: int = 1
+    # JSON schema the response must follow; enforced with vLLM structured outputs
+    json_schema: Optional[Dict[str, Any]] = None
+    stop: Optional[List[str]] = None
+    seed: Optional[int] = None
+    # Name of the profile the settings came from, if any
+    profile: Optional[str] = None
+    # Pipeline stage label for metrics (defaults to the profile name)
+    stage: Optional[str] = None
+    # Token sink of the iteration this request belongs to, when it cannot be found
+    # from `metrics.current_entry_usage` (e.g. requests batched across iterations)
+    usage: Optional[EntryUsage] = None
+
+
 class LLMWrapper:
-    def __init__(self, model_name: str, device: str = "cuda", mock: bool = False):
+    def __init__(self, model_name: str, device: str = "cuda", mock: bool = False, enable_prefix_caching: bool = True,
+                 cache: Optional[ResponseCache] = None, cache_sampled: bool = False, profiles: Optional[ProfileRegistry] = None,
+                 load_engine: bool = True):
         self.mock = mock
         self.device = device
         self.model_name = model_name
         self.model = None
         self.tokenizer = None
+        # Per-stage sampling settings (see `generation_profiles`)
+        self.profiles = profiles or ProfileRegistry()
+        # Per-stage latency/token counters of every call made through this wrapper
+        self.metrics = MetricsRegistry()
+        # Automatic prefix caching lets requests that share a rendered prefix (e.g. all
+        # dialogue turns of one entry) reuse the KV cache of that prefix instead of re-running prefill.
+        self.enable_prefix_caching = enable_prefix_caching
+        # Optional persistent response cache. Only deterministic (temperature 0) calls are
+        # cached unless `cache_sampled` is set.
+        self.cache = cache
+        self.cache_sampled = cache_sampled
+        self._init_constraint_state()
         
-        if not self.mock:
+        # Subclasses with another backend pass `load_engine=False` and set up their own
+        if not self.mock and load_engine:
             # vLLM imports
             from vllm import LLM, SamplingParams
             
@@ -19,20 +72,261 @@ class LLMWrapper:
             self.model = LLM(
                 model=model_name,
                 trust_remote_code=True,
+                enable_prefix_caching=enable_prefix_caching,
             )
 
             # No tokenizer needed explicitly for vLLM generation usually, 
             # but we can keep it if needed for checking tokens, though vLLM handles it.
             # We'll rely on vLLM's internal tokenization.
 
-    def generate(self, system_prompt: str, user_prompt: str, max_new_tokens: int = 4096) -> str:
+    def make_request(self, profile: str, system_prompt: str, user_prompt: str, **overrides) -> GenerationRequest:
+        """
+        Builds a request with the settings of the named profile; keyword arguments override
+        single fields (e.g. `temperature=0.0`) or set the other request fields.
+        """
+        settings = self.profiles.get(profile)
+        fields = {
+            "max_new_tokens": settings.max_new_tokens,
+            "temperature": settings.temperature,
+            "top_p": settings.top_p,
+            "stop": list(settings.stop) if settings.stop else None,
+            "seed": settings.seed,
+        }
+        fields["stage"] = profile
+        fields.update(overrides)
+        return GenerationRequest(system_prompt, user_prompt, profile=profile, **fields)
+
+    def generate(self, system_prompt: str, user_prompt: str, max_new_tokens: Optional[int] = None, profile: str = "default", **overrides) -> str:
+        if max_new_tokens is not None:
+            overrides["max_new_tokens"] = max_new_tokens
+        return self.generate_request(self.make_request(profile, system_prompt, user_prompt, **overrides))
+
+    def generate_request(self, request: GenerationRequest) -> str:
+        return self.generate_batch([request])[0]
+
+    def generate_batch(self, requests: List[GenerationRequest]) -> List[str]:
+        """
+        Submits all requests to the engine in a single call so vLLM can schedule
+        them together. Outputs are returned in the same order as `requests`.
+        """
+        return [candidates[0] for candidates in self.generate_candidates(requests)]
+
+    def generate_candidates(self, requests: List[GenerationRequest], return_exceptions: bool = False) -> List[List[str]]:
+        """
+        Like `generate_batch`, but returns all `request.n` sampled candidates of every request.
+
+        Backends that send requests independently (the HTTP backend) can fail one request of a
+        call on its own. Its exception is raised once the others are cached, or, with
+        `return_exceptions`, returned in its place, like `asyncio.gather`.
+        """
+        if not requests:
+            return []
+
+        keys = [self._cache_key(r) for r in requests]
+        results = [None] * len(requests)
+        for i, key in enumerate(keys):
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                results[i] = [cached]
+                self.metrics.record_cache_hit(requests[i].stage)
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            generated = self._generate_uncached([requests[i] for i in missing])
+            for i, candidates in zip(missing, generated):
+                results[i] = candidates
+                if keys[i] and not isinstance(candidates, Exception):
+                    self.cache.put(keys[i], candidates[0])
+
+        if not return_exceptions:
+            failure = next((result for result in results if isinstance(result, Exception)), None)
+            if failure is not None:
+                raise failure
+        return results
+
+    def _generate_uncached(self, requests: List[GenerationRequest]) -> List[List[str]]:
+        start = time.perf_counter()
+        self.metrics.engine_started()
+        try:
+            results, token_counts = self._run_engine(requests)
+        finally:
+            self.metrics.engine_finished()
+
+        # Requests of one engine call finish together, so they share its latency
+        latency = time.perf_counter() - start
+        for request, result, (prompt_tokens, completion_tokens) in zip(requests, results, token_counts):
+            if not isinstance(result, Exception):
+                self.metrics.record_request(request.stage, latency, prompt_tokens, completion_tokens, request.usage)
+        return results
+
+    def _run_engine(self, requests: List[GenerationRequest]) -> Tuple[List[List[str]], List[Tuple[int, int]]]:
+        """
+        Runs `requests` on the engine and returns their candidates and `(prompt, completion)` token counts.
+        A request that failed on its own has its exception in place of its candidates.
+        """
         if self.mock:
-            return self._mock_generate(system_prompt, user_prompt)
+            results = [[self._mock_response(r) for _ in range(r.n)] for r in requests]
+            return results, [self._mock_token_counts(r, c) for r, c in zip(requests, results)]
+
+        prompts = [self._render_prompt(r.system_prompt, r.user_prompt) for r in requests]
+        sampling_params = [self._sampling_params(r) for r in requests]
+
+        # vLLM generate returns a list of RequestOutput objects, one per prompt, in input order
+        outputs = self.model.generate(
+            prompts,
+            sampling_params,
+            use_tqdm=False,
+        )
 
+        self._record_constraint_stats(requests)
+        results = [[completion.text.strip() for completion in output.outputs] for output in outputs]
+        return results, [self._token_counts(output) for output in outputs]
+
+    @staticmethod
+    def _token_counts(output) -> Tuple[int, int]:
+        return len(output.prompt_token_ids), sum(len(completion.token_ids) for completion in output.outputs)
+
+    def _mock_token_counts(self, request: GenerationRequest, candidates: List[str]) -> Tuple[int, int]:
+        prompt = self._render_prompt(request.system_prompt, request.user_prompt)
+        return self.count_tokens(prompt), sum(self.count_tokens(c) for c in candidates)
+
+    def _sampling_params(self, request: GenerationRequest):
         from vllm import SamplingParams
 
+        extra = {}
+        if request.banned_words:
+            extra["bad_words"] = self._bad_words(request.banned_words)
+        if request.json_schema is not None:
+            extra["structured_outputs"] = self._guided_json(request.json_schema)
+        if request.stop:
+            extra["stop"] = request.stop
+        if request.seed is not None:
+            extra["seed"] = request.seed
+
+        return SamplingParams(
+            max_tokens=request.max_new_tokens,
+            temperature=request.temperature,
+            top_p=request.top_p,
+            n=request.n,
+            **extra,
+        )
+
+    @staticmethod
+    def _guided_json(schema: Dict[str, Any]):
+        # The token caps of structured calls assume the output is held to the schema, so a vLLM
+        # without the structured outputs API must fail instead of decoding free-form text
+        try:
+            from vllm.sampling_params import StructuredOutputsParams
+        except ImportError as e:
+            raise RuntimeError(
+                "JSON schema requests need vLLM's structured outputs (StructuredOutputsParams); "
+                "install the vLLM version locked in uv.lock"
+            ) from e
+        return StructuredOutputsParams(json=schema)
+
+    def _init_constraint_state(self):
+        # `bad_words` per banlist, reused by every turn of a dialogue
+        self._bad_words_cache = {}
+        # vLLM applies `bad_words` inside the engine core and does not report what it masked,
+        # so `blocked_tokens` is only counted in mock mode
+        self.constraint_stats = {"constrained_requests": 0, "blocked_tokens": 0}
+
+    def _bad_words(self, banned_words: List[str]) -> List[str]:
+        key = tuple(banned_words)
+        if key not in self._bad_words_cache:
+            self._bad_words_cache[key] = decoding_bad_words(banned_words)
+        return self._bad_words_cache[key]
+
+    def _record_constraint_stats(self, requests: List[GenerationRequest]):
+        self.constraint_stats["constrained_requests"] += sum(1 for r in requests if r.banned_words)
+
+    def _mock_response(self, request: GenerationRequest) -> str:
+        text = self._mock_generate(request.system_prompt, request.user_prompt)
+        if request.json_schema is not None:
+            text = self._mock_conform(text, request.json_schema)
+        if not request.banned_words:
+            return text
+        text, removed = strip_banned_words(text, request.banned_words)
+        self.constraint_stats["constrained_requests"] += 1
+        self.constraint_stats["blocked_tokens"] += removed
+        return text
+
+    @classmethod
+    def _mock_conform(cls, text: str, schema: Dict[str, Any]) -> str:
+        """
+        Mock stand-in for guided decoding: keeps `text` if it is a JSON object with the
+        required keys, otherwise returns a minimal instance of `schema`.
+        """
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and all(key in data for key in schema.get("required", [])):
+            return text
+        return json.dumps(cls._mock_instance(schema))
+
+    @classmethod
+    def _mock_instance(cls, schema: Dict[str, Any]) -> Any:
+        schema_type = schema.get("type")
+        if isinstance(schema_type, list):
+            schema_type = schema_type[0]
+        if schema_type == "object":
+            return {key: cls._mock_instance(sub) for key, sub in schema.get("properties", {}).items()}
+        if schema_type == "array":
+            count = schema.get("minItems", 1)
+            return [cls._mock_instance(schema.get("items", {})) for _ in range(count)]
+        if schema_type == "boolean":
+            return True
+        if schema_type in ("integer", "number"):
+            return 0
+        if schema_type == "null":
+            return None
+        return "mock"
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Number of tokens `text` takes under the model's tokenizer (whitespace words in mock mode).
+        """
+        if self.mock:
+            return len(text.split())
+        return len(self._get_tokenizer().encode(text, add_special_tokens=False))
+
+    def _cache_key(self, request: GenerationRequest) -> Optional[str]:
+        if self.cache is None:
+            return None
+        if request.temperature > 0 and not self.cache_sampled:
+            return None
+        if request.n > 1:
+            # Only single responses are stored; several candidates are meant to differ
+            return None
+
+        sampling = {
+            "max_new_tokens": request.max_new_tokens,
+            "temperature": request.temperature,
+            "top_p": request.top_p,
+        }
+        if request.banned_words:
+            sampling["banned_words"] = sorted(request.banned_words)
+        if request.json_schema is not None:
+            sampling["json_schema"] = request.json_schema
+        if request.stop:
+            sampling["stop"] = request.stop
+        if request.seed is not None:
+            sampling["seed"] = request.seed
+        prompt = self._render_prompt(request.system_prompt, request.user_prompt)
+        return ResponseCache.make_key(self.model_name, prompt, sampling)
+
+    def _get_tokenizer(self):
         # Get the tokenizer associated with the vLLM model
-        tokenizer = self.model.get_tokenizer()
+        return self.model.get_tokenizer()
+
+    def _render_prompt(self, system_prompt: str, user_prompt: str) -> str:
+        if self.mock:
+            # ChatML-style stand-in so mock runs see the same prompt layout as a real chat template
+            rendered = f"<|im_start|>system\n{system_prompt}<|im_end|>\n" if system_prompt else ""
+            return rendered + f"<|im_start|>user\n{user_prompt}<|im_end|>\n<|im_start|>assistant\n"
+
+        tokenizer = self._get_tokenizer()
 
         # Build messages in "chat" format
         messages = []
@@ -41,35 +335,20 @@ class LLMWrapper:
         messages.append({"role": "user", "content": user_prompt})
 
         # Use the tokenizer's default chat template
-        full_prompt = tokenizer.apply_chat_template(
+        return tokenizer.apply_chat_template(
             messages,
             tokenize=False,
             add_generation_prompt=True,  # adds the assistant prefix according to the template
         )
 
-        sampling_params = SamplingParams(
-            max_tokens=max_new_tokens,
-            temperature=0.7,
-            top_p=0.95,
-        )
-
-        # vLLM generate returns a list of RequestOutput objects
-        outputs = self.model.generate(
-            [full_prompt],
-            sampling_params,
-            use_tqdm=False,
-        )
-
-        generated_text = outputs[0].outputs[0].text
-        return generated_text.strip()
-
     def _mock_generate(self, system_prompt: str, user_prompt: str) -> str:
         """
         Deterministic mock responses for testing logic flow.
         """
         sys = system_prompt[:20].lower()
         if "storyteller" in sys or "creative" in sys:
-            return f"Once upon a time, [MOCK STORY] based on {user_prompt}. The end."
+            # Third person, a named protagonist and three sentences, so it passes the pre-judge rules
+            return f'Once upon a time, [MOCK STORY] Alice lived through "{user_prompt}". She told her friends all about it. They agreed it was a day to remember.'
         
         if "semantic" in sys or "extract" in sys:
             # Return valid JSON for parsing
@@ -94,3 +373,84 @@ class LLMWrapper:
             })
             
         return "Generic Mock Response"
+
+
+class AsyncLLMWrapper(LLMWrapper):
+    """
+    asyncio counterpart of `LLMWrapper` backed by vLLM's `AsyncLLMEngine`.
+
+    Every coroutine awaiting `generate` becomes a separate engine request, and the engine
+    interleaves all of them with continuous batching. In mock mode the responses are the
+    same as `LLMWrapper`'s, optionally delayed by `mock_latency` seconds so that concurrency
+    can be exercised on CPU.
+    """
+    def __init__(self, model_name: str, device: str = "cuda", mock: bool = False, enable_prefix_caching: bool = True,
+                 cache: Optional[ResponseCache] = None, cache_sampled: bool = False, profiles: Optional[ProfileRegistry] = None,
+                 mock_latency: float = 0.0):
+        super().__init__(model_name, device=device, mock=mock, enable_prefix_caching=enable_prefix_caching,
+                         cache=cache, cache_sampled=cache_sampled, profiles=profiles, load_engine=False)
+        self.mock_latency = mock_latency
+        self._request_ids = itertools.count()
+
+        if not self.mock:
+            from vllm import AsyncEngineArgs, AsyncLLMEngine
+            from transformers import AutoTokenizer
+
+            self.model = AsyncLLMEngine.from_engine_args(
+                AsyncEngineArgs(
+                    model=model_name,
+                    trust_remote_code=True,
+                    enable_prefix_caching=enable_prefix_caching,
+                )
+            )
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+
+    async def generate(self, system_prompt: str, user_prompt: str, max_new_tokens: Optional[int] = None, profile: str = "default", **overrides) -> str:
+        if max_new_tokens is not None:
+            overrides["max_new_tokens"] = max_new_tokens
+        return await self.generate_request(self.make_request(profile, system_prompt, user_prompt, **overrides))
+
+    async def generate_batch(self, requests: List[GenerationRequest]) -> List[str]:
+        return list(await asyncio.gather(*(self.generate_request(r) for r in requests)))
+
+    async def generate_request(self, request: GenerationRequest) -> str:
+        return (await self.generate_candidates_request(request))[0]
+
+    async def generate_candidates_request(self, request: GenerationRequest) -> List[str]:
+        key = self._cache_key(request)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(request.stage)
+                return [cached]
+
+        start = time.perf_counter()
+        self.metrics.engine_started()
+        try:
+            candidates, (prompt_tokens, completion_tokens) = await self._generate_uncached_async(request)
+        finally:
+            self.metrics.engine_finished()
+        self.metrics.record_request(request.stage, time.perf_counter() - start, prompt_tokens, completion_tokens, request.usage)
+
+        if key:
+            self.cache.put(key, candidates[0])
+        return candidates
+
+    async def _generate_uncached_async(self, request: GenerationRequest) -> Tuple[List[str], Tuple[int, int]]:
+        if self.mock:
+            await asyncio.sleep(self.mock_latency)
+            candidates = [self._mock_response(request) for _ in range(request.n)]
+            return candidates, self._mock_token_counts(request, candidates)
+
+        prompt = self._render_prompt(request.system_prompt, request.user_prompt)
+        sampling_params = self._sampling_params(request)
+
+        # The engine streams partial outputs; the last one holds the finished sequence
+        final_output = None
+        async for output in self.model.generate(prompt, sampling_params, request_id=str(next(self._request_ids))):
+            final_output = output
+        self._record_constraint_stats([request])
+        return [completion.text.strip() for completion in final_output.outputs], self._token_counts(final_output)
+
+    def _get_tokenizer(self):
+        return self.tokenizer
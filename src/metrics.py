@@ -0,0 +1,338 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+class EntryUsage:
+    """
+    Tokens spent on one pipeline iteration (or one recovery), across all of its LLM calls.
+    """
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+# Usage of the iteration running in the current thread / asyncio task. Requests built by the
+# batched engine carry their iteration's usage explicitly instead (`GenerationRequest.usage`).
+current_entry_usage: ContextVar[Optional[EntryUsage]] = ContextVar("current_entry_usage", default=None)
+
+
+@contextmanager
+def track_entry_usage() -> Iterator[EntryUsage]:
+    usage = EntryUsage()
+    token = current_entry_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_entry_usage.reset(token)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-quantile (bucket resolution only).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"buckets": list(self.buckets[:-1]), "counts": self.counts, "sum": self.sum, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Histogram":
+        hist = cls(tuple(data["buckets"]) + (float("inf"),))
+        hist.counts = list(data["counts"])
+        hist.sum = data["sum"]
+        hist.count = data["count"]
+        return hist
+
+    def merge(self, other: "Histogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+
+class StageMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.rejections = 0
+        self.retries = 0
+        self.latency = Histogram()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {k: v for k, v in vars(self).items() if k != "latency"}
+        data["latency"] = self.latency.to_dict()
+        return data
+
+
+class MetricsRegistry:
+    """
+    In-process counters of one worker's LLM traffic, labeled by pipeline stage, plus
+    entry-level accounting (accepted/rejected entries, tokens spent on rejected entries and
+    engine-busy seconds, which stand in for GPU-seconds since each worker owns its engine).
+    Recoveries are counted apart from entries, so an entry generated and recovered in one run
+    is still one entry.
+    """
+    def __init__(self):
+        self.start_time = time.time()
+        self.stages: Dict[str, StageMetrics] = {}
+        self.entries_accepted = 0
+        self.entries_rejected = 0
+        self.tokens_accepted = 0
+        self.tokens_rejected = 0
+        self.recoveries_succeeded = 0
+        self.recoveries_failed = 0
+        self.tokens_recovery = 0
+        self.busy_seconds = 0.0
+        self._in_flight = 0
+        self._busy_since = 0.0
+
+    def stage(self, name: Optional[str]) -> StageMetrics:
+        name = name or "other"
+        if name not in self.stages:
+            self.stages[name] = StageMetrics()
+        return self.stages[name]
+
+    def engine_started(self):
+        if self._in_flight == 0:
+            self._busy_since = time.perf_counter()
+        self._in_flight += 1
+
+    def engine_finished(self):
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self.busy_seconds += time.perf_counter() - self._busy_since
+
+    def record_request(self, stage: Optional[str], latency: float, prompt_tokens: int, completion_tokens: int,
+                       usage: Optional[EntryUsage] = None):
+        metrics = self.stage(stage)
+        metrics.requests += 1
+        metrics.prompt_tokens += prompt_tokens
+        metrics.completion_tokens += completion_tokens
+        metrics.latency.observe(latency)
+
+        usage = usage or current_entry_usage.get()
+        if usage is not None:
+            usage.prompt_tokens += prompt_tokens
+            usage.completion_tokens += completion_tokens
+
+    def record_cache_hit(self, stage: Optional[str]):
+        self.stage(stage).cache_hits += 1
+
+    def record_rejection(self, stage: str):
+        self.stage(stage).rejections += 1
+
+    def record_retry(self, stage: str):
+        self.stage(stage).retries += 1
+
+    def record_entry(self, accepted: bool, usage: EntryUsage):
+        if accepted:
+            self.entries_accepted += 1
+            self.tokens_accepted += usage.total_tokens
+        else:
+            self.entries_rejected += 1
+            self.tokens_rejected += usage.total_tokens
+
+    def record_recovery(self, success: bool, usage: EntryUsage):
+        if success:
+            self.recoveries_succeeded += 1
+        else:
+            self.recoveries_failed += 1
+        self.tokens_recovery += usage.total_tokens
+
+    def snapshot(self, worker_id: int) -> Dict[str, Any]:
+        elapsed = time.time() - self.start_time
+        busy = self.busy_seconds
+        if self._in_flight:
+            busy += time.perf_counter() - self._busy_since
+        return {
+            "worker_id": worker_id,
+            "timestamp": time.time(),
+            "elapsed": elapsed,
+            "entries_accepted": self.entries_accepted,
+            "entries_rejected": self.entries_rejected,
+            "tokens_accepted": self.tokens_accepted,
+            "tokens_rejected": self.tokens_rejected,
+            "recoveries_succeeded": self.recoveries_succeeded,
+            "recoveries_failed": self.recoveries_failed,
+            "tokens_recovery": self.tokens_recovery,
+            "busy_seconds": busy,
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+        }
+
+
+class MetricsWriter:
+    """
+    Appends registry snapshots to a per-worker JSONL file (at most every `interval` seconds,
+    plus a final one) and optionally mirrors the latest snapshot to a Prometheus textfile.
+    """
+    def __init__(self, registry: MetricsRegistry, worker_id: int, path: str, prometheus_path: Optional[str] = None,
+                 interval: float = 30.0):
+        self.registry = registry
+        self.worker_id = worker_id
+        self.path = path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self._last_write = 0.0
+        # One file per run: counters start from zero in every worker process
+        open(path, "w").close()
+
+    def maybe_write(self):
+        if time.time() - self._last_write >= self.interval:
+            self.write()
+
+    def write(self):
+        snapshot = self.registry.snapshot(self.worker_id)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(snapshot) + "\n")
+        if self.prometheus_path:
+            write_prometheus_textfile(snapshot, self.prometheus_path)
+        self._last_write = time.time()
+
+
+def write_prometheus_textfile(snapshot: Dict[str, Any], path: str):
+    """
+    Writes a snapshot in the Prometheus text exposition format, atomically so that a
+    node_exporter textfile collector never reads a half-written file.
+    """
+    worker = f'worker="{snapshot["worker_id"]}"'
+    lines = [
+        "# TYPE datagen_entries_total counter",
+        f'datagen_entries_total{{{worker},outcome="accepted"}} {snapshot["entries_accepted"]}',
+        f'datagen_entries_total{{{worker},outcome="rejected"}} {snapshot["entries_rejected"]}',
+        "# TYPE datagen_entry_tokens_total counter",
+        f'datagen_entry_tokens_total{{{worker},outcome="accepted"}} {snapshot["tokens_accepted"]}',
+        f'datagen_entry_tokens_total{{{worker},outcome="rejected"}} {snapshot["tokens_rejected"]}',
+        "# TYPE datagen_recoveries_total counter",
+        f'datagen_recoveries_total{{{worker},outcome="succeeded"}} {snapshot["recoveries_succeeded"]}',
+        f'datagen_recoveries_total{{{worker},outcome="failed"}} {snapshot["recoveries_failed"]}',
+        "# TYPE datagen_recovery_tokens_total counter",
+        f'datagen_recovery_tokens_total{{{worker}}} {snapshot["tokens_recovery"]}',
+        "# TYPE datagen_engine_busy_seconds_total counter",
+        f'datagen_engine_busy_seconds_total{{{worker}}} {snapshot["busy_seconds"]:.3f}',
+    ]
+    counters = ["requests", "cache_hits", "prompt_tokens", "completion_tokens", "rejections", "retries"]
+    for counter in counters:
+        lines.append(f"# TYPE datagen_stage_{counter}_total counter")
+        for name, stage in snapshot["stages"].items():
+            lines.append(f'datagen_stage_{counter}_total{{{worker},stage="{name}"}} {stage[counter]}')
+
+    lines.append("# TYPE datagen_stage_latency_seconds histogram")
+    for name, stage in snapshot["stages"].items():
+        labels = f'{worker},stage="{name}"'
+        hist = stage["latency"]
+        cumulative = 0
+        for bound, count in zip(hist["buckets"] + ["+Inf"], hist["counts"]):
+            cumulative += count
+            lines.append(f'datagen_stage_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"datagen_stage_latency_seconds_sum{{{labels}}} {hist['sum']:.6f}")
+        lines.append(f"datagen_stage_latency_seconds_count{{{labels}}} {hist['count']}")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+def load_final_snapshots(paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Last snapshot of every metrics file that has one.
+    """
+    snapshots = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        last = None
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    last = line
+        if last:
+            snapshots.append(json.loads(last))
+    return snapshots
+
+
+def format_metrics_summary(snapshots: List[Dict[str, Any]]) -> str:
+    """
+    End-of-run summary over all workers: per-stage traffic and latency, then entry-level
+    token and GPU-time accounting.
+    """
+    if not snapshots:
+        return "No metrics recorded."
+
+    elapsed = max(s["elapsed"] for s in snapshots)
+    stages: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for name, stage in snapshot["stages"].items():
+            if name not in stages:
+                stages[name] = {key: 0 for key in stage if key != "latency"}
+                stages[name]["latency"] = Histogram()
+            total = stages[name]
+            for key, value in stage.items():
+                if key == "latency":
+                    total["latency"].merge(Histogram.from_dict(value))
+                else:
+                    total[key] += value
+
+    lines = [f"{'stage':<16}{'requests':>9}{'rps':>8}{'p50 s':>8}{'p95 s':>8}{'prompt tok':>12}{'compl tok':>11}{'cache hits':>11}{'rejected':>9}{'retries':>8}"]
+    for name, stage in sorted(stages.items()):
+        hist = stage["latency"]
+        lines.append(
+            f"{name:<16}{stage['requests']:>9}{stage['requests'] / elapsed if elapsed else 0.0:>8.2f}"
+            f"{hist.quantile(0.5):>8.2f}{hist.quantile(0.95):>8.2f}{stage['prompt_tokens']:>12}"
+            f"{stage['completion_tokens']:>11}{stage['cache_hits']:>11}{stage['rejections']:>9}{stage['retries']:>8}"
+        )
+
+    accepted = sum(s["entries_accepted"] for s in snapshots)
+    rejected = sum(s["entries_rejected"] for s in snapshots)
+    tokens_accepted = sum(s["tokens_accepted"] for s in snapshots)
+    tokens_rejected = sum(s["tokens_rejected"] for s in snapshots)
+    recovered = sum(s["recoveries_succeeded"] for s in snapshots)
+    not_recovered = sum(s["recoveries_failed"] for s in snapshots)
+    tokens_recovery = sum(s["tokens_recovery"] for s in snapshots)
+    busy = sum(s["busy_seconds"] for s in snapshots)
+    total_tokens = tokens_accepted + tokens_rejected + tokens_recovery
+    lines.append(f"Entries: accepted={accepted} rejected={rejected}")
+    if recovered or not_recovered:
+        lines.append(f"Recoveries: succeeded={recovered} failed={not_recovered} tokens={tokens_recovery}")
+    lines.append(
+        f"Tokens: total={total_tokens} on rejected entries={tokens_rejected}"
+        f" ({tokens_rejected / total_tokens if total_tokens else 0.0:.1%})"
+    )
+    lines.append(
+        f"GPU-seconds (engine busy): {busy:.1f}, per accepted entry: "
+        + (f"{busy / accepted:.2f}" if accepted else "n/a")
+    )
+    return "\n".join(lines)
@@ -0,0 +1,112 @@
+import re
+from typing import Callable, Dict, Optional
+
+from metrics import MetricsRegistry
+
+# The storyteller prompt asks for 3-5 sentences
+MIN_SENTENCES = 3
+MAX_SENTENCES = 5
+
+_FIRST_SECOND_PERSON = ["me", "my", "mine", "myself", "we", "us", "our", "ours", "ourselves",
+                        "you", "your", "yours", "yourself", "yourselves"]
+# Case-sensitive so that e.g. "US" is not taken for "us"; "I" also catches "I'm", "I'd", ...
+_PERSON_PATTERN = re.compile(r"\b(?:I|" + "|".join(w for word in _FIRST_SECOND_PERSON for w in (word, word.capitalize())) + r")\b")
+# First-person speech inside quotes is fine in a third-person story
+_QUOTED = re.compile(r"\"[^\"]*\"|“[^”]*”")
+_ABBREVIATION = re.compile(r"\b(Mr|Mrs|Ms|Dr|St|Jr|Sr)\.")
+_SENTENCE_END = re.compile(r"[.!?]+[\"”’')]*(?=\s|$)")
+_WORD = re.compile(r"[A-Za-z][\w'’-]*")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Capitalized only because they open a sentence, so they do not count as a name there
+_SENTENCE_STARTERS = {
+    "a", "an", "the", "he", "she", "it", "they", "his", "her", "its", "their", "this", "that", "these",
+    "those", "there", "then", "once", "one", "after", "before", "when", "while", "as", "but", "and",
+    "so", "yet", "in", "on", "at", "by", "for", "from", "with", "to", "of", "later", "soon", "finally",
+    "suddenly", "every", "everyone", "all", "nobody", "someone", "i", "we", "you", "my", "our", "your",
+}
+
+
+def _sentences(text: str):
+    text = _ABBREVIATION.sub(r"\1", text)
+    return [s for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def _normalize(text: str) -> str:
+    return " " + _NON_ALNUM.sub(" ", text.lower()).strip() + " "
+
+
+def third_person(hidden_event: str, story: str) -> bool:
+    return _PERSON_PATTERN.search(_QUOTED.sub(" ", story)) is None
+
+
+def named_protagonist(hidden_event: str, story: str) -> bool:
+    """
+    Some capitalized word that is not just a capitalized sentence opener.
+    """
+    for sentence in _sentences(story):
+        for i, word in enumerate(_WORD.findall(sentence)):
+            if word[0].isupper() and (i > 0 or word.lower() not in _SENTENCE_STARTERS):
+                return True
+    return False
+
+
+def sentence_count(hidden_event: str, story: str) -> bool:
+    return MIN_SENTENCES <= len(_sentences(story)) <= MAX_SENTENCES
+
+
+def event_phrase_absent(hidden_event: str, dialogue: str) -> bool:
+    return _normalize(hidden_event) not in _normalize(dialogue)
+
+
+# Mechanical checks of what the LLM judges are asked to verify, cheapest first. Each returns
+# True if the text passes; only text passing all of them is sent to the LLM judge.
+STORY_RULES: Dict[str, Callable[[str, str], bool]] = {
+    "sentence_count": sentence_count,
+    "third_person": third_person,
+    "named_protagonist": named_protagonist,
+}
+DIALOGUE_RULES: Dict[str, Callable[[str, str], bool]] = {
+    "event_phrase_absent": event_phrase_absent,
+}
+
+
+class PreJudge:
+    """
+    Rule cascade run before the story and dialogue judges. A text failing a rule is rejected
+    without an LLM call; rules only catch obvious failures, so anything they pass still goes to
+    the judge. Rejections are counted per rule here and as `prejudge_<rule>` rejections in
+    `metrics`.
+    """
+    def __init__(self, metrics: Optional[MetricsRegistry] = None):
+        self.metrics = metrics
+        self.checked_stories = 0
+        self.checked_dialogues = 0
+        self.rejections: Dict[str, int] = {rule: 0 for rule in list(STORY_RULES) + list(DIALOGUE_RULES)}
+
+    def _run(self, rules: Dict[str, Callable[[str, str], bool]], hidden_event: str, text: str) -> Optional[str]:
+        for rule, check in rules.items():
+            if not check(hidden_event, text):
+                self.rejections[rule] += 1
+                if self.metrics is not None:
+                    self.metrics.record_rejection(f"prejudge_{rule}")
+                return rule
+        return None
+
+    def check_story(self, hidden_event: str, story_text: str) -> Optional[str]:
+        """
+        Name of the first rule the story fails, or None if it should go to the judge.
+        """
+        self.checked_stories += 1
+        return self._run(STORY_RULES, hidden_event, story_text)
+
+    def check_dialogue(self, hidden_event: str, dialogue_text: str) -> Optional[str]:
+        self.checked_dialogues += 1
+        return self._run(DIALOGUE_RULES, hidden_event, dialogue_text)
+
+    def stats(self) -> Dict[str, int]:
+        data = {"checked_stories": self.checked_stories, "checked_dialogues": self.checked_dialogues}
+        data.update({f"rejected_{rule}": count for rule, count in self.rejections.items()})
+        # Every rejection skips at least the judge call it stands in front of
+        data["judge_calls_avoided"] = sum(self.rejections.values())
+        return data
@@ -18,33 +18,23 @@ SYSTEM_PROMPTS = {
         "Also check if the story follows the rules: Third person only, has a named protagonist.\n"
         "Return JSON: {\"valid\": boolean, \"reason\": string}"
     ),
-    "dialogue_speaker_1": (
-        "You are Speaker A in a conversation with Speaker B. You both know the protagonist and the events in the story, but you are NOT the protagonist.\n"
+    # Per-entry context is shared by every turn and both speakers so it forms a cacheable prefix;
+    # only the turn prompt (history first, then the speaker) changes.
+    "dialogue_context": (
+        "You are voicing a conversation between Speaker A and Speaker B. They both know the protagonist and the events in the story, but neither of them is the protagonist.\n"
         "Context: {story}\n"
         "Protagonist: {protagonist}\n"
         "Hidden Event: {hidden_event} (DO NOT SAY THIS EXACT PHRASE)\n"
-        "Banned Words: {banlist_str}\n"
-        "Previous turns:\n{history}\n\n"
-        "Task: Generate the next turn for Speaker A. \n"
+        "Banned Words: {banlist_str}\n\n"
         "Rules:\n"
         "1. Mention the protagonist by name at least once if natural.\n"
         "2. Discuss events from the story related to the hidden event, but do NOT use the banned words or the exact hidden event phrase.\n"
         "3. Be natural and conversational.\n"
         "4. Output ONLY the spoken text."
     ),
-    "dialogue_speaker_2": (
-        "You are Speaker B in a conversation with Speaker A. You both know the protagonist and the events in the story, but you are NOT the protagonist.\n"
-        "Context: {story}\n"
-        "Protagonist: {protagonist}\n"
-        "Hidden Event: {hidden_event} (DO NOT SAY THIS EXACT PHRASE)\n"
-        "Banned Words: {banlist_str}\n"
+    "dialogue_turn": (
         "Previous turns:\n{history}\n\n"
-        "Task: Generate the next turn for Speaker B. \n"
-        "Rules:\n"
-        "1. Mention the protagonist by name at least once if natural.\n"
-        "2. Discuss events from the story related to the hidden event, but do NOT use the banned words or the exact hidden event phrase.\n"
-        "3. Be natural and conversational.\n"
-        "4. Output ONLY the spoken text."
+        "Task: Generate the next turn for {speaker}."
     ),
     "judge_dialogue": (
         "You are a dialogue quality judge. You will be given a Hidden Event, a Story, and a Dialogue.\n"
@@ -67,3 +57,34 @@ SYSTEM_PROMPTS = {
         "Return JSON: {\"match\": boolean, \"matching_guess\": string or null}"
     )
 }
+
+# JSON schemas for structured outputs. Requests carrying one are decoded with guided JSON,
+# so the response always parses and decoding stops at the closing brace.
+OUTPUT_SCHEMAS = {
+    "verdict": {
+        "type": "object",
+        "properties": {
+            "valid": {"type": "boolean"},
+            "reason": {"type": "string", "maxLength": 200},
+        },
+        "required": ["valid", "reason"],
+        "additionalProperties": False,
+    },
+    "recovery_verdict": {
+        "type": "object",
+        "properties": {
+            "match": {"type": "boolean"},
+            "matching_guess": {"type": ["string", "null"], "maxLength": 200},
+        },
+        "required": ["match", "matching_guess"],
+        "additionalProperties": False,
+    },
+    "guesses": {
+        "type": "object",
+        "properties": {
+            "guesses": {"type": "array", "items": {"type": "string", "maxLength": 120}},
+        },
+        "required": ["guesses"],
+        "additionalProperties": False,
+    },
+}
@@ -0,0 +1,143 @@
+import json
+import os
+from array import array
+from typing import BinaryIO, Dict, Any, Iterator, Tuple
+
+
+def iter_record_spans(f: BinaryIO) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields `(byte_offset, raw_bytes)` for every record of an open binary file, holding at most
+    one record in memory.
+
+    Handles real JSONL (one object per line) as well as the legacy format of concatenated
+    pretty-printed objects, where a record spans several lines. Partial records (e.g. a line
+    cut short by a crash, in the middle of the file or at its end) are skipped with a warning.
+
+    Records are only split, not parsed: only the suspect ones (a record whose first line opens
+    with more than a lone "{" but does not end in "}", or a span cut off by the next record) are
+    validated here. A record that merely looks complete but is not valid JSON is yielded, and
+    its reader skips it with `warn_skipped` when it fails to parse.
+    """
+    pending_start = None
+    pending = []
+    suspect = False
+    pos = 0
+    for line in f:
+        stripped = line.strip()
+        if pending_start is not None and line.startswith(b"{"):
+            # Lines inside a pretty-printed object are indented, so an unindented "{" starts
+            # the next record: the pending one was cut short, unless it ended without a
+            # closing brace of its own at the start of a line
+            raw = b"".join(pending)
+            if _is_valid(raw):
+                yield pending_start, raw
+            else:
+                warn_skipped(pending_start, "incomplete record")
+            pending_start = None
+            pending = []
+
+        if pending_start is None:
+            if stripped:
+                if _is_single_line_record(stripped):
+                    yield pos, stripped
+                else:
+                    pending_start = pos
+                    pending = [line]
+                    # A pretty-printed object opens with a lone "{"; anything else is most
+                    # likely a JSONL line cut short
+                    suspect = stripped != b"{"
+        else:
+            pending.append(line)
+            if line.startswith(b"}"):
+                # End of a pretty-printed object is a closing brace at the start of a line;
+                # the closing braces of nested objects are indented
+                raw = b"".join(pending)
+                if not suspect or _is_valid(raw):
+                    yield pending_start, raw
+                    pending_start = None
+                    pending = []
+        pos += len(line)
+
+    if pending_start is not None:
+        warn_skipped(pending_start, "incomplete trailing record")
+
+
+def _is_valid(raw: bytes) -> bool:
+    try:
+        json.loads(raw)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+def warn_skipped(offset: int, reason: str):
+    print(f"Skipping {reason} at byte offset {offset}")
+
+
+def build_offset_index(path: str) -> array:
+    """
+    One pass over `path` recording the byte offset at which every record starts.
+    """
+    offsets = array("Q")
+    with open(path, "rb") as f:
+        for offset, _ in iter_record_spans(f):
+            offsets.append(offset)
+    return offsets
+
+
+def _is_single_line_record(stripped: bytes) -> bool:
+    # Lines inside a pretty-printed object are indented or start with a key/closing brace,
+    # so only a JSONL record both starts with "{" and ends with "}" at the top level.
+    return stripped.startswith(b"{") and stripped.endswith(b"}")
+
+
+def index_path_for(path: str) -> str:
+    return path + ".idx"
+
+
+def load_or_build_index(path: str) -> array:
+    """
+    Returns the offset index of `path`, reusing the `.idx` sidecar file if it is newer than
+    the data file and rebuilding (and saving) it otherwise.
+    """
+    idx_path = index_path_for(path)
+    if os.path.exists(idx_path) and os.path.getmtime(idx_path) >= os.path.getmtime(path):
+        return load_index(idx_path)
+
+    offsets = build_offset_index(path)
+    try:
+        save_index(offsets, idx_path)
+    except OSError as e:
+        # Read-only input directory: the index still works, it just is not reused
+        print(f"Could not save record index {idx_path}: {e}")
+    return offsets
+
+
+def save_index(offsets: array, idx_path: str):
+    tmp_path = idx_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        offsets.tofile(f)
+    os.replace(tmp_path, idx_path)
+
+
+def load_index(idx_path: str) -> array:
+    offsets = array("Q")
+    with open(idx_path, "rb") as f:
+        offsets.frombytes(f.read())
+    return offsets
+
+
+def read_record_at(f: BinaryIO, offset: int) -> Dict[str, Any]:
+    """
+    Seeks to `offset` and parses the single record starting there. Lines are accumulated
+    until they form a complete JSON object, so multi-line legacy records work too.
+    """
+    f.seek(offset)
+    buffer = b""
+    for line in f:
+        buffer += line
+        try:
+            return json.loads(buffer)
+        except json.JSONDecodeError:
+            continue
+    raise ValueError(f"No complete record at byte offset {offset}")
@@ -1,9 +1,15 @@
+import copy
 import json
 from typing import List, Optional
-from llm import LLMWrapper
+from llm import LLMWrapper, GenerationRequest
 from data_models import DatasetEntry, Recovery
-from prompt_templates import SYSTEM_PROMPTS
+from prompt_templates import SYSTEM_PROMPTS, OUTPUT_SCHEMAS
 from judge import Judge
+from metrics import EntryUsage, track_entry_usage
+
+# Tokens of one guess (at most 120 characters in the schema) and of the surrounding JSON
+GUESS_TOKENS = 40
+GUESSES_OVERHEAD_TOKENS = 16
 
 class RecoveryPipeline:
     def __init__(self, llm: LLMWrapper, k: int = 3):
@@ -14,19 +20,39 @@ class RecoveryPipeline:
     def run_recovery(self, entry: DatasetEntry) -> Recovery:
         dialogue_text = "\n".join(entry.dialogue.turns)
         
-        # Generate guesses
-        guesses = self._generate_guesses(dialogue_text)
-        
-        # Evaluate
-        success = self.judge.check_recovery(entry.gold_semantics.hidden_event, guesses)
+        with track_entry_usage() as usage:
+            # Generate guesses
+            guesses = self._generate_guesses(dialogue_text)
+            
+            # Evaluate
+            success = self.judge.check_recovery(entry.gold_semantics.hidden_event, guesses)
         
+        self._record_outcome(success, usage)
         return Recovery(guesses=guesses, success=success)
 
+    def _record_outcome(self, success: bool, usage: EntryUsage):
+        # A failed recovery counts as a rejection by the recovery judge. Recoveries have their
+        # own counters: the entry was already counted when it was generated
+        if not success:
+            self.llm.metrics.record_rejection("judge_recovery")
+        self.llm.metrics.record_recovery(success, usage)
+
     def _generate_guesses(self, dialogue_text: str) -> List[str]:
+        response = self.llm.generate_request(self._guesses_request(dialogue_text))
+        return self._parse_guesses(response)
+
+    def _guesses_request(self, dialogue_text: str) -> GenerationRequest:
         prompt = SYSTEM_PROMPTS["recovery_agent"].format(dialogue=dialogue_text, k=self.k)
+        # Exactly k guesses, decoded as guided JSON
+        schema = copy.deepcopy(OUTPUT_SCHEMAS["guesses"])
+        schema["properties"]["guesses"].update(minItems=self.k, maxItems=self.k)
+        # The profile cap is raised when k guesses would not fit, so the JSON is never cut short
+        max_new_tokens = max(self.llm.profiles.get("recover").max_new_tokens, GUESSES_OVERHEAD_TOKENS + GUESS_TOKENS * self.k)
         # Using generic system prompt
-        response = self.llm.generate("You are a helpful assistant.", prompt)
-        
+        return self.llm.make_request("recover", "You are a helpful assistant.", prompt, json_schema=schema, stage="recovery",
+                                     max_new_tokens=max_new_tokens)
+
+    def _parse_guesses(self, response: str) -> List[str]:
         data = self._parse_json(response)
         guesses = data.get("guesses", [])
         
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Optional, Dict, Any
+
+
+class ResponseCache:
+    """
+    Persistent content-addressed cache of LLM responses backed by SQLite.
+
+    Entries are keyed by a hash of (model name, rendered prompt, sampling parameters). When the
+    stored responses exceed `max_bytes`, the least recently used ones are evicted. The database
+    runs in WAL mode so several worker processes can share one cache file.
+    """
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._total_bytes = self._stored_bytes()
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, sampling: Dict[str, Any]) -> str:
+        payload = json.dumps([model_name, prompt, sampling], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, response: str):
+        size = len(response.encode("utf-8"))
+        # Replacing a stored key frees the size of the response it held
+        self.conn.execute("BEGIN IMMEDIATE")
+        row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, response, size, time.time()),
+        )
+        self.conn.execute("COMMIT")
+        self._total_bytes += size - (row[0] if row is not None else 0)
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self):
+        # The running total is only an estimate when several processes share the file,
+        # so re-read the real size before deleting anything.
+        self._total_bytes = self._stored_bytes()
+        target = int(self.max_bytes * 0.9)
+        self.conn.execute("BEGIN")
+        while self._total_bytes > target:
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= target:
+                    break
+        self.conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "stored_bytes": self._total_bytes,
+        }
+
+    def close(self):
+        self.conn.close()
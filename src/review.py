@@ -0,0 +1,122 @@
+import json
+import random
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+
+from jsonl_io import iter_records
+
+# Record fields a review sample can be stratified by
+STRATIFY_KEYS: Dict[str, Callable[[Dict[str, Any]], Hashable]] = {
+    "event": lambda record: record["gold_semantics"]["hidden_event"],
+    # None for entries without a recovery (generate-only runs)
+    "success": lambda record: (record.get("recovery") or {}).get("success"),
+}
+
+
+class ReservoirSampler:
+    """
+    Uniform sample of at most `size` items from a stream of unknown length (Algorithm R):
+    one pass, O(size) memory, and every item seen ends up in the sample with equal probability.
+    """
+    def __init__(self, size: int, rng: random.Random):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.items: List[Any] = []
+
+    def add(self, item: Any):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.size:
+            self.items[slot] = item
+
+
+class StratifiedReservoirSampler:
+    """
+    One reservoir per stratum, combined at the end by taking items from the strata in turn, so
+    rare strata (an event that showed up a handful of times, failed recoveries) get the same
+    share of the sample as common ones. Memory is O(size) per stratum.
+    """
+    def __init__(self, size: int, key: Callable[[Any], Hashable], seed: int = 0):
+        self.size = size
+        self.key = key
+        self.rng = random.Random(seed)
+        self.strata: Dict[Hashable, ReservoirSampler] = {}
+
+    def add(self, item: Any):
+        stratum = self.key(item)
+        if stratum not in self.strata:
+            self.strata[stratum] = ReservoirSampler(self.size, self.rng)
+        self.strata[stratum].add(item)
+
+    def sample(self) -> List[Any]:
+        reservoirs = [list(r.items) for r in self.strata.values()]
+        for items in reservoirs:
+            self.rng.shuffle(items)
+        self.rng.shuffle(reservoirs)
+
+        sample = []
+        while len(sample) < self.size and any(reservoirs):
+            for items in reservoirs:
+                if items and len(sample) < self.size:
+                    sample.append(items.pop())
+        return sample
+
+
+def stratify_key(fields: Sequence[str]) -> Callable[[Dict[str, Any]], Hashable]:
+    unknown = set(fields) - set(STRATIFY_KEYS)
+    if unknown:
+        raise ValueError(f"Cannot stratify by {sorted(unknown)}; choose from {sorted(STRATIFY_KEYS)}")
+    getters = [STRATIFY_KEYS[field] for field in fields]
+    return lambda record: tuple(get(record) for get in getters)
+
+
+def sample_records(paths: Iterable[str], size: int, seed: int = 0, stratify: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """
+    Streams every record of every shard once and returns a seeded sample of `size` of them,
+    optionally stratified by any of `STRATIFY_KEYS`. Only the sampled records stay in memory.
+    """
+    sampler = StratifiedReservoirSampler(size, stratify_key(stratify), seed)
+    for path in paths:
+        for record in iter_records(path):
+            sampler.add(record)
+    return sampler.sample()
+
+
+def format_text(record: Dict[str, Any], number: int) -> str:
+    lines = [
+        f"--- Sample {number} ---",
+        f"Story: {record['story']['text']}",
+        f"Hidden Event: {record['gold_semantics']['hidden_event']}",
+        f"Protagonist: {record['gold_semantics']['protagonist_name']}",
+        f"Dialogue: {json.dumps(record['dialogue']['turns'], indent=2)}",
+    ]
+    if record.get("recovery"):
+        lines.append(f"Guesses: {json.dumps(record['recovery']['guesses'], indent=2)}")
+        lines.append(f"Success: {record['recovery']['success']}")
+    return "\n".join(lines) + "\n\n"
+
+
+def format_jsonl(record: Dict[str, Any], number: int) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+REVIEW_FORMATS: Dict[str, Callable[[Dict[str, Any], int], str]] = {
+    "text": format_text,
+    "jsonl": format_jsonl,
+}
+
+
+def write_review_samples(paths: Iterable[str], output_path: str, size: int = 10, seed: int = 0,
+                         stratify: Sequence[str] = (), fmt: str = "text") -> int:
+    """
+    Writes a review sample drawn from all `paths` to `output_path` and returns its size.
+    """
+    formatter = REVIEW_FORMATS[fmt]
+    sample = sample_records(paths, size, seed, stratify)
+    with open(output_path, "w") as out:
+        for number, record in enumerate(sample, 1):
+            out.write(formatter(record, number))
+    return len(sample)
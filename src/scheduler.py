@@ -0,0 +1,160 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+# Event states
+ACTIVE = "active"
+FILLED = "filled"
+# Circuit breaker tripped: the judges (almost) never accept this event
+BROKEN = "broken"
+
+
+class EventState:
+    """
+    Online counters of one event hint: attempts with a known outcome, accepted entries among
+    them and attempts handed out whose outcome is not back yet.
+    """
+    def __init__(self, quota: int):
+        self.quota = quota
+        self.attempts = 0
+        self.accepted = 0
+        self.pending = 0
+        self.status = ACTIVE if quota > 0 else FILLED
+
+    @property
+    def acceptance_rate(self) -> float:
+        # Posterior mean under a uniform Beta(1, 1) prior, so unseen events look like a coin flip
+        return (self.accepted + 1) / (self.attempts + 2)
+
+    @property
+    def deficit(self) -> float:
+        """
+        Accepted entries still missing once the pending attempts come back at the current rate.
+        """
+        return self.quota - self.accepted - self.pending * self.acceptance_rate
+
+    @property
+    def expected_attempts(self) -> float:
+        return max(0.0, self.deficit) / self.acceptance_rate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "quota": self.quota,
+            "attempts": self.attempts,
+            "accepted": self.accepted,
+            "acceptance_rate": self.accepted / self.attempts if self.attempts else 0.0,
+            "status": self.status,
+        }
+
+
+class EventScheduler:
+    """
+    Decides which event hint to attempt next so that every event ends up with `quota` accepted
+    entries.
+
+    Acceptance rates are tracked online from the outcomes reported back by the workers. An
+    event is only handed out while its deficit is not already covered by its in-flight
+    attempts, so no attempt is spent beyond the expected need, and the event with the most
+    expected attempts left goes first: the total expected cost is the same in any order, and
+    starting the longest tails early keeps all workers busy until the end. An event retires once
+    its quota is met. One whose acceptance rate is still below `min_acceptance_rate` after
+    `breaker_attempts` attempts trips the circuit breaker and is not attempted again.
+    """
+    def __init__(self, quotas: Dict[str, int], breaker_attempts: int = 20, min_acceptance_rate: float = 0.05,
+                 max_attempts: int = 0):
+        self.events: Dict[str, EventState] = {event: EventState(quota) for event, quota in quotas.items()}
+        self.breaker_attempts = breaker_attempts
+        self.min_acceptance_rate = min_acceptance_rate
+        # Safety budget over all events (0 = unlimited)
+        self.max_attempts = max_attempts
+        self.issued = 0
+
+    @classmethod
+    def uniform(cls, events: Iterable[str], quota: int, **kwargs) -> "EventScheduler":
+        return cls({event: quota for event in events}, **kwargs)
+
+    def next_event(self) -> Optional[str]:
+        """
+        The event to attempt next, or None if no attempt is needed right now: every quota is
+        met or covered by pending attempts, or the attempt budget is spent.
+        """
+        if self.max_attempts and self.issued >= self.max_attempts:
+            return None
+        best, best_cost = None, 0.0
+        for event, state in self.events.items():
+            if state.status != ACTIVE:
+                continue
+            cost = state.expected_attempts
+            if cost > best_cost:
+                best, best_cost = event, cost
+        if best is not None:
+            self.events[best].pending += 1
+            self.issued += 1
+        return best
+
+    def record(self, event: str, accepted: bool):
+        state = self.events.get(event)
+        if state is None:
+            return
+        state.pending = max(0, state.pending - 1)
+        state.attempts += 1
+        if accepted:
+            state.accepted += 1
+        if state.status != ACTIVE:
+            return
+        if state.accepted >= state.quota:
+            state.status = FILLED
+        elif state.attempts >= self.breaker_attempts and state.accepted / state.attempts < self.min_acceptance_rate:
+            state.status = BROKEN
+            print(f"Circuit breaker: '{event}' accepted {state.accepted}/{state.attempts} attempts, no longer scheduled")
+
+    def seed(self, accepted: Dict[str, int]):
+        """
+        Counts entries accepted by an earlier run (resume) towards the quotas.
+        """
+        for event, count in accepted.items():
+            state = self.events.get(event)
+            if state is None:
+                continue
+            state.accepted += count
+            state.attempts += count
+            if state.accepted >= state.quota:
+                state.status = FILLED
+
+    @property
+    def finished(self) -> bool:
+        """
+        True once every event is filled or broken, or the attempt budget is spent.
+        """
+        if self.max_attempts and self.issued >= self.max_attempts:
+            return True
+        return all(state.status != ACTIVE for state in self.events.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {event: state.to_dict() for event, state in self.events.items()}
+
+    def summary(self) -> str:
+        states = self.events.values()
+        lines = [
+            f"Scheduler: {sum(s.status == FILLED for s in states)}/{len(self.events)} quotas met, "
+            f"{sum(s.status == BROKEN for s in states)} events circuit-broken, {self.issued} attempts issued"
+        ]
+        for event, state in self.events.items():
+            if state.status != FILLED:
+                lines.append(f"  {event}: {state.accepted}/{state.quota} accepted in {state.attempts} attempts ({state.status})")
+        return "\n".join(lines)
+
+
+def load_quotas(path: str, events: List[str], default: int) -> Dict[str, int]:
+    """
+    Per-event quotas: `default` for every event, overridden by a JSON object of
+    `{"event hint": count}` at `path`.
+    """
+    quotas = {event: default for event in events}
+    if path:
+        with open(path, "r") as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(events)
+        if unknown:
+            raise ValueError(f"Unknown events in quota config: {sorted(unknown)}")
+        quotas.update({event: int(count) for event, count in overrides.items()})
+    return quotas
@@ -1,6 +1,7 @@
 import re
 import random
-from typing import List, Set
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
 
 def generate_banlist(event_description: str) -> List[str]:
     """
@@ -8,22 +9,122 @@ def generate_banlist(event_description: str) -> List[str]:
     Simple strategy: Split by space, filter stopwords (mocked for now), and return.
     In a real scenario, this would use NLTK or similar for lemmatization.
     """
+    # The event hints are a small fixed set, so the banlist of each is computed once
+    return list(_cached_banlist(event_description))
+
+@lru_cache(maxsize=1024)
+def _cached_banlist(event_description: str) -> Tuple[str, ...]:
     stopwords = {"a", "an", "the", "in", "on", "at", "to", "for", "of", "with", "by", "is", "was", "are", "were"}
     words = re.findall(r'\b\w+\b', event_description.lower())
     banlist = [w for w in words if w not in stopwords and len(w) > 2]
-    return list(set(banlist))
+    # Sorted, so the banlist (and every prompt and cache key built from it) does not depend on
+    # the hash seed of the process
+    return tuple(sorted(set(banlist)))
 
 def check_banlist(text: str, banlist: List[str]) -> bool:
     """
-    Checks if any word from the banlist is present in the text.
+    Checks if any word from the banlist (or a plural/past-tense/-ing form of it) is present in the text.
     Returns True if valid (no banned words), False otherwise.
     """
-    text_lower = text.lower()
-    for word in banlist:
-        # Simple word boundary check
-        if re.search(r'\b' + re.escape(word) + r'\b', text_lower):
-            return False
-    return True
+    return BanlistMatcher.for_words(tuple(banlist)).is_clean(text)
+
+_VOWELS = "aeiou"
+
+def _doubles_final_consonant(word: str) -> bool:
+    """
+    True if the final consonant is doubled before -ed/-ing: the word ends in consonant-vowel-
+    consonant ("stop", "admit"), the vowel is not part of a vowel pair ("rain"), the first
+    consonant is not itself doubled ("dropped"), and the last one is not w, x or y.
+    """
+    if len(word) < 3:
+        return False
+    first, vowel, last = word[-3:]
+    if last in _VOWELS + "wxy" or vowel not in _VOWELS or first in _VOWELS:
+        return False
+    return len(word) == 3 or word[-4] != first
+
+def inflections(word: str) -> Set[str]:
+    """
+    Plural/third-person, past-tense and -ing forms of `word`, plus the word itself, following the
+    regular English spelling rules. Only the form each rule actually produces is added: suffixing
+    blindly turns banned words into unrelated ones ("car" -> "cares", "caring"; "test" -> "testes"),
+    which would reject or suppress valid turns.
+    """
+    forms = {word}
+    consonant_y = len(word) > 2 and word.endswith("y") and word[-2] not in _VOWELS
+
+    if word.endswith(("s", "x", "z", "ch", "sh")):
+        forms.add(word + "es")
+    elif consonant_y:
+        forms.add(word[:-1] + "ies")
+    else:
+        forms.add(word + "s")
+
+    if word.endswith("ee"):
+        # agree -> agreed, agreeing
+        forms |= {word + "d", word + "ing"}
+    elif word.endswith("e"):
+        # bake -> baked, baking
+        forms |= {word + "d", word[:-1] + "ing"}
+    elif consonant_y:
+        # marry -> married, marrying
+        forms |= {word[:-1] + "ied", word + "ing"}
+    elif _doubles_final_consonant(word):
+        # stop -> stopped, stopping. One-syllable words always double the final consonant, so
+        # the plain suffixes are left out ("car" -> "cared" is another word); longer words
+        # double only when the last syllable is stressed (admit -> admitted, visit -> visited)
+        forms |= {word + word[-1] + "ed", word + word[-1] + "ing"}
+        if len(re.findall(r"[aeiouy]+", word)) > 1:
+            forms |= {word + "ed", word + "ing"}
+    else:
+        forms |= {word + "ed", word + "ing"}
+    return forms
+
+class BanlistMatcher:
+    """
+    A banlist compiled once into a single case-insensitive alternation regex over all banned
+    words and their inflections, so checking a turn is one scan of the text.
+
+    Use `BanlistMatcher.for_event` / `for_words` to get a memoized instance.
+    """
+    def __init__(self, banlist: Iterable[str]):
+        self.banlist = tuple(banlist)
+        forms = set()
+        for word in self.banlist:
+            forms |= inflections(word.lower())
+        # Longest forms first so e.g. "lotteries" is preferred over "lottery"
+        alternation = "|".join(re.escape(f) for f in sorted(forms, key=lambda f: (-len(f), f)))
+        self.pattern = re.compile(r"\b(?:" + alternation + r")\b", re.IGNORECASE) if forms else None
+
+    @classmethod
+    def for_event(cls, event_description: str) -> "BanlistMatcher":
+        return cls.for_words(_cached_banlist(event_description))
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def for_words(banlist: Tuple[str, ...]) -> "BanlistMatcher":
+        return BanlistMatcher(banlist)
+
+    def find(self, text: str) -> Optional[str]:
+        """
+        Returns the first banned form found in `text`, or None.
+        """
+        if self.pattern is None:
+            return None
+        match = self.pattern.search(text)
+        return match.group(0) if match else None
+
+    def is_clean(self, text: str) -> bool:
+        return self.find(text) is None
+
+    def check_many(self, texts: Sequence[str]) -> List[bool]:
+        """
+        `is_clean` for every text, e.g. all turns of a dialogue at once.
+        """
+        if self.pattern is None:
+            return [True] * len(texts)
+        search = self.pattern.search
+        return [search(text) is None for text in texts]
 
 def calculate_set_atom_metrics(gold: dict, predicted: dict) -> dict:
     """
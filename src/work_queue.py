@@ -0,0 +1,238 @@
+import multiprocessing
+import queue
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Put once per worker after the last unit; a worker exits when it pulls it.
+STOP = None
+
+# Tag of the `(OUTCOME, unit, accepted)` messages workers put on the result queue after every
+# generation unit; everything else on that queue is a final stats dict.
+OUTCOME = "outcome"
+
+
+class WorkCoordinator:
+    """
+    Hands out work units to workers through one shared queue, so each worker pulls
+    the next unit as soon as it is free instead of owning a fixed share up front.
+
+    Workers report the outcome of every generation unit and, when they finish, per-worker
+    stats through `result_queue`.
+    """
+    def __init__(self):
+        self.work_queue = multiprocessing.Queue()
+        self.result_queue = multiprocessing.Queue()
+
+    def submit(self, units: Iterable[Any], num_workers: int):
+        for unit in units:
+            self.work_queue.put(unit)
+        for _ in range(num_workers):
+            self.work_queue.put(STOP)
+
+    def collect_stats(self, processes: List[multiprocessing.Process],
+                      on_outcome: Optional[Callable[[Any, bool], None]] = None,
+                      stats: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Gathers the stats dict of every worker. Drains the queue before workers are joined,
+        and stops waiting once all processes have exited (e.g. a worker that crashed).
+        Unit outcomes still arriving are passed to `on_outcome`.
+        """
+        stats = list(stats or [])
+        while len(stats) < len(processes):
+            try:
+                message = self.result_queue.get(timeout=1.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in processes):
+                    break
+                continue
+            if isinstance(message, dict):
+                stats.append(message)
+            elif on_outcome is not None:
+                on_outcome(message[1], message[2])
+        return sorted(stats, key=lambda s: s["worker_id"])
+
+    def run_scheduled(self, scheduler, processes: List[multiprocessing.Process], window: int) -> List[Dict[str, Any]]:
+        """
+        Feeds units picked by `scheduler` (see `EventScheduler`) instead of a list fixed up
+        front, keeping at most `window` of them handed out without an outcome, and reports every
+        outcome back to it. Once the scheduler is finished the workers are stopped; units still
+        in flight complete and are recorded while the stats are collected.
+        """
+        outstanding = 0
+        stats = []
+        while not scheduler.finished and any(p.is_alive() for p in processes):
+            while outstanding < window:
+                unit = scheduler.next_event()
+                if unit is None:
+                    break
+                self.work_queue.put(unit)
+                outstanding += 1
+            if scheduler.finished:
+                break
+            try:
+                message = self.result_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if isinstance(message, dict):
+                # A worker only reports stats before STOP if it failed to start
+                stats.append(message)
+                continue
+            scheduler.record(message[1], message[2])
+            outstanding -= 1
+
+        for _ in processes:
+            self.work_queue.put(STOP)
+        return self.collect_stats(processes, scheduler.record, stats)
+
+
+def iter_work_units(work_queue) -> Iterator[Any]:
+    """
+    Yields units from the shared queue until the stop sentinel is reached.
+    """
+    while True:
+        unit = work_queue.get()
+        if unit is STOP:
+            return
+        yield unit
+
+
+class UnitSource:
+    """
+    Units from the shared queue until the stop sentinel, for consumers that keep several units
+    in flight (batched cohorts, async tasks).
+
+    `poll(block=False)` returns None right away when no unit is queued. Consumers must not block
+    on the queue while they still hold units: a scheduling coordinator holds back new units until
+    the outcomes of those come back, so both sides would wait on each other forever.
+    """
+    def __init__(self, work_queue):
+        self.work_queue = work_queue
+        self.exhausted = False
+
+    def poll(self, block: bool = True) -> Optional[Any]:
+        """
+        The next unit, or None once the stop sentinel was reached or, without `block`, when no
+        unit is queued right now.
+        """
+        if self.exhausted:
+            return None
+        try:
+            unit = self.work_queue.get(block=block)
+        except queue.Empty:
+            return None
+        if unit is STOP:
+            self.exhausted = True
+            return None
+        return unit
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter_work_units(self.work_queue)
+
+
+class _IterableSource:
+    """
+    `UnitSource` interface over a plain iterable; `poll` always waits for the next item.
+    """
+    def __init__(self, units: Iterable[Any]):
+        self._units = iter(units)
+        self.exhausted = False
+
+    def poll(self, block: bool = True) -> Optional[Any]:
+        unit = next(self._units, None)
+        if unit is None:
+            self.exhausted = True
+        return unit
+
+
+def as_unit_source(units: Iterable[Any]):
+    """
+    `units` itself if it is a `UnitSource`, otherwise a blocking source over the iterable.
+    """
+    return units if isinstance(units, UnitSource) else _IterableSource(units)
+
+
+def chunk_ranges(total: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Splits `range(total)` into consecutive `(start, stop)` ranges of at most `chunk_size` items.
+    """
+    return [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+
+
+class WorkerStats:
+    """
+    Per-worker counters reported back to the coordinator at the end of a run.
+    """
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.units = 0
+        self.accepted = 0
+        # Dialogue/banlist counters of a generate run, see `DialogueStats`
+        self.dialogue: Dict[str, int] = {}
+        # Near-duplicate filter counters of a generate run, see `NearDuplicateFilter.stats`
+        self.dedup: Dict[str, int] = {}
+        # Pre-judge rule counters of a generate run, see `PreJudge.stats`
+        self.prejudge: Dict[str, int] = {}
+        self.start_time = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.start_time
+        return {
+            "worker_id": self.worker_id,
+            "units": self.units,
+            "accepted": self.accepted,
+            "elapsed": elapsed,
+            "units_per_sec": self.units / elapsed if elapsed > 0 else 0.0,
+            "dialogue": self.dialogue,
+            "dedup": self.dedup,
+            "prejudge": self.prejudge,
+        }
+
+
+def format_worker_stats(stats: List[Dict[str, Any]]) -> str:
+    lines = []
+    for s in stats:
+        lines.append(
+            f"[Worker {s['worker_id']}] units={s['units']} accepted={s['accepted']} "
+            f"elapsed={s['elapsed']:.1f}s throughput={s['units_per_sec']:.2f} units/s"
+        )
+    total_units = sum(s["units"] for s in stats)
+    total_accepted = sum(s["accepted"] for s in stats)
+    lines.append(f"Total: units={total_units} accepted={total_accepted}")
+
+    dialogue: Dict[str, int] = {}
+    for s in stats:
+        for key, value in s.get("dialogue", {}).items():
+            # Counters add up across workers; rates are recomputed from the totals below
+            if isinstance(value, int):
+                dialogue[key] = dialogue.get(key, 0) + value
+    if dialogue:
+        lines.append("Dialogue: " + " ".join(f"{key}={value}" for key, value in dialogue.items()))
+        if dialogue.get("candidates") and dialogue.get("turns"):
+            lines.append(
+                f"Turn acceptance: {dialogue['turns'] / dialogue['candidates']:.2f} per candidate, "
+                f"{dialogue['first_call_accepts'] / dialogue['turns']:.2f} on the first call"
+            )
+
+    prejudge: Dict[str, int] = {}
+    for s in stats:
+        for key, value in s.get("prejudge", {}).items():
+            prejudge[key] = prejudge.get(key, 0) + value
+    if prejudge:
+        rules = " ".join(f"{key[len('rejected_'):]}={value}" for key, value in prejudge.items() if key.startswith("rejected_"))
+        lines.append(
+            f"Pre-judge: {prejudge['checked_stories']} stories and {prejudge['checked_dialogues']} dialogues checked, "
+            f"rejected by rule: {rules}; {prejudge['judge_calls_avoided']} judge calls avoided"
+        )
+
+    dedup: Dict[str, int] = {}
+    for s in stats:
+        for key, value in s.get("dedup", {}).items():
+            dedup[key] = dedup.get(key, 0) + value
+    if dedup:
+        lines.append(
+            f"Dedup: {dedup['duplicate_stories']}/{dedup['checked_stories']} stories and "
+            f"{dedup['duplicate_dialogues']}/{dedup['checked_dialogues']} dialogues dropped as near-duplicates, "
+            f"at least {dedup['calls_saved']} LLM calls saved, "
+            f"{dedup.get('late_duplicates', 0)} accepted entries dropped as concurrent near-duplicates"
+        )
+    return "\n".join(lines)
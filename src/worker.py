@@ -1,133 +1,251 @@
 import os
 import random
-import json
-from data_models import DatasetEntry
-from llm import LLMWrapper
+import asyncio
+from llm import LLMWrapper, AsyncLLMWrapper
+from http_backend import OpenAIHTTPLLM
 from generation_pipeline import DataGenerationPipeline
 from recovery_pipeline import RecoveryPipeline
+from batched_generation import BatchedGenerationEngine
+from response_cache import ResponseCache
+from async_pipeline import AsyncDataGenerationPipeline, AsyncRecoveryPipeline, bounded_as_completed
+from work_queue import WorkerStats, UnitSource, iter_work_units, OUTCOME
+from record_index import load_or_build_index, warn_skipped
+from jsonl_io import JsonlWriter, PrefetchIterator, iter_raw_record_range, decode_entry
+from checkpoint import ProgressManifest, manifest_path_for
+from generation_profiles import ProfileRegistry
+from metrics import MetricsWriter
+from dedup import NearDuplicateFilter, dedup_path_for
+from prejudge import PreJudge
 
-def worker_process(worker_id: int, gpu_id: int, iterations: int, model_name: str, mock: bool, mode: str, input_file: str = None, k: int = 3):
+def worker_process(worker_id: int, gpu_id: int, work_queue, result_queue, model_name: str, mock: bool, mode: str, input_file: str = None, k: int = 3, batch_size: int = 1, concurrency: int = 0,
+                   cache_path: str = None, cache_max_mb: int = 1024, cache_sampled: bool = False, resume: bool = False,
+                   constrain_banlist: bool = True, turn_candidates: int = 1, profiles_config: str = None,
+                   prometheus_dir: str = None, api_base: str = None, api_key: str = None, http_concurrency: int = 8,
+                   request_timeout: float = 120.0, max_retries: int = 3, trusted_input: bool = False,
+                   dedup_threshold: float = 0.0, dedup_num_perm: int = 128, dedup_dir: str = None, use_prejudge: bool = True):
     """
     Function to be run in a separate process.
+
+    Work units are pulled from the shared `work_queue` until the stop sentinel: event hints in
+    generate and generate_and_recover mode, `(start, stop)` entry ranges of `input_file` in recover mode. The outcome
+    of every event hint and, at the end, per-worker stats are put on `result_queue`.
     """
     print(f"[Worker {worker_id}] Starting on GPU {gpu_id} (Mock={mock}, Mode={mode})...")
+    stats = WorkerStats(worker_id)
     
     # Initialize Model
-    if not mock:
+    if not mock and not api_base:
         os.environ["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
         device = "cuda:0"
     else:
         device = "cpu"
 
     try:
-        llm = LLMWrapper(model_name, device=device, mock=mock)
-        if mode == "generate":
-            pipeline = DataGenerationPipeline(llm)
+        cache = ResponseCache(cache_path, max_bytes=cache_max_mb * 1024 * 1024) if cache_path else None
+        profiles = ProfileRegistry.from_file(profiles_config) if profiles_config else None
+
+        if api_base:
+            # Remote OpenAI-compatible server: nothing is loaded in this process
+            llm = OpenAIHTTPLLM(model_name, api_base, api_key=api_key, concurrency=http_concurrency, timeout=request_timeout,
+                                max_retries=max_retries, cache=cache, cache_sampled=cache_sampled, profiles=profiles)
+        elif concurrency > 0:
+            # Async engine: many iteration coroutines share one continuously batched engine
+            llm = AsyncLLMWrapper(model_name, device=device, mock=mock, cache=cache, cache_sampled=cache_sampled, profiles=profiles)
+        else:
+            llm = LLMWrapper(model_name, device=device, mock=mock, cache=cache, cache_sampled=cache_sampled, profiles=profiles)
+
+        dedup = None
+        prejudge = None
+        if mode in ("generate", "generate_and_recover"):
+            if dedup_threshold > 0:
+                # One index per worker, seeded with every worker's index saved by earlier runs
+                dedup = NearDuplicateFilter(dedup_threshold, dedup_num_perm, followup_calls=2 if mode == "generate_and_recover" else 0)
+                if dedup_dir:
+                    merged = dedup.merge_from(dedup_dir)
+                    print(f"[Worker {worker_id}] Dedup index: {len(dedup.stories)} stories, {len(dedup.dialogues)} dialogues from {merged} saved indexes")
+            if use_prejudge:
+                prejudge = PreJudge(llm.metrics)
+            pipeline_cls = AsyncDataGenerationPipeline if concurrency > 0 else DataGenerationPipeline
+            pipeline = pipeline_cls(llm, constrain_banlist=constrain_banlist, turn_candidates=turn_candidates, dedup=dedup, prejudge=prejudge)
+            # Accepted entries go straight to recovery on the same model
+            recovery = None
+            if mode == "generate_and_recover":
+                recovery = AsyncRecoveryPipeline(llm, k=k) if concurrency > 0 else RecoveryPipeline(llm, k=k)
         elif mode == "recover":
-            pipeline = RecoveryPipeline(llm, k=k)
+            pipeline = AsyncRecoveryPipeline(llm, k=k) if concurrency > 0 else RecoveryPipeline(llm, k=k)
         else:
             raise ValueError(f"Unknown mode: {mode}")
     except Exception as e:
         print(f"[Worker {worker_id}] Failed to initialize model: {e}")
+        result_queue.put(stats.to_dict())
         return
 
-    output_file = f"output_gpu_{gpu_id}.jsonl"
+    output_file = f"output_gpu_{worker_id}.jsonl"
+    # Progress counters survive a crash; on resume they continue from the previous run
+    manifest = ProgressManifest(manifest_path_for(output_file), worker_id, mode, resume=resume)
+    # Stage-level LLM metrics, snapshotted periodically and at the end of the run
+    prometheus_path = os.path.join(prometheus_dir, f"datagen_worker_{worker_id}.prom") if prometheus_dir else None
+    metrics_writer = MetricsWriter(llm.metrics, worker_id, f"metrics_gpu_{worker_id}.jsonl", prometheus_path)
     
-    if mode == "generate":
-        # List of simple event hints for random selection
-        events = [
-            "missed the train", "found a lost wallet", "forgot wedding anniversary", "won the lottery",
-            "broke a vase", "adopted a stray cat", "cooked a bad meal", "got stuck in an elevator",
-            "lost my keys", "met an old friend", "spilled coffee on my shirt", "got locked out of the house",
-            "phone battery died", "missed an important call", "found a $20 bill on the street", "burned the toast",
-            "broke my phone screen", "got caught in the rain without an umbrella", "overslept for work",
-            "left my wallet at home", "missed a flight", "finally passed the driving test",
-            "won a small prize in a raffle", "forgot to submit an assignment", "parked in the wrong spot and got a ticket",
-            "dropped my ice cream", "received an unexpected gift", "accidentally sent a message to the wrong person",
-            "lost my luggage at the airport", "baked a cake that collapsed", "met a celebrity by accident",
-            "slipped on the sidewalk but didn’t get hurt", "left the house with mismatched shoes",
-            "ran into my ex at the supermarket", "got a surprise promotion", "sprained my ankle while jogging",
-            "won a free coffee", "forgot where I parked the car"
-        ]
-
+    if mode in ("generate", "generate_and_recover"):
         success_count = 0
-        with open(output_file, "a") as f:
-            for i in range(iterations):
-                event = random.choice(events)
-                print(f"[Worker {worker_id}] Iteration {i+1}/{iterations}: {event}")
-                
-                result = pipeline.run_single_iteration(event)
-                
+        recovered_count = 0
+        with JsonlWriter(output_file, "a") as writer:
+            def handle_result(event, result):
+                nonlocal success_count, recovered_count
+                stats.units += 1
                 if result:
-                    f.write(result.model_dump_json() + "\n")
-                    f.flush()
+                    writer.write(result)
                     success_count += 1
+                    stats.accepted += 1
+                    if result.recovery is not None and result.recovery.success:
+                        recovered_count += 1
                 else:
                     print(f"[Worker {worker_id}] Failed to generate valid entry for '{event}'")
+                manifest.record(accepted=bool(result))
+                # Lets a scheduling coordinator update the event's acceptance rate
+                result_queue.put((OUTCOME, event, bool(result)))
+                metrics_writer.maybe_write()
+
+            hints = UnitSource(work_queue)
+
+            if concurrency > 0:
+                # Up to `concurrency` iterations await the async engine at once
+                async def attempt(event):
+                    entry = await pipeline.run_single_iteration(event)
+                    if entry is not None and recovery is not None:
+                        entry.recovery = await recovery.run_recovery(entry)
+                    return event, entry
+
+                async def run_all():
+                    async for event, result in bounded_as_completed(hints, attempt, concurrency):
+                        handle_result(event, result)
+
+                asyncio.run(run_all())
+            elif batch_size > 1:
+                # Wave-scheduled execution: keep `batch_size` iterations in flight and
+                # submit their LLM calls together.
+                engine = BatchedGenerationEngine(pipeline, batch_size=batch_size, recovery=recovery)
+                for event, result in engine.run(hints):
+                    handle_result(event, result)
+            else:
+                for i, event in enumerate(hints):
+                    print(f"[Worker {worker_id}] Iteration {i+1}: {event}")
+                    entry = pipeline.run_single_iteration(event)
+                    if entry is not None and recovery is not None:
+                        entry.recovery = recovery.run_recovery(entry)
+                    handle_result(event, entry)
 
         print(f"[Worker {worker_id}] Finished generation. Generated {success_count} entries.")
+        if recovery is not None:
+            print(f"[Worker {worker_id}] Recovered the hidden event of {recovered_count}/{success_count} entries.")
+        stats.dialogue = dict(pipeline.dialogue_stats.to_dict(), **llm.constraint_stats)
+        print(f"[Worker {worker_id}] Dialogue stats: {stats.dialogue}")
+        if prejudge is not None:
+            stats.prejudge = prejudge.stats()
+            print(f"[Worker {worker_id}] Pre-judge stats: {stats.prejudge}")
+        if dedup is not None:
+            stats.dedup = dedup.stats()
+            print(f"[Worker {worker_id}] Dedup stats: {stats.dedup}")
+            if dedup_dir:
+                dedup.save(dedup_path_for(dedup_dir, worker_id))
 
     elif mode == "recover":
         if not input_file or not os.path.exists(input_file):
             print(f"[Worker {worker_id}] Input file not found: {input_file}")
+            metrics_writer.write()
+            result_queue.put(stats.to_dict())
             return
 
         print(f"[Worker {worker_id}] Reading from {input_file}...")
-        
-        # Read input file
-        # We assume the input file is a JSONL file where each line is a JSON object (DatasetEntry)
-        # BUT the previous code wrote "concatenated JSON objects" with indent=2, which is NOT valid JSONL.
-        # It wrote: f.write(result.model_dump_json(indent=2) + "\n")
-        # This creates a file with multiple JSON objects, but not one per line.
-        # We need a robust reader.
-        
-        entries = []
-        with open(input_file, "r") as f:
-            content = f.read()
-            decoder = json.JSONDecoder()
-            pos = 0
-            while pos < len(content):
+
+        # The coordinator hands out disjoint ranges of the record index, so each entry is
+        # recovered by exactly one worker and only the assigned records are ever parsed.
+        offsets = load_or_build_index(input_file)
+
+        def range_entries(start, stop):
+            with open(input_file, "rb") as f:
+                # Validated straight from the raw bytes; trusted input skips validation
+                for index, raw in enumerate(iter_raw_record_range(f, offsets[start], stop - start), start):
+                    try:
+                        entry = decode_entry(raw, trusted_input)
+                    except Exception:
+                        # The index only splits records, so a corrupt one fails here
+                        warn_skipped(offsets[index], "invalid record")
+                        continue
+                    yield entry
+
+        def assigned_entries():
+            # A range is only taken from the queue once the previous one is used up, so idle
+            # workers can still pull the ranges this one would otherwise hoard
+            for start, stop in iter_work_units(work_queue):
+                if start >= stop:
+                    continue
+                # Parse and validate the taken range ahead of the GPU on a background thread
+                entries = PrefetchIterator(range_entries(start, stop), maxsize=max(64, 2 * concurrency))
                 try:
-                    while pos < len(content) and content[pos].isspace():
-                        pos += 1
-                    if pos >= len(content): break
-                    obj, next_pos = decoder.raw_decode(content, pos)
-                    entries.append(DatasetEntry(**obj))
-                    pos = next_pos
-                except json.JSONDecodeError:
-                    break
-        
-        # Distribute work if multiple workers (simple sharding)
-        # For simplicity, we'll just process a slice based on worker_id
-        # Assuming main.py handles splitting or we just process everything if 1 worker.
-        # Let's assume the input file is ALREADY split or we are just running 1 worker for recovery for now,
-        # OR we slice it here.
-        
-        my_entries = entries[worker_id::1] # Simple round-robin if multiple workers on same file? 
-        # Actually, main.py passes 'iterations' which is usually total/num_gpus.
-        # But for recovery, we want to process ALL entries in the file.
-        # Let's just process the entries assigned to this worker.
-        # Better: main.py should probably split the work. 
-        # But to keep it simple, I'll just process `entries[worker_id::num_workers]` logic if I knew num_workers.
-        # I don't have num_workers passed explicitly, but I have worker_id.
-        # I'll assume 1 worker for recovery for now or just process all if I can't split.
-        # Wait, I can pass num_workers or just let main handle it.
-        # Let's just process ALL entries for now, assuming the user runs recovery with 1 GPU or splits files.
-        # Actually, the user requirement said "read the whole generated data from local file".
-        
+                    yield from entries
+                finally:
+                    entries.close()
+
+        my_entries = assigned_entries()
+
         success_count = 0
-        with open(output_file, "w") as f: # Overwrite output for recovery results
-            for i, entry in enumerate(my_entries):
-                print(f"[Worker {worker_id}] Recovering entry {i+1}/{len(my_entries)}...")
-                
-                recovery_result = pipeline.run_recovery(entry)
-                
+        # main clears stale outputs unless resuming, so always append
+        with JsonlWriter(output_file, "a") as writer:
+            def handle_recovery(entry, recovery_result):
+                nonlocal success_count
+                if recovery_result is None:
+                    # Recovery raised; the entry stays pending for a resumed run
+                    return
                 # Update entry with recovery result
                 entry.recovery = recovery_result
-                
-                f.write(entry.model_dump_json() + "\n")
-                f.flush()
+
+                writer.write(entry)
                 success_count += 1
-        
+                stats.units += 1
+                if recovery_result.success:
+                    stats.accepted += 1
+                manifest.record(accepted=recovery_result.success)
+                metrics_writer.maybe_write()
+
+            def recovery_failed(entry, e):
+                print(f"[Worker {worker_id}] Skipping entry {entry.id or entry.stable_id()}, recovery failed: {e}")
+
+            if concurrency > 0:
+                async def recover(entry):
+                    try:
+                        return entry, await pipeline.run_recovery(entry)
+                    except Exception as e:
+                        recovery_failed(entry, e)
+                        return entry, None
+
+                async def run_all():
+                    async for entry, recovery_result in bounded_as_completed(my_entries, recover, concurrency):
+                        handle_recovery(entry, recovery_result)
+
+                asyncio.run(run_all())
+            else:
+                for i, entry in enumerate(my_entries):
+                    print(f"[Worker {worker_id}] Recovering entry {i+1}...")
+                    try:
+                        recovery_result = pipeline.run_recovery(entry)
+                    except Exception as e:
+                        recovery_failed(entry, e)
+                        continue
+                    handle_recovery(entry, recovery_result)
+
+        my_entries.close()
         print(f"[Worker {worker_id}] Finished recovery. Processed {success_count} entries.")
 
+    if isinstance(llm, OpenAIHTTPLLM):
+        # Shuts down the request threads and closes the keep-alive connections
+        llm.close()
+
+    if cache is not None:
+        print(f"[Worker {worker_id}] Response cache: {cache.stats()}")
+        cache.close()
+
+    metrics_writer.write()
+
+    result_queue.put(stats.to_dict())
@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import asyncio
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper, AsyncLLMWrapper
+from data_models import DatasetEntry
+from async_pipeline import AsyncDataGenerationPipeline, AsyncRecoveryPipeline, bounded_as_completed
+
+
+class CountingAsyncMockLLM(AsyncLLMWrapper):
+    """
+    Async mock whose judges accept everything and which tracks how many requests overlap.
+    """
+    def __init__(self):
+        super().__init__("mock", device="cpu", mock=True, mock_latency=0.01)
+        self.active = 0
+        self.max_active = 0
+
+    async def generate_candidates_request(self, request):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            return await super().generate_candidates_request(request)
+        finally:
+            self.active -= 1
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "judge" in system_prompt.lower():
+            return json.dumps({"valid": True, "match": True, "reason": "mock"})
+        if "guesses" in user_prompt.lower():
+            return json.dumps({"guesses": ["event 1", "event 2", "event 3"]})
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class TestAsyncPipeline(unittest.TestCase):
+    def test_iterations_interleave_up_to_concurrency(self):
+        llm = CountingAsyncMockLLM()
+        pipeline = AsyncDataGenerationPipeline(llm)
+
+        async def attempt(event):
+            return event, await pipeline.run_single_iteration(event)
+
+        async def run_all():
+            return [r async for r in bounded_as_completed(["won the lottery"] * 12, attempt, 5)]
+
+        results = asyncio.run(run_all())
+
+        self.assertEqual(len(results), 12)
+        self.assertTrue(all(entry is not None for _, entry in results))
+        self.assertEqual(llm.max_active, 5)
+
+    def test_async_recovery(self):
+        llm = CountingAsyncMockLLM()
+        pipeline = AsyncRecoveryPipeline(llm, k=3)
+        entry = DatasetEntry(**{
+            "story": {"text": "Alice won.", "hidden_event": "won the lottery", "protagonist_name": "Alice"},
+            "gold_semantics": {"hidden_event": "won the lottery", "protagonist_name": "Alice"},
+            "banlist": ["won", "lottery"],
+            "dialogue": {"turns": ["[Speaker A]: Did you hear about Alice?"]},
+        })
+
+        recovery = asyncio.run(pipeline.run_recovery(entry))
+
+        self.assertEqual(recovery.guesses, ["event 1", "event 2", "event 3"])
+        self.assertTrue(recovery.success)
+
+    def test_wrapper_shares_base_state(self):
+        # Everything LLMWrapper sets up (metrics, constraint state, ...) comes from its __init__
+        base = set(vars(LLMWrapper("mock", mock=True)))
+        self.assertLessEqual(base, set(vars(AsyncLLMWrapper("mock", mock=True))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils import BanlistMatcher, check_banlist, generate_banlist, inflections
+
+
+class TestBanlistMatcher(unittest.TestCase):
+    def test_matches_inflections_but_not_other_words(self):
+        matcher = BanlistMatcher(["lottery", "adopt", "stop", "bake"])
+        for text in ["Two LOTTERIES!", "She adopted him.", "It stopped.", "baking bread", "Lottery"]:
+            self.assertFalse(matcher.is_clean(text), text)
+        for text in ["a lot of tea", "adoption", "nothing here"]:
+            self.assertTrue(matcher.is_clean(text), text)
+        self.assertEqual(matcher.find("they were stopping by"), "stopping")
+
+    def test_check_many_and_memoization(self):
+        matcher = BanlistMatcher.for_event("won the lottery")
+        self.assertIs(matcher, BanlistMatcher.for_event("won the lottery"))
+        self.assertEqual(matcher.check_many(["I won!", "what a wonder", "lotteries"]), [False, True, False])
+        self.assertEqual(BanlistMatcher([]).check_many(["anything"]), [True])
+
+    def test_check_banlist_delegates(self):
+        banlist = generate_banlist("broke a vase")
+        self.assertEqual(sorted(banlist), ["broke", "vase"])
+        self.assertFalse(check_banlist("Two vases were broken, one broke.", banlist))
+        self.assertTrue(check_banlist("The jar is fine.", banlist))
+
+    def test_inflections_do_not_invent_unrelated_words(self):
+        self.assertEqual(inflections("car"), {"car", "cars", "carred", "carring"})
+        self.assertEqual(inflections("test"), {"test", "tests", "tested", "testing"})
+        self.assertEqual(inflections("lottery"), {"lottery", "lotteries", "lotteried", "lotterying"})
+        self.assertEqual(inflections("train"), {"train", "trains", "trained", "training"})
+        self.assertEqual(inflections("bill"), {"bill", "bills", "billed", "billing"})
+        # No doubling after a doubled consonant or a vowel pair
+        self.assertNotIn("droppedded", inflections("dropped"))
+        self.assertNotIn("rainned", inflections("rain"))
+
+        matcher = BanlistMatcher.for_event("forgot where I parked the car")
+        self.assertEqual(matcher.check_many(["She was caring and cared a lot.", "Two cars", "the Car"]), [True, False, False])
+        matcher = BanlistMatcher.for_event("finally passed the driving test")
+        self.assertEqual(matcher.check_many(["the testes", "more tests"]), [True, False])
+
+    def test_banlist_order_is_stable(self):
+        self.assertEqual(generate_banlist("won the lottery"), ["lottery", "won"])
+
+
+if __name__ == '__main__':
+    unittest.main()
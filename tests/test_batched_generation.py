@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import unittest
+from unittest.mock import patch
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper, GenerationRequest
+from generation_pipeline import DataGenerationPipeline
+from recovery_pipeline import RecoveryPipeline
+from batched_generation import BatchedGenerationEngine
+from metrics import format_metrics_summary
+
+
+class RecordingMockLLM(LLMWrapper):
+    """
+    Mock backend whose judges accept everything and which records every engine call.
+    """
+    def __init__(self, reject_story_for=()):
+        super().__init__("mock", device="cpu", mock=True)
+        self.batch_sizes = []
+        self.batch_stages = []
+        self.reject_story_for = set(reject_story_for)
+
+    def generate_candidates(self, requests, return_exceptions=False):
+        self.batch_sizes.append(len(requests))
+        self.batch_stages.append({r.stage for r in requests})
+        return super().generate_candidates(requests, return_exceptions)
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "judge" in system_prompt.lower():
+            valid = not any(hint in user_prompt for hint in self.reject_story_for) or "Dialogue:" in user_prompt
+            return json.dumps({"valid": valid, "reason": "mock"})
+        if "protagonist" in system_prompt.lower():
+            return "Alice"
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class TestGenerateBatch(unittest.TestCase):
+    def test_mock_generate_batch_preserves_order(self):
+        llm = LLMWrapper("mock", mock=True)
+        requests = [
+            GenerationRequest("You are a creative storyteller.", "Hidden Event: won the lottery"),
+            GenerationRequest("", "anything"),
+        ]
+        outputs = llm.generate_batch(requests)
+        self.assertEqual(len(outputs), 2)
+        self.assertIn("won the lottery", outputs[0])
+        self.assertEqual(outputs[1], "Generic Mock Response")
+        self.assertEqual(llm.generate_batch([]), [])
+
+
+class TestBatchedGenerationEngine(unittest.TestCase):
+    def test_cohort_moves_through_stages_together(self):
+        llm = RecordingMockLLM()
+        engine = BatchedGenerationEngine(DataGenerationPipeline(llm), batch_size=4)
+
+        results = list(engine.run(["won the lottery"] * 4))
+
+        self.assertEqual(len(results), 4)
+        for hint, entry in results:
+            self.assertEqual(hint, "won the lottery")
+            self.assertIsNotNone(entry)
+            self.assertEqual(entry.gold_semantics.protagonist_name, "Alice")
+            self.assertTrue(2 <= len(entry.dialogue.turns) <= 4)
+        # story, judge_story and protagonist waves each carry the whole cohort
+        self.assertEqual(llm.batch_sizes[:3], [4, 4, 4])
+
+    def test_rejected_slots_are_refilled(self):
+        llm = RecordingMockLLM(reject_story_for=["broke a vase"])
+        engine = BatchedGenerationEngine(DataGenerationPipeline(llm), batch_size=2)
+
+        hints = ["broke a vase", "won the lottery", "won the lottery"]
+        results = list(engine.run(hints))
+
+        self.assertEqual(len(results), 3)
+        rejected = [hint for hint, entry in results if entry is None]
+        self.assertEqual(rejected, ["broke a vase"])
+        # After the rejection, the freed slot is refilled in the very next wave
+        self.assertEqual(llm.batch_sizes[2], 2)
+
+    def test_recovery_stages_share_engine_calls(self):
+        llm = RecordingMockLLM(reject_story_for=["broke a vase"])
+        engine = BatchedGenerationEngine(DataGenerationPipeline(llm), batch_size=2, recovery=RecoveryPipeline(llm, k=2))
+
+        # The early rejection puts the two slots two stages apart
+        hints = ["won the lottery", "broke a vase"] + ["won the lottery"] * 3
+        with patch("random.randint", return_value=2):
+            results = [entry for _, entry in engine.run(hints)]
+
+        accepted = [entry for entry in results if entry is not None]
+        self.assertEqual(len(accepted), 4)
+        for entry in accepted:
+            self.assertEqual(len(entry.recovery.guesses), 2)
+            self.assertTrue(entry.recovery.success)
+        # Recovery of finished entries rides along with generation of the refilled slots
+        self.assertTrue(any("recovery" in stages and "story" in stages for stages in llm.batch_stages))
+        snapshot = llm.metrics.snapshot(worker_id=0)
+        self.assertEqual(snapshot["stages"]["judge_recovery"]["requests"], 4)
+        # One generation and one recovery outcome per entry, as in two separate runs
+        self.assertEqual(snapshot["entries_accepted"], 4)
+        self.assertEqual(snapshot["entries_rejected"], 1)
+        self.assertEqual(snapshot["recoveries_succeeded"], 4)
+        self.assertIn("Recoveries: succeeded=4 failed=0", format_metrics_summary([snapshot]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+# Add src, benchmarks and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../benchmarks"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from latency_model import LatencyModel, LatencyModeledLLM
+from run_benchmarks import compare, DEFAULT_THRESHOLDS
+
+
+class TestLatencyModel(unittest.TestCase):
+    def test_batching_amortizes_decode(self):
+        model = LatencyModel()
+        single = model.call_seconds([100], [50])
+        batched = model.call_seconds([100] * 32, [50] * 32)
+        self.assertLess(batched, 32 * single / 4)
+        self.assertGreater(batched, single)
+
+    def test_rejection_rates_and_clock(self):
+        llm = LatencyModeledLLM(rejection_rates={"judge_story": 1.0})
+        story = llm.generate_request(llm.make_request("story", "You are a creative storyteller.", "won the lottery"))
+        verdict = llm.generate_request(llm.make_request("judge", "You are a judge.", story, stage="judge_story"))
+        self.assertIn('"valid": false', verdict)
+        self.assertEqual(llm.engine_calls, 2)
+        self.assertGreater(llm.clock.now, 0)
+        with self.assertRaises(ValueError):
+            LatencyModeledLLM(rejection_rates={"story": 0.5})
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {"thresholds": DEFAULT_THRESHOLDS, "scenarios": {"recover": {"entries_per_sec": 10.0, "peak_rss_mb": 100.0}}}
+        self.assertEqual(compare({"recover": {"entries_per_sec": 9.8, "peak_rss_mb": 110.0}}, baseline), [])
+        regressions = compare({"recover": {"entries_per_sec": 9.0, "peak_rss_mb": 130.0}}, baseline)
+        self.assertEqual(len(regressions), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from data_models import DatasetEntry
+from jsonl_io import JsonlWriter, iter_records
+from checkpoint import ProgressManifest, repair_jsonl_tail, completed_ids, pending_ranges, merge_in_input_order
+
+
+def make_entry(i):
+    return DatasetEntry(**{
+        "story": {"text": f"Story {i}", "hidden_event": "won the lottery", "protagonist_name": "Alice"},
+        "gold_semantics": {"hidden_event": "won the lottery", "protagonist_name": "Alice"},
+        "banlist": ["won", "lottery"],
+        "dialogue": {"turns": [f"[Speaker A]: turn {i}"]},
+    })
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "out.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_repair_truncates_partial_tail(self):
+        with JsonlWriter(self.path, "w") as writer:
+            for i in range(3):
+                writer.write(make_entry(i))
+        intact_size = os.path.getsize(self.path)
+        self.assertEqual(repair_jsonl_tail(self.path), 0)
+
+        with open(self.path, "a") as f:
+            f.write('{"story": {"text": "cut off')
+        self.assertGreater(repair_jsonl_tail(self.path), 0)
+        self.assertEqual(os.path.getsize(self.path), intact_size)
+        self.assertEqual(len(list(iter_records(self.path))), 3)
+
+    def test_manifest_resumes_counters(self):
+        manifest_path = os.path.join(self.tmpdir.name, "out.progress.json")
+        manifest = ProgressManifest(manifest_path, 0, "generate")
+        manifest.record(accepted=True)
+        manifest.record(accepted=False)
+
+        resumed = ProgressManifest(manifest_path, 0, "generate", resume=True)
+        self.assertEqual((resumed.attempted, resumed.accepted), (2, 1))
+        fresh = ProgressManifest(manifest_path, 0, "recover", resume=True)
+        self.assertEqual(fresh.attempted, 0)
+
+    def test_pending_ranges_skip_completed_entries(self):
+        input_path = os.path.join(self.tmpdir.name, "in.jsonl")
+        with JsonlWriter(input_path, "w") as writer:
+            for i in range(6):
+                writer.write(make_entry(i))
+        with JsonlWriter(self.path, "w") as writer:
+            for i in (0, 3, 4):
+                writer.write(make_entry(i))
+
+        done = completed_ids([self.path])
+        self.assertEqual(pending_ranges(input_path, done, chunk_size=2), [(1, 3), (5, 6)])
+
+    def test_merge_restores_input_order(self):
+        input_path = os.path.join(self.tmpdir.name, "in.jsonl")
+        with JsonlWriter(input_path, "w") as writer:
+            for i in range(6):
+                writer.write(make_entry(i))
+        # Two workers that pulled ranges in some order and finished entries out of order
+        shards = [os.path.join(self.tmpdir.name, f"output_gpu_{w}.jsonl") for w in range(2)]
+        for path, indices in zip(shards, [(3, 2, 0), (5, 1)]):
+            with JsonlWriter(path, "w") as writer:
+                for i in indices:
+                    writer.write(make_entry(i))
+
+        merged_path = os.path.join(self.tmpdir.name, "merged.jsonl")
+        self.assertEqual(merge_in_input_order(input_path, shards, merged_path), (5, 1))
+        texts = [r["story"]["text"] for r in iter_records(merged_path)]
+        self.assertEqual(texts, [f"Story {i}" for i in (0, 1, 2, 3, 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
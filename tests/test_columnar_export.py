@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from data_models import DatasetEntry, Story, GoldSemantics, Dialogue, Recovery
+from jsonl_io import JsonlWriter
+from columnar_export import ColumnarDataset, export_columnar, arrow_available
+
+
+def make_entry(i, event, recovery=None):
+    name = f"Bob {i % 3}"
+    return DatasetEntry(
+        story=Story(text=f"Story {i} about {name} – ünïcode", hidden_event=event, protagonist_name=name),
+        gold_semantics=GoldSemantics(hidden_event=event, protagonist_name=name),
+        banlist=event.split(),
+        dialogue=Dialogue(turns=[f"[Speaker A]: turn {t} of {i}" for t in range(2 + i % 3)]),
+        recovery=recovery,
+    )
+
+
+class TestColumnarExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.entries = [make_entry(i, ["won the lottery", "broke a vase"][i % 2]) for i in range(10)]
+        self.entries[3].recovery = Recovery(guesses=["a", "b"], success=True)
+        self.entries[4].recovery = Recovery(guesses=[], success=False)
+        self.entries[5].metrics = {"tokens": 7}
+        self.shards = []
+        for n in range(2):
+            path = os.path.join(self.tmpdir.name, f"output_gpu_{n}.jsonl")
+            with JsonlWriter(path, "w") as writer:
+                for entry in self.entries[n * 5:(n + 1) * 5]:
+                    writer.write(entry)
+            self.shards.append(path)
+
+    def check_roundtrip(self, out_path, fmt):
+        self.assertEqual(export_columnar(self.shards, out_path, fmt), (fmt, 10))
+        with ColumnarDataset(out_path) as dataset:
+            self.assertEqual(len(dataset), 10)
+            self.assertEqual([e.model_dump() for e in dataset.entries()], [e.model_dump() for e in self.entries])
+            self.assertEqual([e.id for e in dataset.entries(3, 6)], [e.id for e in self.entries[3:6]])
+            self.assertEqual(dataset.entries(9, 20)[0].story.text, self.entries[9].story.text)
+            self.assertEqual(dataset.records(6, 6), [])
+
+    def test_npy_roundtrip_by_row_range(self):
+        out_dir = os.path.join(self.tmpdir.name, "dataset")
+        self.check_roundtrip(out_dir, "npy")
+        with open(os.path.join(out_dir, "meta.json")) as f:
+            meta = json.load(f)
+        self.assertEqual(meta["dictionaries"]["event"], ["won the lottery", "broke a vase"])
+        self.assertEqual(len(meta["dictionaries"]["protagonist"]), 3)
+        # numpy's .npy v1.0 layout: magic, version, header length, header padded to 64 bytes
+        with open(os.path.join(out_dir, "event_codes.npy"), "rb") as f:
+            raw = f.read()
+        header_len = int.from_bytes(raw[8:10], "little")
+        self.assertEqual((10 + header_len) % 64, 0)
+        self.assertEqual(len(raw) - 10 - header_len, 4 * 10)
+
+    @unittest.skipUnless(arrow_available(), "pyarrow not installed")
+    def test_arrow_roundtrip_by_row_range(self):
+        self.check_roundtrip(os.path.join(self.tmpdir.name, "dataset.arrow"), "arrow")
+
+    def test_skips_inconsistent_entries(self):
+        self.entries[0].story.protagonist_name = "Someone else"
+        with JsonlWriter(self.shards[0], "w") as writer:
+            for entry in self.entries[:5]:
+                writer.write(entry)
+        out_dir = os.path.join(self.tmpdir.name, "dataset")
+        self.assertEqual(export_columnar(self.shards, out_dir, "npy"), ("npy", 9))
+        with ColumnarDataset(out_dir) as dataset:
+            self.assertEqual([e.id for e in dataset.entries()], [e.id for e in self.entries[1:]])
+
+
+if __name__ == '__main__':
+    unittest.main()
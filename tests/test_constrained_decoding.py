@@ -0,0 +1,156 @@
+import os
+import sys
+import importlib.util
+import json
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper
+from generation_pipeline import DataGenerationPipeline
+from batched_generation import BatchedGenerationEngine
+from judge import Judge
+from recovery_pipeline import RecoveryPipeline
+from llm import GenerationRequest
+from constrained_decoding import banned_word_variants, decoding_bad_words, strip_banned_words
+
+
+class LeakyMockLLM(LLMWrapper):
+    """
+    Mock backend whose dialogue turns always mention the hidden event and whose judges accept everything.
+    """
+    def __init__(self):
+        super().__init__("mock", device="cpu", mock=True)
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "conversation" in system_prompt.lower():
+            return "Alice finally Won the big lottery prize."
+        if "judge" in system_prompt.lower():
+            return json.dumps({"valid": True, "reason": "mock"})
+        if "protagonist" in system_prompt.lower():
+            return "Alice"
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class AlternatingMockLLM(LeakyMockLLM):
+    """
+    Dialogue candidates alternate between leaking the hidden event and being clean.
+    """
+    def __init__(self):
+        super().__init__()
+        self.dialogue_samples = 0
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "conversation" in system_prompt.lower():
+            self.dialogue_samples += 1
+            if self.dialogue_samples % 2 == 1:
+                return "Alice finally won the big lottery prize."
+            return "Alice seems really happy lately."
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class TestConstrainedDecoding(unittest.TestCase):
+    def test_variants_cover_casing(self):
+        self.assertEqual(banned_word_variants(["won"]), ["won", "Won", "WON"])
+
+        bad_words = decoding_bad_words(["won", "WON"])
+        self.assertEqual(len(bad_words), len(set(bad_words)))
+        self.assertIn("Won", bad_words)
+        self.assertIn("WONS", bad_words)
+        self.assertNotIn("caring", decoding_bad_words(["car"]))
+
+    def test_strip_banned_words(self):
+        text, removed = strip_banned_words("She WON the Lottery, and won two lotteries.", ["won", "lottery"])
+        self.assertEqual(removed, 4)
+        self.assertNotIn("won", text.lower())
+        self.assertIn("wonder", strip_banned_words("a wonder", ["won"])[0])
+
+    def test_constraint_avoids_dialogue_restarts(self):
+        constrained = DataGenerationPipeline(LeakyMockLLM())
+        self.assertIsNotNone(constrained.run_single_iteration("won the lottery"))
+        self.assertEqual(constrained.dialogue_stats.banlist_violations, 0)
+        self.assertGreater(constrained.llm.constraint_stats["blocked_tokens"], 0)
+
+        unconstrained = DataGenerationPipeline(LeakyMockLLM(), constrain_banlist=False)
+        self.assertIsNone(unconstrained.run_single_iteration("won the lottery"))
+        stats = unconstrained.dialogue_stats
+        self.assertEqual((stats.banlist_violations, stats.resamples, stats.failed_dialogues), (3, 2, 1))
+        self.assertGreater(stats.discarded_tokens, 0)
+
+
+@unittest.skipUnless(importlib.util.find_spec("vllm"), "vllm is not installed")
+class TestSamplingParams(unittest.TestCase):
+    """
+    Builds `SamplingParams` with the installed vllm rather than a stub, so options the engine
+    version does not accept fail here instead of on the first GPU request.
+    """
+    def test_banned_words_become_bad_words(self):
+        llm = LLMWrapper("mock", mock=True)
+        params = llm._sampling_params(GenerationRequest("system", "user", banned_words=["won", "lottery"]))
+
+        self.assertIn("Won", params.bad_words)
+        self.assertIn("lotteries", params.bad_words)
+        self.assertFalse(params.logits_processors)
+
+    def test_json_schema_becomes_structured_outputs(self):
+        llm = LLMWrapper("mock", mock=True)
+        request = Judge(llm)._story_request("won the lottery", "story")
+        params = llm._sampling_params(request)
+
+        self.assertEqual(params.structured_outputs.json, request.json_schema)
+        self.assertEqual(params.max_tokens, request.max_new_tokens)
+
+
+class TestTurnCandidates(unittest.TestCase):
+    def test_first_clean_candidate_is_kept(self):
+        pipeline = DataGenerationPipeline(AlternatingMockLLM(), constrain_banlist=False, turn_candidates=2)
+        entry = pipeline.run_single_iteration("won the lottery")
+
+        self.assertIsNotNone(entry)
+        self.assertTrue(all("happy" in turn for turn in entry.dialogue.turns))
+        stats = pipeline.dialogue_stats.to_dict()
+        num_turns = len(entry.dialogue.turns)
+        self.assertEqual(stats["sampling_calls"], num_turns)
+        self.assertEqual(stats["first_call_accepts"], num_turns)
+        self.assertEqual(stats["banlist_violations"], num_turns)
+        self.assertEqual(stats["candidate_acceptance_rate"], 0.5)
+
+    def test_only_the_violating_turn_is_resampled(self):
+        pipeline = DataGenerationPipeline(AlternatingMockLLM(), constrain_banlist=False, turn_candidates=1)
+        _, entry = next(BatchedGenerationEngine(pipeline, batch_size=1).run(["won the lottery"]))
+
+        self.assertIsNotNone(entry)
+        stats = pipeline.dialogue_stats
+        num_turns = len(entry.dialogue.turns)
+        # Every turn fails once and is then resampled on its own
+        self.assertEqual((stats.resamples, stats.sampling_calls), (num_turns, 2 * num_turns))
+        self.assertEqual(stats.first_call_accepts, 0)
+
+
+class TestGuidedJson(unittest.TestCase):
+    def test_structured_calls_carry_schema_and_cap(self):
+        llm = LLMWrapper("mock", mock=True)
+        judge = Judge(llm)
+        requests = [
+            judge._story_request("won the lottery", "story"),
+            judge._dialogue_request("won the lottery", "story", "dialogue"),
+            judge._recovery_request("won the lottery", ["a", "b"]),
+            RecoveryPipeline(llm, k=2)._guesses_request("dialogue"),
+        ]
+        for request in requests:
+            self.assertIsNotNone(request.json_schema)
+            self.assertLessEqual(request.max_new_tokens, 256)
+        self.assertEqual(requests[3].json_schema["properties"]["guesses"]["maxItems"], 2)
+
+    def test_mock_output_follows_schema(self):
+        llm = LLMWrapper("mock", mock=True)
+        self.assertTrue(Judge(llm).check_story("won the lottery", "story"))
+        self.assertTrue(Judge(llm).check_recovery("won the lottery", ["won the lottery"]))
+        guesses = RecoveryPipeline(llm, k=3)._generate_guesses("dialogue")
+        self.assertEqual(len(guesses), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
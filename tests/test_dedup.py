@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper
+from generation_pipeline import DataGenerationPipeline
+from batched_generation import BatchedGenerationEngine
+from prompt_templates import SYSTEM_PROMPTS
+from dedup import NearDuplicateFilter, MinHashLSH, STORY_CALLS_SAVED, DIALOGUE_CALLS_SAVED, dedup_path_for
+
+STORY = ("Alice had saved every coin she found for years, and on a grey Tuesday morning she walked "
+         "into the corner shop, bought a single ticket and tucked it into her coat pocket before "
+         "heading to work at the bakery on the hill, where she spent the whole day kneading dough.")
+
+
+class JudgingMockLLM(LLMWrapper):
+    """
+    Mock backend whose judges accept everything. Its dialogues are the same for every story.
+    """
+    def __init__(self):
+        super().__init__("mock", device="cpu", mock=True)
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "judge" in system_prompt.lower():
+            return json.dumps({"valid": True, "reason": "mock"})
+        if system_prompt == SYSTEM_PROMPTS["protagonist_extractor"]:
+            return "Alice"
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class TestDedup(unittest.TestCase):
+    def test_flags_near_duplicates_only(self):
+        index = MinHashLSH(threshold=0.7)
+        self.assertFalse(index.add(STORY))
+        self.assertTrue(index.add(STORY.replace("grey", "rainy")))
+        self.assertFalse(index.add("Bob broke his grandmother's vase while chasing the cat around the living room."))
+        self.assertEqual(len(index), 2)
+
+    def test_save_load_and_merge(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = NearDuplicateFilter(threshold=0.7)
+            first.is_duplicate_entry(STORY, ["[Speaker A]: good morning", "[Speaker B]: morning to you"])
+            first.save(dedup_path_for(tmpdir, 0))
+            second = NearDuplicateFilter(threshold=0.7)
+            second.is_duplicate_entry("Bob broke a vase.", ["[Speaker A]: hi there", "[Speaker B]: hello to you too"])
+            second.save(dedup_path_for(tmpdir, 1))
+
+            merged = NearDuplicateFilter(threshold=0.7)
+            self.assertEqual(merged.merge_from(tmpdir), 2)
+            self.assertTrue(merged.is_duplicate_story(STORY))
+            self.assertTrue(merged.is_duplicate_dialogue(["[Speaker A]: hi there", "[Speaker B]: hello to you too"]))
+
+            with self.assertRaises(ValueError):
+                merged.merge(NearDuplicateFilter(threshold=0.7, num_perm=64))
+
+    def test_duplicate_story_skips_judge_calls(self):
+        llm = JudgingMockLLM()
+        dedup = NearDuplicateFilter(threshold=0.8)
+        pipeline = DataGenerationPipeline(llm, dedup=dedup)
+        engine = BatchedGenerationEngine(pipeline, batch_size=1)
+
+        results = list(engine.run(["won the lottery", "won the lottery", "broke a vase"]))
+        accepted = [hint for hint, entry in results if entry is not None]
+
+        # The repeated hint gives the same mock story as the accepted entry, which is dropped
+        # before its judge call; the new story passes, but its dialogue is a copy of the first one
+        self.assertEqual(accepted, ["won the lottery"])
+        self.assertEqual(llm.metrics.stage("judge_story").requests, 2)
+        self.assertEqual(llm.metrics.stage("judge_dialogue").requests, 1)
+        self.assertEqual(llm.metrics.stage("dedup_story").rejections, 1)
+        self.assertEqual(llm.metrics.stage("dedup_dialogue").rejections, 1)
+        self.assertEqual(dedup.calls_saved, STORY_CALLS_SAVED + DIALOGUE_CALLS_SAVED)
+
+    def test_rejected_entries_are_not_indexed(self):
+        dedup = NearDuplicateFilter(threshold=0.8)
+        pipeline = DataGenerationPipeline(JudgingMockLLM(), dedup=dedup)
+        pipeline.judge.check_story = MagicMock(side_effect=[False, True])
+        pipeline.judge.check_dialogue = MagicMock(return_value=True)
+
+        self.assertIsNone(pipeline.run_single_iteration("won the lottery"))
+        self.assertIsNotNone(pipeline.run_single_iteration("won the lottery"))
+        self.assertEqual((len(dedup.stories), len(dedup.dialogues)), (1, 1))
+
+    def test_concurrent_duplicates_are_dropped_on_acceptance(self):
+        llm = JudgingMockLLM()
+        dedup = NearDuplicateFilter(threshold=0.8)
+        engine = BatchedGenerationEngine(DataGenerationPipeline(llm, dedup=dedup), batch_size=4)
+
+        results = list(engine.run(["won the lottery"] * 3))
+
+        # All three stories are judged before any entry is accepted; only the first entry to finish
+        # is kept, the others are dropped at their dialogue check or on acceptance
+        self.assertEqual(sum(entry is not None for _, entry in results), 1)
+        self.assertEqual(llm.metrics.stage("judge_story").requests, 3)
+        self.assertEqual(dedup.duplicate_dialogues + dedup.late_duplicates, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
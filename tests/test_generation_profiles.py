@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper
+from judge import Judge
+from generation_pipeline import DataGenerationPipeline
+from recovery_pipeline import RecoveryPipeline
+from generation_profiles import ProfileRegistry, DEFAULT_PROFILES
+
+
+class TestGenerationProfiles(unittest.TestCase):
+    def test_config_file_overrides_single_fields(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "profiles.json")
+            with open(path, "w") as f:
+                json.dump({"story": {"temperature": 1.1, "seed": 7}, "summary": {"max_new_tokens": 64}}, f)
+            registry = ProfileRegistry.from_file(path)
+
+        story = registry.get("story")
+        self.assertEqual((story.temperature, story.seed), (1.1, 7))
+        self.assertEqual(story.max_new_tokens, DEFAULT_PROFILES["story"].max_new_tokens)
+        self.assertEqual(registry.get("summary").max_new_tokens, 64)
+
+        with self.assertRaises(ValueError):
+            ProfileRegistry.from_dict({"judge": {"temprature": 0.0}})
+        with self.assertRaises(KeyError):
+            registry.get("missing")
+
+    def test_stages_use_their_profiles(self):
+        llm = LLMWrapper("mock", mock=True, profiles=ProfileRegistry.from_dict({"judge": {"seed": 3}}))
+        pipeline = DataGenerationPipeline(llm)
+        judge = Judge(llm)
+
+        self.assertEqual(pipeline._story_request("hint").profile, "story")
+        turn = pipeline._dialogue_turn_request("story", "won the lottery", "Alice", ["won"], [])
+        self.assertEqual((turn.profile, turn.max_new_tokens), ("dialogue_turn", DEFAULT_PROFILES["dialogue_turn"].max_new_tokens))
+        self.assertEqual(turn.banned_words, ["won"])
+        verdict = judge._recovery_request("won the lottery", ["a guess"])
+        self.assertEqual((verdict.temperature, verdict.seed), (0.0, 3))
+
+    def test_generate_accepts_profile_and_overrides(self):
+        llm = LLMWrapper("mock", mock=True)
+        seen = []
+        llm.generate_batch = lambda requests: seen.extend(requests) or ["ok"] * len(requests)
+
+        llm.generate("system", "user", profile="judge", temperature=0.3)
+        llm.generate("system", "user", max_new_tokens=10)
+        self.assertEqual((seen[0].profile, seen[0].temperature, seen[0].max_new_tokens), ("judge", 0.3, 96))
+        self.assertEqual((seen[1].profile, seen[1].max_new_tokens), ("default", 10))
+
+    def test_guesses_cap_grows_with_k(self):
+        llm = LLMWrapper("mock", mock=True)
+        cap = DEFAULT_PROFILES["recover"].max_new_tokens
+        self.assertEqual(RecoveryPipeline(llm, k=3)._guesses_request("dialogue").max_new_tokens, cap)
+        self.assertGreater(RecoveryPipeline(llm, k=10)._guesses_request("dialogue").max_new_tokens, cap)
+        self.assertGreater(RecoveryPipeline(llm, k=10)._guesses_request("dialogue").max_new_tokens,
+                           RecoveryPipeline(llm, k=8)._guesses_request("dialogue").max_new_tokens)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper
+from http_backend import OpenAIHTTPLLM, HTTPBackendError
+from batched_generation import BatchedGenerationEngine
+from generation_pipeline import DataGenerationPipeline
+
+
+class StubChatServer(ThreadingHTTPServer):
+    """
+    Local stand-in for an OpenAI-compatible server. Replies come from `LLMWrapper`'s mock
+    mode (conformed to `response_format` when given). Can delay every reply and fail the
+    first `fail_first` requests with `fail_status`.
+    """
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, fail_first=0, fail_status=503):
+        super().__init__(("127.0.0.1", 0), StubChatHandler)
+        self.delay = delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.payloads = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.mock = LLMWrapper("stub", mock=True)
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def reply(self, payload):
+        system, user = "", ""
+        for message in payload["messages"]:
+            if message["role"] == "system":
+                system = message["content"]
+            else:
+                user = message["content"]
+        choices = []
+        for i in range(payload.get("n", 1)):
+            text = self.mock._mock_generate(system, user)
+            if "response_format" in payload:
+                text = LLMWrapper._mock_conform(text, payload["response_format"]["json_schema"]["schema"])
+            choices.append({"index": i, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"})
+        usage = {"prompt_tokens": len((system + " " + user).split()), "completion_tokens": sum(len(c["message"]["content"].split()) for c in choices)}
+        return {"object": "chat.completion", "model": payload["model"], "choices": choices, "usage": usage}
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out hang up before the delayed reply is written
+        pass
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.payloads.append(payload)
+            fail = len(server.payloads) <= server.fail_first
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if self.path != "/v1/chat/completions":
+                status, body = 404, {"error": "not found"}
+            elif fail:
+                status, body = server.fail_status, {"error": "stub failure"}
+            else:
+                status, body = 200, server.reply(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestOpenAIHTTPLLM(unittest.TestCase):
+    def start_server(self, **kwargs):
+        server = StubChatServer(**kwargs)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def make_llm(self, server, **kwargs):
+        llm = OpenAIHTTPLLM("stub-model", server.api_base, backoff=0.01, **kwargs)
+        self.addCleanup(llm.close)
+        return llm
+
+    def test_requests_payload_and_usage(self):
+        server = self.start_server()
+        llm = self.make_llm(server, concurrency=2, api_key="secret")
+        schema = {"type": "object", "properties": {"valid": {"type": "boolean"}}, "required": ["valid"]}
+        requests = [
+            llm.make_request("dialogue_turn", "You are Speaker 1.", "Say hi.", n=3, stage="dialogue_turn", banned_words=["lottery"]),
+            llm.make_request("judge", "You are a judge.", "Is it valid?", json_schema=schema, stage="judge_story"),
+        ]
+        candidates = llm.generate_candidates(requests)
+
+        self.assertEqual(len(candidates[0]), 3)
+        self.assertEqual(json.loads(candidates[1][0]), {"valid": True})
+        turn_payload = next(p for p in server.payloads if p["n"] == 3)
+        self.assertEqual(turn_payload["stop"], ["\n[Speaker", "\nSpeaker"])
+        self.assertEqual(turn_payload["max_tokens"], 160)
+        self.assertIn("Lottery", turn_payload["bad_words"])
+        self.assertNotIn("bad_words", next(p for p in server.payloads if p["n"] == 1))
+        stages = llm.metrics.snapshot(0)["stages"]
+        self.assertGreater(stages["judge_story"]["prompt_tokens"], 0)
+
+    def test_concurrency_limit_and_keep_alive(self):
+        server = self.start_server(delay=0.05)
+        llm = self.make_llm(server, concurrency=4)
+        requests = [llm.make_request("story", "You are a creative storyteller.", f"event {i}") for i in range(12)]
+        llm.generate_batch(requests)
+        llm.generate_batch(requests[:4])
+
+        self.assertEqual(server.max_in_flight, 4)
+        # 16 requests over at most 4 reused connections
+        self.assertLessEqual(server.connections, 4)
+
+    def test_batched_engine_over_http(self):
+        server = self.start_server()
+        llm = self.make_llm(server, concurrency=8)
+        results = list(BatchedGenerationEngine(DataGenerationPipeline(llm), batch_size=4).run(["won the lottery"] * 4))
+        self.assertTrue(all(entry is not None for _, entry in results))
+
+    def test_failed_request_only_rejects_its_iteration(self):
+        server = self.start_server(fail_first=1, fail_status=400)
+        llm = self.make_llm(server, concurrency=4)
+        results = list(BatchedGenerationEngine(DataGenerationPipeline(llm), batch_size=4).run(["won the lottery"] * 4))
+
+        self.assertEqual(sum(entry is not None for _, entry in results), 3)
+        self.assertEqual(llm.metrics.snapshot(0)["entries_rejected"], 1)
+
+    def test_retries_transient_failures(self):
+        server = self.start_server(fail_first=2, fail_status=429)
+        llm = self.make_llm(server, max_retries=2)
+        self.assertTrue(llm.generate("You are a creative storyteller.", "event"))
+        self.assertEqual(len(server.payloads), 3)
+
+        server = self.start_server(fail_first=1, fail_status=400)
+        llm = self.make_llm(server, max_retries=3)
+        with self.assertRaises(HTTPBackendError):
+            llm.generate("You are a creative storyteller.", "event")
+        self.assertEqual(len(server.payloads), 1)
+
+    def test_timeout_gives_up_after_retries(self):
+        server = self.start_server(delay=0.5)
+        llm = self.make_llm(server, timeout=0.05, max_retries=1)
+        with self.assertRaises(HTTPBackendError):
+            llm.generate("You are a creative storyteller.", "event")
+        self.assertEqual(len(server.payloads), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules that take seconds to import and are only needed by a real in-process engine
+HEAVY_MODULES = ("torch", "vllm", "transformers", "accelerate")
+
+# Cumulative import time allowed for the parent process (and every spawned worker) in mock and
+# aggregation runs. Importing torch alone takes several times this.
+IMPORT_BUDGET_SECONDS = 1.0
+
+
+def import_profile(code):
+    """
+    Runs `code` in a fresh interpreter under `-X importtime` and returns the cumulative import
+    time of its top-level imports in seconds, plus the heavy modules it ended up importing.
+    """
+    probe = code + f"\nimport sys\nprint(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nesting is shown by indentation
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    heavy = [m for m in result.stdout.strip().split(",") if m]
+    return total_us / 1e6, heavy
+
+
+class TestImportTime(unittest.TestCase):
+    def test_cli_startup_skips_heavy_imports(self):
+        seconds, heavy = import_profile("import main")
+        self.assertEqual(heavy, [])
+        self.assertLess(seconds, IMPORT_BUDGET_SECONDS)
+
+    def test_mock_backend_skips_heavy_imports(self):
+        code = "import sys\nsys.path.insert(0, 'src')\nfrom llm import LLMWrapper\nLLMWrapper('mock', mock=True).generate('', 'hi')"
+        seconds, heavy = import_profile(code)
+        self.assertEqual(heavy, [])
+        self.assertLess(seconds, IMPORT_BUDGET_SECONDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from pydantic import ValidationError
+
+from data_models import DatasetEntry, Recovery
+from jsonl_io import iter_records, iter_record_range, iter_entries, decode_entry, orjson, PrefetchIterator, JsonlWriter
+from record_index import build_offset_index
+
+
+def make_entry(i):
+    return DatasetEntry(**{
+        "story": {"text": f"Story {i}", "hidden_event": "won the lottery", "protagonist_name": "Alice"},
+        "gold_semantics": {"hidden_event": "won the lottery", "protagonist_name": "Alice"},
+        "banlist": ["won", "lottery"],
+        "dialogue": {"turns": [f"[Speaker A]: turn {i}"]},
+    })
+
+
+class TestJsonlIO(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "out.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_writer_and_streaming_reader_round_trip(self):
+        with JsonlWriter(self.path, "w") as writer:
+            for i in range(5):
+                writer.write(make_entry(i))
+
+        records = list(iter_records(self.path))
+        self.assertEqual([r["story"]["text"] for r in records], [f"Story {i}" for i in range(5)])
+
+    def test_legacy_format_and_partial_tail(self):
+        with open(self.path, "w") as f:
+            for i in range(3):
+                f.write(make_entry(i).model_dump_json(indent=2) + "\n")
+            f.write('{"story": {"text": "trunc')
+
+        records = list(iter_records(self.path))
+        self.assertEqual(len(records), 3)
+
+    def test_partial_lines_mid_file_are_skipped(self):
+        with open(self.path, "w") as f:
+            f.write('{"i": 0}\n{"i": 1, "trunc\n{"i": 2}\n{"i": 3, "bad}\n')
+            f.write(make_entry(4).model_dump_json(indent=2) + "\n")
+            f.write('{"i": 5}\n')
+
+        records = list(iter_records(self.path))
+        self.assertEqual([r.get("i", "entry") for r in records], [0, 2, "entry", 5])
+        # The index does not parse records that look complete, so it keeps a slot for the bad
+        # line; its reader skips it
+        self.assertEqual(len(build_offset_index(self.path)), 5)
+        self.assertEqual([e.story.text for e in iter_entries(self.path)], ["Story 4"])
+
+    def test_record_range(self):
+        with JsonlWriter(self.path, "w") as writer:
+            for i in range(6):
+                writer.write(make_entry(i))
+        offsets = build_offset_index(self.path)
+
+        with open(self.path, "rb") as f:
+            records = list(iter_record_range(f, offsets[2], 3))
+        self.assertEqual([r["story"]["text"] for r in records], ["Story 2", "Story 3", "Story 4"])
+
+    def test_decode_entry_trusted_matches_validated(self):
+        entry = make_entry(1)
+        entry.recovery = Recovery(guesses=["won the lottery"], success=True)
+        entry.id = entry.stable_id()
+        raw = entry.model_dump_json().encode("utf-8")
+
+        self.assertEqual(decode_entry(raw), entry)
+        self.assertEqual(decode_entry(raw, trusted=True).model_dump(), entry.model_dump())
+        with self.assertRaises(ValidationError):
+            decode_entry(b'{"story": {"text": "no event"}}')
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_encoder_round_trips(self):
+        with JsonlWriter(self.path, "w", encoder="orjson") as writer:
+            for i in range(3):
+                writer.write(make_entry(i))
+
+        entries = list(iter_entries(self.path, trusted=True))
+        self.assertEqual([e.story.text for e in entries], ["Story 0", "Story 1", "Story 2"])
+        self.assertEqual(entries[0].id, make_entry(0).stable_id())
+
+    def test_prefetch_runs_ahead_on_background_thread(self):
+        producer_threads = set()
+
+        def source():
+            for i in range(10):
+                producer_threads.add(threading.get_ident())
+                yield i
+
+        prefetch = PrefetchIterator(source(), maxsize=2)
+        self.assertEqual(list(prefetch), list(range(10)))
+        self.assertNotIn(threading.get_ident(), producer_threads)
+        prefetch.close()
+
+    def test_prefetch_reraises_source_errors(self):
+        def source():
+            yield 1
+            raise ValueError("bad record")
+
+        prefetch = PrefetchIterator(source())
+        self.assertEqual(next(prefetch), 1)
+        with self.assertRaises(ValueError):
+            next(prefetch)
+
+
+if __name__ == '__main__':
+    unittest.main()
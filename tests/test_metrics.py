@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper
+from generation_pipeline import DataGenerationPipeline
+from batched_generation import BatchedGenerationEngine
+from metrics import Histogram, MetricsWriter, load_final_snapshots, format_metrics_summary
+
+
+class DialogueJudgeRejectsLLM(LLMWrapper):
+    """
+    Mock backend whose story judge accepts and whose dialogue judge rejects everything.
+    """
+    def __init__(self):
+        super().__init__("mock", device="cpu", mock=True)
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "judge" in system_prompt.lower():
+            return json.dumps({"valid": "Dialogue:" not in user_prompt, "reason": "mock"})
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_quantiles(self):
+        hist = Histogram()
+        for value in [0.01] * 8 + [0.3, 7.0]:
+            hist.observe(value)
+        self.assertEqual(hist.quantile(0.5), 0.05)
+        self.assertEqual(hist.quantile(0.95), 10.0)
+        merged = Histogram.from_dict(hist.to_dict())
+        merged.merge(hist)
+        self.assertEqual(merged.count, 20)
+
+    def test_stage_and_entry_accounting(self):
+        llm = DialogueJudgeRejectsLLM()
+        engine = BatchedGenerationEngine(DataGenerationPipeline(llm), batch_size=2)
+        results = [entry for _, entry in engine.run(["won the lottery"] * 2)]
+
+        self.assertEqual(results, [None, None])
+        snapshot = llm.metrics.snapshot(worker_id=0)
+        self.assertEqual(snapshot["entries_rejected"], 2)
+        self.assertGreater(snapshot["tokens_rejected"], 0)
+        stages = snapshot["stages"]
+        self.assertEqual(stages["story"]["requests"], 2)
+        self.assertEqual(stages["judge_dialogue"]["rejections"], 2)
+        # Every token of the run went into the two rejected entries
+        total = sum(s["prompt_tokens"] + s["completion_tokens"] for s in stages.values())
+        self.assertEqual(snapshot["tokens_rejected"], total)
+
+    def test_writer_outputs_and_summary(self):
+        llm = LLMWrapper("mock", mock=True)
+        DataGenerationPipeline(llm).run_single_iteration("won the lottery")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "metrics_gpu_0.jsonl")
+            prom_path = os.path.join(tmpdir, "worker_0.prom")
+            writer = MetricsWriter(llm.metrics, 0, path, prom_path)
+            writer.write()
+            writer.write()
+
+            snapshots = load_final_snapshots([path, os.path.join(tmpdir, "missing.jsonl")])
+            with open(prom_path) as f:
+                prom = f.read()
+
+        self.assertEqual(len(snapshots), 1)
+        self.assertIn('datagen_stage_requests_total{worker="0",stage="story"} 1', prom)
+        self.assertIn('datagen_stage_latency_seconds_bucket{worker="0",stage="story",le="+Inf"} 1', prom)
+        summary = format_metrics_summary(snapshots * 2)
+        self.assertIn("Entries: accepted=2 rejected=0", summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
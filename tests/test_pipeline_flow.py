@@ -8,10 +8,6 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
 from unittest.mock import MagicMock
-sys.modules["torch"] = MagicMock()
-sys.modules["transformers"] = MagicMock()
-sys.modules["vllm"] = MagicMock()
-sys.modules["accelerate"] = MagicMock()
 
 # Mock Judge to always pass
 import judge
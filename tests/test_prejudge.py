@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper
+from generation_pipeline import DataGenerationPipeline
+from batched_generation import BatchedGenerationEngine
+from prompt_templates import SYSTEM_PROMPTS
+from prejudge import PreJudge
+
+STORY = "Alice bought a ticket on Monday. Dr. Reyes laughed when she told him. \"I will buy a boat,\" Alice said."
+
+
+class FirstPersonMockLLM(LLMWrapper):
+    """
+    Mock backend whose stories are narrated in the first person for one hint.
+    """
+    def __init__(self, first_person_for):
+        super().__init__("mock", device="cpu", mock=True)
+        self.first_person_for = first_person_for
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "judge" in system_prompt.lower():
+            return json.dumps({"valid": True, "reason": "mock"})
+        if system_prompt == SYSTEM_PROMPTS["storyteller"] and self.first_person_for in user_prompt:
+            return "I woke up late. My alarm never rang. We missed the train together."
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class TestPreJudge(unittest.TestCase):
+    def test_story_rules(self):
+        prejudge = PreJudge()
+        # Quoted first-person speech and abbreviations are fine
+        self.assertIsNone(prejudge.check_story("won the lottery", STORY))
+        self.assertEqual(prejudge.check_story("won the lottery", "Alice won. She cheered."), "sentence_count")
+        self.assertEqual(prejudge.check_story("won the lottery", "Alice won. You cheered. Then she slept."), "third_person")
+        self.assertIsNone(prejudge.check_story("won the lottery", "Alice won. The US cheered. Then she slept."))
+        self.assertEqual(prejudge.check_story("won the lottery", "The woman won. She cheered. Then she slept."), "named_protagonist")
+
+    def test_dialogue_rule_and_counters(self):
+        prejudge = PreJudge()
+        self.assertEqual(prejudge.check_dialogue("won the lottery", "[Speaker A]: Alice WON the lottery!"), "event_phrase_absent")
+        self.assertIsNone(prejudge.check_dialogue("won the lottery", "[Speaker A]: Alice got lucky with a ticket."))
+        stats = prejudge.stats()
+        self.assertEqual(stats["checked_dialogues"], 2)
+        self.assertEqual(stats["rejected_event_phrase_absent"], 1)
+        self.assertEqual(stats["judge_calls_avoided"], 1)
+
+    def test_rejected_story_skips_judge_call(self):
+        llm = FirstPersonMockLLM("missed the train")
+        pipeline = DataGenerationPipeline(llm, prejudge=PreJudge(llm.metrics))
+        engine = BatchedGenerationEngine(pipeline, batch_size=2)
+
+        results = dict(engine.run(["missed the train", "won the lottery"]))
+
+        self.assertIsNone(results["missed the train"])
+        self.assertIsNotNone(results["won the lottery"])
+        self.assertEqual(llm.metrics.stage("judge_story").requests, 1)
+        self.assertEqual(llm.metrics.stage("prejudge_third_person").rejections, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
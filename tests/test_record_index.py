@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from record_index import build_offset_index, load_or_build_index, index_path_for, read_record_at
+from work_queue import chunk_ranges
+
+
+def make_record(i):
+    return {"story": {"text": f"Story {i} – café", "hidden_event": "won the lottery", "protagonist_name": "Alice"},
+            "banlist": ["won", "lottery"], "dialogue": {"turns": [f"turn {i}"]}}
+
+
+class TestRecordIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.records = [make_record(i) for i in range(7)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, indent=None):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record, indent=indent, ensure_ascii=False) + "\n")
+        return path
+
+    def assert_index_reads_back(self, path):
+        offsets = build_offset_index(path)
+        self.assertEqual(len(offsets), len(self.records))
+        with open(path, "rb") as f:
+            for i in reversed(range(len(offsets))):
+                self.assertEqual(read_record_at(f, offsets[i]), self.records[i])
+
+    def test_jsonl(self):
+        self.assert_index_reads_back(self.write("data.jsonl"))
+
+    def test_legacy_pretty_printed(self):
+        self.assert_index_reads_back(self.write("legacy.jsonl", indent=2))
+
+    def test_sidecar_is_reused(self):
+        path = self.write("data.jsonl")
+        offsets = load_or_build_index(path)
+        self.assertTrue(os.path.exists(index_path_for(path)))
+        self.assertEqual(list(load_or_build_index(path)), list(offsets))
+
+    def test_chunks_cover_every_entry_once(self):
+        ranges = chunk_ranges(7, 3)
+        self.assertEqual(ranges, [(0, 3), (3, 6), (6, 7)])
+        covered = [i for start, stop in ranges for i in range(start, stop)]
+        self.assertEqual(covered, list(range(7)))
+
+
+if __name__ == '__main__':
+    unittest.main()
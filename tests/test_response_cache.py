@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm import LLMWrapper, GenerationRequest
+from response_cache import ResponseCache
+
+
+class CountingMockLLM(LLMWrapper):
+    def __init__(self, **kwargs):
+        super().__init__("mock", device="cpu", mock=True, **kwargs)
+        self.engine_calls = 0
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        self.engine_calls += 1
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit_and_miss_counters(self):
+        cache = ResponseCache(self.path)
+        key = ResponseCache.make_key("model", "prompt", {"temperature": 0.0})
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "response")
+        self.assertEqual(cache.get(key), "response")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+        # Persisted across instances
+        reopened = ResponseCache(self.path)
+        self.assertEqual(reopened.get(key), "response")
+        reopened.close()
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(self.path, max_bytes=25)
+        cache.put("a", "x" * 10)
+        cache.put("b", "x" * 10)
+        cache.get("a")  # "b" is now the least recently used
+        cache.put("c", "x" * 10)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.evictions, 1)
+        cache.close()
+
+    def test_replacing_a_key_does_not_grow_the_total(self):
+        cache = ResponseCache(self.path, max_bytes=25)
+        cache.put("a", "x" * 10)
+        cache.put("b", "x" * 10)
+        for _ in range(3):
+            cache.put("a", "x" * 10)
+
+        self.assertEqual(cache.stats()["stored_bytes"], 20)
+        self.assertEqual(cache.evictions, 0)
+        cache.close()
+
+    def test_wrapper_caches_only_deterministic_calls(self):
+        cache = ResponseCache(self.path)
+        llm = CountingMockLLM(cache=cache)
+        deterministic = GenerationRequest("You are a strict logic judge.", "Story: x", temperature=0.0)
+        sampled = GenerationRequest("You are a creative storyteller.", "Hidden Event: x")
+
+        llm.generate_batch([deterministic, sampled])
+        outputs = llm.generate_batch([deterministic, sampled])
+
+        self.assertEqual(len(outputs), 2)
+        self.assertEqual(llm.engine_calls, 3)
+        self.assertEqual(cache.hits, 1)
+
+        llm.cache_sampled = True
+        llm.generate_batch([sampled])
+        llm.generate_batch([sampled])
+        self.assertEqual(llm.engine_calls, 4)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import random
+import tempfile
+import unittest
+from collections import Counter
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from review import ReservoirSampler, sample_records, write_review_samples
+
+
+def make_record(i, event, success=None):
+    record = {
+        "id": str(i),
+        "story": {"text": f"story {i}", "hidden_event": event, "protagonist_name": "Alice"},
+        "gold_semantics": {"hidden_event": event, "protagonist_name": "Alice"},
+        "banlist": [],
+        "dialogue": {"turns": ["[Speaker A]: hi", "[Speaker B]: hello"]},
+    }
+    if success is not None:
+        record["recovery"] = {"guesses": ["a", "b"], "success": success}
+    return record
+
+
+class TestReview(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_shards(self, shards):
+        paths = []
+        for n, records in enumerate(shards):
+            path = os.path.join(self.tmpdir.name, f"output_gpu_{n}.jsonl")
+            with open(path, "w") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            paths.append(path)
+        return paths
+
+    def test_reservoir_is_uniform(self):
+        counts = Counter()
+        for seed in range(2000):
+            sampler = ReservoirSampler(2, random.Random(seed))
+            for i in range(10):
+                sampler.add(i)
+            counts.update(sampler.items)
+        # Every item should be picked in about 2/10 of the runs
+        for i in range(10):
+            self.assertAlmostEqual(counts[i] / 2000, 0.2, delta=0.04)
+
+    def test_samples_across_all_shards_with_seed(self):
+        paths = self.write_shards([
+            [make_record(i, "won the lottery") for i in range(50)],
+            [make_record(100 + i, "broke a vase") for i in range(50)],
+        ])
+        sample = sample_records(paths, 20, seed=1)
+        self.assertEqual(len(sample), 20)
+        self.assertEqual({r["gold_semantics"]["hidden_event"] for r in sample}, {"won the lottery", "broke a vase"})
+        self.assertEqual(sample, sample_records(paths, 20, seed=1))
+        self.assertEqual(len(sample_records(paths, 500)), 100)
+
+    def test_stratified_sample_covers_rare_strata(self):
+        records = [make_record(i, "won the lottery", success=True) for i in range(200)]
+        records += [make_record(1000, "broke a vase", success=True), make_record(1001, "won the lottery", success=False)]
+        paths = self.write_shards([records])
+
+        by_event = Counter(r["gold_semantics"]["hidden_event"] for r in sample_records(paths, 4, stratify=["event"]))
+        self.assertEqual(by_event["broke a vase"], 1)
+        by_success = Counter(r["recovery"]["success"] for r in sample_records(paths, 4, stratify=["success"]))
+        self.assertEqual(by_success[False], 1)
+        with self.assertRaises(ValueError):
+            sample_records(paths, 4, stratify=["protagonist"])
+
+    def test_output_formats(self):
+        paths = self.write_shards([[make_record(i, "won the lottery", success=i % 2 == 0) for i in range(5)]])
+        text_path = os.path.join(self.tmpdir.name, "review.txt")
+        self.assertEqual(write_review_samples(paths, text_path, size=3), 3)
+        with open(text_path) as f:
+            text = f.read()
+        self.assertIn("--- Sample 3 ---", text)
+        self.assertIn("Success:", text)
+
+        jsonl_path = os.path.join(self.tmpdir.name, "review.jsonl")
+        write_review_samples(paths, jsonl_path, size=3, fmt="jsonl")
+        with open(jsonl_path) as f:
+            self.assertEqual(len([json.loads(line) for line in f]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import random
+import threading
+import unittest
+from collections import Counter
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from scheduler import EventScheduler, FILLED, BROKEN
+from work_queue import WorkCoordinator, WorkerStats, UnitSource, iter_work_units, OUTCOME
+from llm import LLMWrapper
+from generation_pipeline import DataGenerationPipeline
+from batched_generation import BatchedGenerationEngine
+
+ACCEPTANCE = {"won the lottery": 0.9, "broke a vase": 0.3, "missed the train": 0.0}
+
+
+class CoinFlipJudgeMockLLM(LLMWrapper):
+    """
+    Mock backend whose story judge rejects half of the stories at random.
+    """
+    def __init__(self, seed):
+        super().__init__("mock", device="cpu", mock=True)
+        self.rng = random.Random(seed)
+
+    def _mock_generate(self, system_prompt, user_prompt):
+        if "judge" in system_prompt.lower():
+            valid = "Dialogue:" in user_prompt or self.rng.random() < 0.5
+            return json.dumps({"valid": valid, "reason": "mock"})
+        if "protagonist" in system_prompt.lower():
+            return "Alice"
+        return super()._mock_generate(system_prompt, user_prompt)
+
+
+def simulate(scheduler, rng, parallel=4):
+    """
+    Runs the scheduler against `ACCEPTANCE` with up to `parallel` attempts in flight.
+    """
+    in_flight = []
+    while not scheduler.finished:
+        while len(in_flight) < parallel:
+            event = scheduler.next_event()
+            if event is None:
+                break
+            in_flight.append(event)
+        event = in_flight.pop(0)
+        scheduler.record(event, rng.random() < ACCEPTANCE[event])
+
+
+class TestEventScheduler(unittest.TestCase):
+    def test_fills_quotas_and_breaks_hopeless_events(self):
+        scheduler = EventScheduler.uniform(ACCEPTANCE, 10, breaker_attempts=15)
+        simulate(scheduler, random.Random(0))
+
+        states = scheduler.to_dict()
+        self.assertEqual(states["won the lottery"]["status"], FILLED)
+        self.assertEqual(states["broke a vase"]["status"], FILLED)
+        self.assertEqual(states["missed the train"]["status"], BROKEN)
+        # Attempts already in flight when the breaker trips still come back
+        self.assertLess(states["missed the train"]["attempts"], 15 + 4)
+        # Attempts follow the acceptance rate instead of being split evenly
+        self.assertLess(states["won the lottery"]["attempts"], 16)
+        self.assertGreater(states["broke a vase"]["attempts"], 20)
+
+    def test_does_not_schedule_beyond_expected_need(self):
+        scheduler = EventScheduler({"won the lottery": 2})
+        # Four pending attempts at the prior rate of 1/2 are expected to fill a quota of two
+        self.assertEqual([scheduler.next_event() for _ in range(5)], ["won the lottery"] * 4 + [None])
+        scheduler.record("won the lottery", True)
+        scheduler.record("won the lottery", True)
+        self.assertTrue(scheduler.finished)
+
+    def test_resume_and_budget(self):
+        scheduler = EventScheduler({"won the lottery": 3, "broke a vase": 3}, max_attempts=2)
+        scheduler.seed({"won the lottery": 3})
+        self.assertEqual(scheduler.to_dict()["won the lottery"]["status"], FILLED)
+        self.assertEqual([scheduler.next_event() for _ in range(3)], ["broke a vase", "broke a vase", None])
+        self.assertTrue(scheduler.finished)
+
+
+class TestScheduledCoordinator(unittest.TestCase):
+    def test_stops_once_quotas_are_met(self):
+        coordinator = WorkCoordinator()
+        rng = random.Random(1)
+
+        def worker(worker_id):
+            stats = WorkerStats(worker_id)
+            for event in iter_work_units(coordinator.work_queue):
+                stats.units += 1
+                coordinator.result_queue.put((OUTCOME, event, rng.random() < ACCEPTANCE[event]))
+            coordinator.result_queue.put(stats.to_dict())
+
+        # Threads stand in for worker processes: both have is_alive()
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(2)]
+        for t in workers:
+            t.start()
+        scheduler = EventScheduler.uniform(ACCEPTANCE, 5, breaker_attempts=10)
+        stats = coordinator.run_scheduled(scheduler, workers, window=4)
+        for t in workers:
+            t.join()
+
+        self.assertEqual([s["worker_id"] for s in stats], [0, 1])
+        states = scheduler.to_dict()
+        self.assertEqual(sum(s["units"] for s in stats), sum(state["attempts"] for state in states.values()))
+        self.assertEqual(Counter(state["status"] for state in states.values()), Counter({FILLED: 2, BROKEN: 1}))
+
+    def test_batched_workers_with_rejections_finish(self):
+        # A batched worker holds attempts in its cohort; it must not block on the queue for new
+        # hints while the scheduler waits for those attempts' outcomes
+        events = ["won the lottery", "broke a vase", "missed the train", "forgot wedding anniversary", "got a promotion"]
+        for seed in range(8):
+            coordinator = WorkCoordinator()
+
+            def worker():
+                stats = WorkerStats(0)
+                engine = BatchedGenerationEngine(DataGenerationPipeline(CoinFlipJudgeMockLLM(seed)), batch_size=8)
+                for event, entry in engine.run(UnitSource(coordinator.work_queue)):
+                    stats.units += 1
+                    coordinator.result_queue.put((OUTCOME, event, entry is not None))
+                coordinator.result_queue.put(stats.to_dict())
+
+            workers = [threading.Thread(target=worker, daemon=True)]
+            workers[0].start()
+            scheduler = EventScheduler.uniform(events, 3, breaker_attempts=50)
+            runner = threading.Thread(target=coordinator.run_scheduled, args=(scheduler, workers, 8), daemon=True)
+            runner.start()
+            runner.join(timeout=30)
+
+            self.assertFalse(runner.is_alive(), f"seed {seed}: {scheduler.summary()}")
+            self.assertEqual({state["status"] for state in scheduler.to_dict().values()}, {FILLED})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import unittest
+
+# Add src and root to pythonpath
+sys.path.append(os.path.join(os.path.dirname(__file__), "../src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from work_queue import WorkCoordinator, WorkerStats, OUTCOME, chunk_ranges, iter_work_units, format_worker_stats
+
+
+class TestWorkCoordinator(unittest.TestCase):
+    def test_submit_ends_with_one_stop_per_worker(self):
+        coordinator = WorkCoordinator()
+        coordinator.submit(["a", "b", "c"], num_workers=2)
+
+        # Each worker stops at its own sentinel, so the second still finds one after the first
+        self.assertEqual(list(iter_work_units(coordinator.work_queue)), ["a", "b", "c"])
+        self.assertEqual(list(iter_work_units(coordinator.work_queue)), [])
+        self.assertTrue(coordinator.work_queue.empty())
+
+    def test_workers_share_the_queue(self):
+        coordinator = WorkCoordinator()
+        coordinator.submit(range(20), num_workers=3)
+        pulled = [[] for _ in range(3)]
+
+        def worker(worker_id):
+            stats = WorkerStats(worker_id)
+            for unit in iter_work_units(coordinator.work_queue):
+                pulled[worker_id].append(unit)
+                stats.units += 1
+                coordinator.result_queue.put((OUTCOME, unit, unit % 2 == 0))
+            coordinator.result_queue.put(stats.to_dict())
+
+        # Threads stand in for worker processes: both have is_alive()
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(3)]
+        for t in workers:
+            t.start()
+        outcomes = []
+        stats = coordinator.collect_stats(workers, on_outcome=lambda unit, accepted: outcomes.append(unit))
+        for t in workers:
+            t.join()
+
+        self.assertEqual([s["worker_id"] for s in stats], [0, 1, 2])
+        self.assertEqual(sorted(unit for units in pulled for unit in units), list(range(20)))
+        self.assertEqual(sorted(outcomes), list(range(20)))
+        self.assertIn("Total: units=20", format_worker_stats(stats))
+
+    def test_collect_stats_returns_when_a_worker_crashed(self):
+        coordinator = WorkCoordinator()
+        coordinator.submit([], num_workers=2)
+
+        def worker(worker_id):
+            if worker_id == 1:
+                # Dies without reporting its stats
+                return
+            for _ in iter_work_units(coordinator.work_queue):
+                pass
+            coordinator.result_queue.put(WorkerStats(worker_id).to_dict())
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(2)]
+        for t in workers:
+            t.start()
+        stats = coordinator.collect_stats(workers)
+
+        self.assertEqual([s["worker_id"] for s in stats], [0])
+
+
+class TestChunkRanges(unittest.TestCase):
+    def test_boundaries(self):
+        self.assertEqual(chunk_ranges(0, 4), [])
+        self.assertEqual(chunk_ranges(3, 4), [(0, 3)])
+        self.assertEqual(chunk_ranges(8, 4), [(0, 4), (4, 8)])
+        self.assertEqual(chunk_ranges(9, 4), [(0, 4), (4, 8), (8, 9)])
+        self.assertEqual(chunk_ranges(2, 1), [(0, 1), (1, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()